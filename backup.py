@@ -0,0 +1,142 @@
+"""Онлайн-резервные копии базы через SQLite backup API.
+
+Запуск из корня проекта: python backup.py [--db data.db] [--dir backups]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import config
+import db
+import metrics
+from utils import rotate_files
+
+logger = logging.getLogger(__name__)
+
+# Своё окончание, чтобы ротация не трогала другие базы в том же каталоге
+BACKUP_SUFFIX = ".bak.db"
+# Сколько раз копирование может начаться заново из-за записей в базу,
+# прежде чем последний проход будет сделан одним шагом
+MAX_RESTARTS = 5
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+@dataclass
+class BackupResult:
+    path: str
+    seconds: float
+    bytes_copied: int
+    pages: int
+    restarts: int
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection, pages: int, pause: float) -> tuple[int, int]:
+    # Копируем по pages страниц и отпускаем базу на pause секунд между шагами,
+    # чтобы add_measure и другие писатели не ждали. Если базу изменили, SQLite
+    # начинает копирование заново; после MAX_RESTARTS доделываем одним шагом.
+    state = {"remaining": None, "restarts": 0, "total": 0}
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts
+        state["remaining"] = remaining
+        state["total"] = total
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=pause)
+    except _TooManyRestarts:
+        logger.warning("Backup restarted %d times, finishing in one step", state["restarts"])
+        source.backup(target)
+    return state["total"], state["restarts"]
+
+
+def backup_database(db_path: str, directory: str, pages: int, pause: float, keep: int) -> BackupResult:
+    # Синхронная функция: вызывать через asyncio.to_thread
+    if os.path.realpath(directory) == os.path.realpath(os.path.dirname(db_path) or "."):
+        raise ValueError(f"Backup directory {directory!r} must differ from the database directory")
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    # Микросекунды в имени: две копии за одну секунду не затирают друг друга
+    path = os.path.join(directory, f"{stem}-{datetime.now():%Y%m%d-%H%M%S-%f}{BACKUP_SUFFIX}")
+    partial = path + ".partial"
+    started = time.perf_counter()
+
+    try:
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(partial)
+        try:
+            total_pages, restarts = _copy(source, target, pages, pause)
+            # Копия должна открываться и проходить проверку целостности
+            check = target.execute("PRAGMA integrity_check").fetchall()
+            page_size = target.execute("PRAGMA page_size").fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if check != [("ok",)]:
+            raise RuntimeError(f"Backup integrity check failed: {check[:5]}")
+    except Exception:
+        metrics.inc("backup_failures_total")
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(partial)
+        raise
+
+    # Под итоговым именем появляется только проверенная копия
+    os.replace(partial, path)
+    rotate_files(directory, BACKUP_SUFFIX, keep, prefix=f"{stem}-")
+    result = BackupResult(path, time.perf_counter() - started, total_pages * page_size, total_pages, restarts)
+
+    metrics.set_gauge("backup_seconds", result.seconds)
+    metrics.set_gauge("backup_bytes", result.bytes_copied)
+    metrics.set_gauge("backup_last_success_timestamp", time.time())
+    metrics.inc("backup_restarts_total", restarts)
+    logger.info(
+        "Backup %s: %.1f MB in %.2f s (%d restarts)",
+        path,
+        result.bytes_copied / 2**20,
+        result.seconds,
+        restarts,
+    )
+    return result
+
+
+async def run_backup(db_path: str) -> BackupResult:
+    return await asyncio.to_thread(
+        backup_database,
+        db_path,
+        config.BACKUP_DIR,
+        config.BACKUP_PAGES,
+        config.BACKUP_STEP_PAUSE,
+        config.BACKUP_KEEP,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Резервная копия базы бота")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--dir", default=config.BACKUP_DIR or "backups")
+    parser.add_argument("--keep", type=int, default=config.BACKUP_KEEP)
+    args = parser.parse_args()
+
+    try:
+        result = backup_database(args.db, args.dir, config.BACKUP_PAGES, config.BACKUP_STEP_PAUSE, args.keep)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(f"{result.path}: {result.bytes_copied / 2**20:.1f} МБ за {result.seconds:.2f} с, перезапусков: {result.restarts}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
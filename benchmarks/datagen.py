@@ -0,0 +1,112 @@
+"""Генератор синтетической базы: N котов × M лет замеров AMPS/PEAK/PMPS/OTHER.
+
+Данные воспроизводимы: при одинаковых параметрах и seed база получается той же.
+Запуск из корня проекта: python -m benchmarks.datagen bench.db --cats 20 --years 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from createdb import create_db
+
+# Пропущенные дни и доля дней с дополнительным замером
+SKIP_DAY_SHARE = 0.05
+OTHER_SHARE = 0.3
+BATCH_SIZE = 10_000
+
+_INSERT_MEASURE = (
+    "INSERT INTO measure (chat_id, user_id, name, date, time, amount, tag) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _cat_profile(rng: random.Random, idx: int) -> dict:
+    am_hour = rng.choice((7, 8, 9))
+    return {
+        "chat_id": 100_000 + idx,
+        "user_id": 100_000 + idx,
+        "name": f"Cat{idx}",
+        "am_time": f"{am_hour:02d}:00",
+        "peak": rng.choice((3, 4, 5, 6)),
+        "pm_time": f"{am_hour + 12:02d}:00",
+        # Средний сахар до инсулина и глубина падения к пику
+        "base": rng.uniform(11, 18),
+        "drop": rng.uniform(4, 9),
+    }
+
+
+def _day_readings(rng: random.Random, cat: dict, day: str) -> list[tuple]:
+    def amount(mean: float, spread: float) -> float:
+        return round(max(1.5, rng.gauss(mean, spread)), 1)
+
+    am_hour = int(cat["am_time"][:2])
+    amps = amount(cat["base"], 2.5)
+    readings = [
+        (cat["am_time"], amps, "AMPS"),
+        (f"{am_hour + cat['peak']:02d}:00", amount(amps - cat["drop"], 1.5), "PEAK"),
+        (cat["pm_time"], amount(cat["base"] - 1, 2.5), "PMPS"),
+    ]
+    if rng.random() < OTHER_SHARE:
+        readings.append((f"{rng.randint(am_hour + 1, am_hour + 11):02d}:30", amount(cat["base"] - 3, 3), "OTHER"))
+    return [(cat["chat_id"], cat["user_id"], cat["name"], day, t, value, tag) for t, value, tag in readings]
+
+
+def generate(db_path: str, cats: int = 10, years: float = 1, seed: int = 1, end: date | None = None) -> int:
+    # Возвращает число вставленных замеров
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    create_db(db_path)
+
+    rng = random.Random(seed)
+    end = end or date.today()
+    days = int(years * 365)
+    start = end - timedelta(days=days - 1)
+    profiles = [_cat_profile(rng, idx) for idx in range(cats)]
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            "INSERT INTO cats (chat_id, user_id, name, is_active, am_time, peak, pm_time) VALUES (?, ?, ?, 1, ?, ?, ?)",
+            [(c["chat_id"], c["user_id"], c["name"], c["am_time"], c["peak"], c["pm_time"]) for c in profiles],
+        )
+        total = 0
+        batch: list[tuple] = []
+        for cat in profiles:
+            for offset in range(days):
+                if rng.random() < SKIP_DAY_SHARE:
+                    continue
+                batch.extend(_day_readings(rng, cat, (start + timedelta(days=offset)).isoformat()))
+                if len(batch) >= BATCH_SIZE:
+                    conn.executemany(_INSERT_MEASURE, batch)
+                    total += len(batch)
+                    batch.clear()
+        if batch:
+            conn.executemany(_INSERT_MEASURE, batch)
+            total += len(batch)
+        conn.commit()
+    finally:
+        conn.close()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="bench.db")
+    parser.add_argument("--cats", type=int, default=10)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="последний день данных, YYYY-MM-DD")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    total = generate(args.path, args.cats, args.years, args.seed, args.end)
+    elapsed = time.perf_counter() - started
+    print(f"{args.path}: {args.cats} котов × {args.years:g} лет, {total} замеров за {elapsed:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Нагрузочный тест бота целиком: диспетчер из main.build_dispatcher и polling.
+
+Вместо Telegram — своя сессия aiogram: getUpdates отдаёт синтетические апдейты,
+остальные методы API только записываются. Сеть не нужна.
+Виртуальные чаты проходят сценарий по шагам (следующий шаг — после ответа на
+предыдущий), общий темп апдейтов задаётся --rate.
+Запуск из корня проекта:
+    python -m benchmarks.load_test --chats 1000 --returning 50 --rate 200 --output load.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates, TelegramMethod
+from aiogram.types import TelegramObject, Update, User
+
+import config
+import db
+import main as bot_main
+import measure_flow
+import metrics
+from benchmarks.datagen import generate
+from createdb import create_db
+from repository import Repository
+
+# Длинный опрос фейкового API: сколько ждать апдейты, если очередь пуста
+POLL_TIMEOUT = 1
+# Telegram отдаёт не больше 100 апдейтов за один getUpdates
+POLL_LIMIT = 100
+LAG_INTERVAL = 0.05
+CHART_TAPS = ("chart:nadir", "chart:daily", "chart:range")
+
+
+class FakeTelegramSession(BaseSession):
+    # Сессия без сети: входящие апдейты из очереди, исходящие вызовы — в счётчик
+    def __init__(self, api_delay: float = 0.0):
+        super().__init__()
+        self.api_delay = api_delay
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.issued_at: dict[int, float] = {}
+        self.calls: Counter[str] = Counter()
+
+    def push(self, update: dict) -> None:
+        self.issued_at[update["update_id"]] = time.perf_counter()
+        self.updates.put_nowait(update)
+
+    async def _next_updates(self, timeout: float) -> list[dict]:
+        try:
+            batch = [await asyncio.wait_for(self.updates.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while len(batch) < POLL_LIMIT and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="Load test", username="load_test_bot")
+        if isinstance(method, GetUpdates):
+            batch = await self._next_updates(method.timeout or POLL_TIMEOUT)
+            return [Update.model_validate(item, context={"bot": bot}) for item in batch]
+
+        self.calls[type(method).__name__] += 1
+        if self.api_delay:
+            await asyncio.sleep(self.api_delay)
+        # Ответы API обработчики не используют, подробный объект не нужен
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self) -> None:
+        return None
+
+
+class UpdateTracker(BaseMiddleware):
+    # Внешний middleware: время от появления апдейта в очереди до конца обработки
+    def __init__(self, session: FakeTelegramSession):
+        self._session = session
+        self.waiters: dict[int, asyncio.Future] = {}
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        kind = _update_kind(event)
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors[kind] += 1
+            raise
+        finally:
+            issued = self._session.issued_at.pop(event.update_id, None)
+            if issued is not None:
+                self.latencies[kind].append(time.perf_counter() - issued)
+            waiter = self.waiters.pop(event.update_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+
+def _update_kind(update: Update) -> str:
+    # Группировка для отчёта: команда, префикс callback_data или просто текст
+    if update.callback_query is not None:
+        return "callback " + update.callback_query.data.split(":")[0]
+    text = update.message.text or ""
+    return "command " + text.split()[0] if text.startswith("/") else "text"
+
+
+def _message(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            "text": text,
+        },
+    }
+
+
+def _callback(update_id: int, chat_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "menu",
+            },
+        },
+    }
+
+
+def registration_steps(chat_id: int, rng: random.Random) -> list[tuple]:
+    name = f"Cat{chat_id}"
+    return [
+        ("message", "/start"),
+        ("callback", "register:start"),
+        ("message", name),
+        ("message", f"{rng.choice((7, 8, 9)):02d}:00"),
+        ("message", str(rng.choice((3, 4, 5)))),
+        ("message", f"{rng.choice((19, 20, 21)):02d}:00"),
+    ] + measure_steps(name, rng)
+
+
+def measure_steps(name: str, rng: random.Random) -> list[tuple]:
+    # Ручной замер через /measure и ответ на напоминание планировщика
+    return [
+        ("message", "/measure"),
+        ("callback", "measure:AMPS"),
+        ("message", f"{rng.uniform(8, 20):.1f}"),
+        ("reminder", ("PEAK", name)),
+        ("message", f"{rng.uniform(3, 9):.1f}"),
+    ]
+
+
+class LoadTest:
+    def __init__(self, session: FakeTelegramSession, tracker: UpdateTracker, rate: float):
+        self._session = session
+        self._tracker = tracker
+        self._interval = 1 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+        self._update_id = 0
+        self.sent = 0
+
+    async def _pace(self) -> None:
+        # Общий темп для всех чатов: не больше rate апдейтов в секунду
+        now = time.perf_counter()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def send(self, chat_id: int, kind: str, payload: str) -> None:
+        await self._pace()
+        self._update_id += 1
+        update_id = self._update_id
+        waiter = asyncio.get_running_loop().create_future()
+        self._tracker.waiters[update_id] = waiter
+        builder = _message if kind == "message" else _callback
+        self._session.push(builder(update_id, chat_id, payload))
+        self.sent += 1
+        await waiter
+
+    async def run_chat(self, chat_id: int, steps: list[tuple]) -> None:
+        for kind, payload in steps:
+            if kind == "reminder":
+                # То, что делает send_procedure_reminders перед вопросом о сахаре
+                tag, name = payload
+                measure_flow.set_pending_measure(chat_id, tag, name)
+                continue
+            await self.send(chat_id, kind, payload)
+
+
+async def _loop_lag(samples: list[float], stop: asyncio.Event) -> None:
+    # Насколько позже заказанного просыпается цикл событий
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(time.perf_counter() - started - LAG_INTERVAL)
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.5),
+        "p90": pick(0.9),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+def _scenarios(args, rng: random.Random, repo: Repository) -> list[tuple[int, list[tuple]]]:
+    scenarios = []
+    for row in repo.list_chats():
+        # Чаты с историей из datagen: меню, замер и графики по реальным данным
+        steps = [("message", "/start")] + measure_steps(row["name"], rng)
+        steps += [("callback", data) for data in CHART_TAPS if rng.random() < args.chart_share]
+        scenarios.append((row["chat_id"], steps))
+    for idx in range(args.chats):
+        chat_id = 1_000_000 + idx
+        steps = registration_steps(chat_id, rng)
+        steps += [("callback", data) for data in CHART_TAPS if rng.random() < args.chart_share]
+        scenarios.append((chat_id, steps))
+    rng.shuffle(scenarios)
+    return scenarios
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    if args.returning:
+        generate(db.DB_PATH, args.returning, args.years, args.seed)
+    else:
+        create_db(db.DB_PATH)
+
+    session = FakeTelegramSession(api_delay=args.api_delay / 1000)
+    tracker = UpdateTracker(session)
+    repo = bot_main.build_repository(db.DB_PATH)
+    dispatcher = bot_main.build_dispatcher(time.perf_counter(), repo, db.DB_PATH)
+    dispatcher.update.outer_middleware(tracker)
+    bot = Bot("123456:load-test", session=session)
+
+    polling = asyncio.create_task(
+        dispatcher.start_polling(bot, handle_signals=False, polling_timeout=POLL_TIMEOUT)
+    )
+    lag: list[float] = []
+    stop_lag = asyncio.Event()
+    lag_task = asyncio.create_task(_loop_lag(lag, stop_lag))
+
+    load = LoadTest(session, tracker, args.rate)
+    scenarios = _scenarios(args, rng, repo)
+    started = time.perf_counter()
+    await asyncio.gather(*(load.run_chat(chat_id, steps) for chat_id, steps in scenarios))
+    elapsed = time.perf_counter() - started
+
+    stop_lag.set()
+    await lag_task
+    await dispatcher.stop_polling()
+    await polling
+
+    all_latencies = [value for values in tracker.latencies.values() for value in values]
+    throttled = metrics.snapshot()["counters"].get("throttled_updates_total", {})
+    return {
+        "meta": {
+            "chats": args.chats,
+            "returning": args.returning,
+            "years": args.years,
+            "rate": args.rate,
+            "api_delay_ms": args.api_delay,
+            "render_workers": config.RENDER_WORKERS,
+            "seed": args.seed,
+        },
+        "updates": load.sent,
+        "seconds": elapsed,
+        "throughput": load.sent / elapsed if elapsed else 0,
+        "latency": _percentiles(all_latencies),
+        "latency_by_kind": {kind: _percentiles(values) for kind, values in sorted(tracker.latencies.items())},
+        "loop_lag": _percentiles(lag),
+        "errors": dict(tracker.errors),
+        "throttled": sum(throttled.values()),
+        "outbound_calls": dict(session.calls.most_common()),
+    }
+
+
+def _print_summary(report: dict) -> None:
+    def ms(stats: dict, key: str) -> str:
+        return f"{stats.get(key, 0) * 1000:.1f}"
+
+    latency, lag = report["latency"], report["loop_lag"]
+    print(
+        f"{report['updates']} апдейтов за {report['seconds']:.1f} с ({report['throughput']:.0f}/с), "
+        f"ошибок: {sum(report['errors'].values())}, отказов по частоте: {report['throttled']}",
+        file=sys.stderr,
+    )
+    print(
+        f"задержка p50/p90/p99/max: {ms(latency, 'p50')}/{ms(latency, 'p90')}/{ms(latency, 'p99')}/{ms(latency, 'max')} мс; "
+        f"лаг цикла p99/max: {ms(lag, 'p99')}/{ms(lag, 'max')} мс",
+        file=sys.stderr,
+    )
+    for kind, stats in report["latency_by_kind"].items():
+        print(f"  {kind:<20} {stats['count']:6d}  p50 {ms(stats, 'p50'):>8} мс  p99 {ms(stats, 'p99'):>8} мс", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=500, help="новые чаты, проходящие регистрацию")
+    parser.add_argument("--returning", type=int, default=20, help="чаты с историей замеров из datagen")
+    parser.add_argument("--years", type=float, default=1, help="длина истории для --returning")
+    parser.add_argument("--rate", type=float, default=200, help="апдейтов в секунду на все чаты, 0 — без ограничения")
+    parser.add_argument("--chart-share", type=float, default=0.2, help="вероятность нажатия каждой кнопки графика")
+    parser.add_argument("--api-delay", type=float, default=0, help="задержка ответа фейкового API, мс")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # Фоновые сервисы бота, которые мешают замеру или требуют сети
+    config.METRICS_PORT = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "load.db")
+        report = asyncio.run(run(args))
+
+    _print_summary(report)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
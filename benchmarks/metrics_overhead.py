@@ -0,0 +1,44 @@
+"""Накладные расходы инструментирования: metrics.observe и декоратор timed.
+
+Запуск из корня проекта: python -m benchmarks.metrics_overhead
+"""
+from __future__ import annotations
+
+import time
+
+import metrics
+
+CALLS = 200_000
+
+
+def _plain() -> int:
+    return 1
+
+
+@metrics.timed("bench_seconds")
+def _instrumented() -> int:
+    return 1
+
+
+def _per_call(func) -> float:
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        func()
+    return (time.perf_counter() - started) / CALLS
+
+
+def main() -> None:
+    plain = _per_call(_plain)
+    instrumented = _per_call(_instrumented)
+    observe = _per_call(lambda: metrics.observe("bench_observe_seconds", 0.01, handler="x"))
+    render_started = time.perf_counter()
+    text = metrics.render_prometheus()
+    render_ms = (time.perf_counter() - render_started) * 1000
+    print(f"вызов без метрик: {plain * 1e6:.2f} мкс")
+    print(f"вызов с @timed: {instrumented * 1e6:.2f} мкс (+{(instrumented - plain) * 1e6:.2f} мкс)")
+    print(f"metrics.observe: {observe * 1e6:.2f} мкс")
+    print(f"render_prometheus: {render_ms:.2f} мс, {len(text)} байт")
+
+
+if __name__ == "__main__":
+    main()
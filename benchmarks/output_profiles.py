@@ -0,0 +1,54 @@
+"""Размер картинок и время кодирования для каждого профиля вывода.
+
+Запуск из корня проекта: python -m benchmarks.output_profiles
+"""
+from __future__ import annotations
+
+import time
+from io import BytesIO
+
+import charts
+import image_profiles
+from benchmarks.range_percent import best_of, synthetic_rows
+
+
+def _daily_figure(rows):
+    fig, ax = charts._styled_axes(charts.DAILY_STYLE)
+    charts._draw_daily_bars(ax, rows)
+    fig.tight_layout()
+    return fig
+
+
+def _total_bytes(result) -> int:
+    if isinstance(result, BytesIO):
+        return len(result.getvalue())
+    return sum(len(item.getvalue()) for item in result)
+
+
+def main() -> None:
+    rows = synthetic_rows(60)
+    aggregates = charts.daily_aggregates(rows)
+    builders = {
+        "daily_curve": rows,
+        "nadir_chart": aggregates["nadirs"],
+        "amps_pmps_chart": aggregates["amps_pmps"],
+        "range_percent_chart": aggregates["counts"],
+        "dashboard_chart": rows,
+        "stats_table": rows,
+    }
+    figure = _daily_figure(rows)
+
+    for name, profile in image_profiles.OUTPUT_PROFILES.items():
+        encode = best_of(lambda: charts._encode_image(figure, profile))
+        print(f"[{name}] кодирование суточной кривой: {encode * 1000:.0f} мс")
+        image_profiles.set_active_profile(name)
+        for builder, data in builders.items():
+            started = time.perf_counter()
+            result = getattr(charts, builder)(data)
+            elapsed = time.perf_counter() - started
+            print(f"  {builder}: {_total_bytes(result) / 1024:.0f} КБ, {elapsed * 1000:.0f} мс")
+    image_profiles.set_active_profile("default")
+
+
+if __name__ == "__main__":
+    main()
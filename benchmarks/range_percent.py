@@ -0,0 +1,47 @@
+"""Замер скорости скользящего окна для charts.range_percent_chart.
+
+Запуск из корня проекта: python -m benchmarks.range_percent
+"""
+from __future__ import annotations
+
+import random
+import time
+from datetime import date, timedelta
+
+import charts
+
+HISTORIES = {"1 год": 365, "5 лет": 5 * 365}
+READINGS_PER_DAY = (("08:00", "AMPS"), ("12:00", "PEAK"), ("15:30", "OTHER"), ("20:00", "PMPS"))
+
+
+def synthetic_rows(days: int, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days - 1)
+    rows = []
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        for time_str, tag in READINGS_PER_DAY:
+            rows.append({"date": day, "time": time_str, "amount": round(rng.uniform(2, 20), 1), "tag": tag})
+    return rows
+
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    for label, days in HISTORIES.items():
+        rows = synthetic_rows(days)
+        counts = charts.daily_aggregates(rows)["counts"]
+        window = best_of(lambda: charts.rolling_in_range_percent(counts))
+        chart = best_of(lambda: charts.range_percent_chart(counts), repeat=1)
+        print(f"{label}: {len(rows)} замеров, окно {window * 1000:.2f} мс, график {chart * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
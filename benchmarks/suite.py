@@ -0,0 +1,252 @@
+"""Набор замеров: запросы db, проверки notifications, циклы scheduler и все графики.
+
+База генерируется benchmarks.datagen, результат пишется в JSON, чтобы сравнивать коммиты.
+Запуск из корня проекта:
+    python -m benchmarks.suite --cats 20 --years 3 --output before.json
+    python -m benchmarks.suite --cats 20 --years 3 --output after.json --baseline before.json
+Многолетняя история (графики «всё время» группируют сырые строки на лету):
+    python -m benchmarks.suite --cats 3 --years 10 --groups db
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import charts
+import config
+import db
+import notifications
+import render
+import scheduler
+from benchmarks.datagen import generate
+from measure_cache import MeasureCache
+from repository import Repository
+
+# Число повторов по группам: графики заметно медленнее запросов
+REPEATS = {"db": 30, "notifications": 30, "scheduler": 5, "charts": 3}
+
+
+@dataclass(frozen=True)
+class Case:
+    group: str
+    name: str
+    func: Callable[[], object]
+
+
+class _NullBot:
+    # Вместо Telegram: сообщения планировщика только считаются
+    id = 0
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent += 1
+
+
+def _db_cases(repo: Repository, chat_id: int, name: str) -> list[Case]:
+    today = date.today()
+    cases = [
+        ("get_cat_by_chat", lambda: repo.get_cat_by_chat(chat_id)),
+        ("get_cat_by_chat_and_name", lambda: repo.get_cat_by_chat_and_name(chat_id, name)),
+        ("list_chats", repo.list_chats),
+        ("get_history_start", lambda: repo.get_history_start(chat_id, name)),
+        ("get_last_measures", lambda: repo.get_last_measures(chat_id, name, 3)),
+        ("get_last_days[7]", lambda: repo.get_last_days(chat_id, name, 7)),
+        ("get_daily_measures[7]", lambda: repo.get_daily_measures(chat_id, name, 7)),
+        ("get_measures_between[90]", lambda: repo.get_measures_between(chat_id, name, today - timedelta(days=90), today)),
+    ]
+    for days in (60, 365, None):
+        suffix = f"[{days or 'all'}]"
+        cases += [
+            ("get_measures" + suffix, lambda days=days: repo.get_measures(chat_id, name, days)),
+            ("get_daily_buckets" + suffix, lambda days=days: repo.get_daily_buckets(chat_id, name, days)),
+            ("get_weekly_buckets" + suffix, lambda days=days: repo.get_weekly_buckets(chat_id, name, days)),
+            ("get_daily_nadirs" + suffix, lambda days=days: repo.get_daily_nadirs(chat_id, name, days)),
+            ("get_daily_amps_pmps" + suffix, lambda days=days: repo.get_daily_amps_pmps(chat_id, name, days)),
+            ("get_daily_range_counts" + suffix, lambda days=days: repo.get_daily_range_counts(chat_id, name, days)),
+        ]
+    # Те же выборки из кэша замеров в памяти (после первой загрузки серии)
+    cache = MeasureCache(repo, config.MEASURE_CACHE_DAYS, config.MEASURE_CACHE_BYTES)
+    cases += [
+        ("measure_cache.get_measures[60]", lambda: cache.get_measures(chat_id, name, 60)),
+        ("measure_cache.get_daily_measures[7]", lambda: cache.get_daily_measures(chat_id, name, 7)),
+        ("measure_cache.get_daily_nadirs[60]", lambda: cache.get_daily_nadirs(chat_id, name, 60)),
+        ("measure_cache.get_daily_amps_pmps[60]", lambda: cache.get_daily_amps_pmps(chat_id, name, 60)),
+        ("measure_cache.get_daily_range_counts[60]", lambda: cache.get_daily_range_counts(chat_id, name, 60)),
+    ]
+    return [Case("db", label, func) for label, func in cases]
+
+
+def _notification_cases(repo: Repository, chat_id: int, name: str) -> list[Case]:
+    cases = [
+        ("average_glucose_last_days[7]", lambda: notifications.average_glucose_last_days(repo, chat_id, name, 7)),
+        ("average_nadir_last_days[7]", lambda: notifications.average_nadir_last_days(repo, chat_id, name, 7)),
+        ("consecutive_nadir[5]", lambda: notifications.consecutive_nadir(repo, chat_id, name, 5, lambda v: v < 5)),
+        ("amps_peak_difference_low[3]", lambda: notifications.amps_peak_difference_low(repo, chat_id, name, 3)),
+    ]
+    return [Case("notifications", label, func) for label, func in cases]
+
+
+def _scheduler_cases(repo: Repository, am_time: str) -> list[Case]:
+    bot = _NullBot()
+    storage = MemoryStorage()
+    quiet = datetime.combine(date.today(), datetime.min.time()).replace(hour=3)
+    # За 15 минут до утреннего замера первого кота — ветка с напоминаниями
+    due = datetime.combine(date.today(), datetime.strptime(am_time, "%H:%M").time()) - timedelta(minutes=15)
+    cases = [
+        ("run_daily_checks", lambda: asyncio.run(scheduler.run_daily_checks(bot, repo))),
+        ("send_procedure_reminders[quiet]", lambda: asyncio.run(scheduler.send_procedure_reminders(bot, repo, storage, quiet))),
+        ("send_procedure_reminders[due]", lambda: asyncio.run(scheduler.send_procedure_reminders(bot, repo, storage, due))),
+    ]
+    return [Case("scheduler", label, func) for label, func in cases]
+
+
+def _chart_cases(repo: Repository, chat_id: int, name: str) -> list[Case]:
+    # Входные данные готовятся заранее так же, как в обработчиках main
+    rows = render.plain_rows(repo.get_measures(chat_id, name, 60))
+    month = render.plain_rows(repo.get_measures(chat_id, name, 30))
+    nadirs = render.plain_dicts(repo.get_daily_nadirs(chat_id, name, 60))
+    amps_pmps = render.plain_dicts(repo.get_daily_amps_pmps(chat_id, name, 60))
+    counts = render.plain_dicts(repo.get_daily_range_counts(chat_id, name, 60))
+    buckets = render.plain_dicts(repo.get_weekly_buckets(chat_id, name, None))
+    amps_pmps_all = render.plain_dicts(repo.get_daily_amps_pmps(chat_id, name, None))
+    cases = [
+        ("daily_curve", lambda: charts.daily_curve(month)),
+        ("nadir_chart", lambda: charts.nadir_chart(nadirs)),
+        ("amps_pmps_chart", lambda: charts.amps_pmps_chart(amps_pmps)),
+        ("range_percent_chart", lambda: charts.range_percent_chart(counts)),
+        ("daily_trend_chart", lambda: charts.daily_trend_chart(buckets)),
+        ("nadir_trend_chart", lambda: charts.nadir_trend_chart(buckets)),
+        ("amps_pmps_trend_chart", lambda: charts.amps_pmps_trend_chart(amps_pmps_all)),
+        ("range_trend_chart", lambda: charts.range_trend_chart(buckets)),
+        ("stats_table", lambda: charts.stats_table(rows)),
+        ("stats_table_pdf", lambda: charts.stats_table_pdf(rows)),
+        ("stats_report", lambda: charts.stats_report(rows)),
+        ("dashboard_chart", lambda: charts.dashboard_chart(rows)),
+    ]
+    return [Case("charts", label, func) for label, func in cases]
+
+
+def _measure(case: Case, repeat: int) -> dict:
+    case.func()  # прогрев: кэш страниц SQLite, шрифты matplotlib
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.func()
+        timings.append(time.perf_counter() - started)
+    return {
+        "group": case.group,
+        "name": case.name,
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def run(db_path: str, cats: int, years: float, seed: int, groups: set[str], scale: float = 1) -> dict:
+    readings = generate(db_path, cats, years, seed)
+    repo = db.SqliteRepository(db_path)
+    sample = repo.list_chats()[0]
+    chat_id, name = sample["chat_id"], sample["name"]
+    am_time = repo.get_cat_by_chat_and_name(chat_id, name)["am_time"]
+
+    builders = {
+        "db": lambda: _db_cases(repo, chat_id, name),
+        "notifications": lambda: _notification_cases(repo, chat_id, name),
+        "scheduler": lambda: _scheduler_cases(repo, am_time),
+        "charts": lambda: _chart_cases(repo, chat_id, name),
+    }
+    results = []
+    for group, build in builders.items():
+        if group not in groups:
+            continue
+        for case in build():
+            result = _measure(case, max(1, round(REPEATS[group] * scale)))
+            print(f"{group:<14} {case.name:<42} {result['median'] * 1000:9.2f} мс", file=sys.stderr)
+            results.append(result)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cats": cats,
+            "years": years,
+            "seed": seed,
+            "readings": readings,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    # Медиана текущего прогона относительно базового, > 1 — стало медленнее
+    before = {(item["group"], item["name"]): item["median"] for item in baseline["results"]}
+    print(f"сравнение с {baseline['meta'].get('commit') or 'baseline'}:", file=sys.stderr)
+    for item in current["results"]:
+        old = before.get((item["group"], item["name"]))
+        if not old:
+            continue
+        ratio = item["median"] / old
+        mark = " <-- медленнее" if ratio > 1.1 else ""
+        print(f"{item['group']:<14} {item['name']:<36} x{ratio:5.2f}{mark}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cats", type=int, default=20)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="куда сохранить сгенерированную базу (по умолчанию временный файл)")
+    parser.add_argument("--groups", default=",".join(REPEATS), help="через запятую: " + ", ".join(REPEATS))
+    parser.add_argument("--scale", type=float, default=1, help="множитель числа повторов")
+    parser.add_argument("--output", help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    groups = set(args.groups.split(","))
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args.db or os.path.join(tmp, "bench.db"), args.cats, args.years, args.seed, groups, args.scale)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            compare(json.load(fh), report)
+
+
+if __name__ == "__main__":
+    main()
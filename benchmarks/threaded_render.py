@@ -0,0 +1,54 @@
+"""Стресс-проверка: параллельная отрисовка графиков в пуле потоков.
+
+Каждый результат сравнивается с эталоном, нарисованным последовательно.
+Запуск из корня проекта: python -m benchmarks.threaded_render [задач] [потоков]
+"""
+from __future__ import annotations
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import charts
+from benchmarks.range_percent import synthetic_rows
+
+# График и ключ входных данных для него
+BUILDERS = (
+    ("daily_curve", "rows"),
+    ("nadir_chart", "nadirs"),
+    ("amps_pmps_chart", "amps_pmps"),
+    ("range_percent_chart", "counts"),
+    ("stats_table", "rows"),
+    ("dashboard_chart", "rows"),
+)
+
+
+def _as_bytes(result) -> tuple[bytes, ...]:
+    if isinstance(result, BytesIO):
+        return (result.getvalue(),)
+    return tuple(item.getvalue() for item in result)
+
+
+def main(jobs: int = 200, threads: int = 16) -> int:
+    rows = synthetic_rows(60)
+    inputs = {"rows": rows, **charts.daily_aggregates(rows)}
+
+    def _render(name: str) -> tuple[bytes, ...]:
+        return _as_bytes(getattr(charts, name)(inputs[dict(BUILDERS)[name]]))
+
+    expected = {name: _render(name) for name, _ in BUILDERS}
+    names = [BUILDERS[idx % len(BUILDERS)][0] for idx in range(jobs)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda name: (name, _render(name)), names))
+    elapsed = time.perf_counter() - started
+
+    mismatches = [name for name, images in results if images != expected[name]]
+    print(f"{jobs} графиков в {threads} потоках за {elapsed:.1f} с, расхождений: {len(mismatches)}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:3])))
@@ -1,16 +1,38 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from io import BytesIO
 from typing import Iterable
 
 import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
+from PIL import Image
 
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+import image_profiles
+import metrics
+from downsample import lttb_indices
+from image_profiles import OutputProfile
+
+
+@dataclass(frozen=True)
+class ChartStyle:
+    title: str
+    ylabel: str
+    color: str
+    xlabel: str = "Дата"
+    figsize: tuple[float, float] = (10, 4)
+
+
+DAILY_STYLE = ChartStyle("Суточная кривая", "Уровень сахара", "#4dabf7")
+NADIR_STYLE = ChartStyle("Nadir за день", "Минимальный сахар", "#845ef7")
+AMPS_STYLE = ChartStyle("AMPS по дням", "Уровень сахара", "#12b886")
+PMPS_STYLE = ChartStyle("PMPS по дням", "Уровень сахара", "#fab005")
+RANGE_STYLE = ChartStyle("% в диапазоне", "Процент", "#228be6")
 
 
 def _dates_from_rows(rows) -> list[date]:
@@ -25,16 +47,83 @@ def _group_by_date(rows):
     return grouped
 
 
+def _new_figure(figsize: tuple[float, float]) -> Figure:
+    # Фигура без pyplot: своя канва Agg, никакого глобального состояния
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _apply_style(ax, style: ChartStyle) -> None:
+    ax.set_title(style.title)
+    ax.set_ylabel(style.ylabel)
+    ax.set_xlabel(style.xlabel)
+
+
+def _styled_axes(style: ChartStyle):
+    fig = _new_figure(style.figsize)
+    ax = fig.subplots()
+    _apply_style(ax, style)
+    return fig, ax
+
+
+@metrics.timed("chart_encode_seconds")
+def _encode_image(fig: Figure, profile: OutputProfile | None = None, **kwargs) -> BytesIO:
+    profile = profile or image_profiles.active_profile()
+    buffer = BytesIO()
+    if profile == image_profiles.OUTPUT_PROFILES["default"]:
+        fig.savefig(buffer, format="png", **kwargs)
+        buffer.seek(0)
+        return buffer
+
+    # Быстрый несжатый PNG как промежуточный растр, дальше кодирует Pillow
+    fig.savefig(buffer, format="png", dpi=profile.dpi, pil_kwargs={"compress_level": 0}, **kwargs)
+    buffer.seek(0)
+    image = Image.open(buffer).convert("RGB")
+    result = BytesIO()
+    if profile.image_format == "png":
+        if profile.colors:
+            image = image.quantize(colors=profile.colors, dither=Image.Dither.NONE)
+        image.save(result, format="PNG", optimize=True, compress_level=profile.compress_level)
+    else:
+        image.save(result, format=profile.image_format.upper(), quality=profile.quality)
+    result.seek(0)
+    return result
+
+
+def _draw_line(ax, dates, values, style: ChartStyle, shade: tuple[float, float] | None = None, **kwargs) -> None:
+    ax.plot(dates, values, marker="o", color=style.color, **kwargs)
+    if shade:
+        _shade_ranges(ax, *shade)
+    ax.set_ylim(bottom=0)
+
+
+def _line_chart(dates, values, style: ChartStyle, shade: tuple[float, float] | None = None) -> BytesIO:
+    fig, ax = _styled_axes(style)
+    _draw_line(ax, dates, values, style, shade)
+    fig.autofmt_xdate(rotation=45)
+    fig.tight_layout()
+    return _encode_image(fig)
+
+
+def warmup() -> None:
+    # Первая отрисовка строит кэш шрифтов и инициализирует Agg
+    fig = _new_figure((2, 2))
+    ax = fig.subplots()
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("warmup")
+    fig.savefig(BytesIO(), format="png")
+
+
 def _shade_ranges(ax, low: float, high: float):
     ax.axhspan(0, low, color="#ff6b6b", alpha=0.15)
     ax.axhspan(high, max(high + 1, 20), color="#ffd166", alpha=0.15)
 
 
-def daily_curve(rows) -> BytesIO:
-    # Столбчатая диаграмма всех замеров за день
+def _draw_daily_bars(ax, rows) -> None:
+    # Все замеры дня — узкие столбцы внутри слота даты
     grouped = _group_by_date(rows)
     dates = sorted(grouped.keys(), key=lambda d: datetime.strptime(d, "%Y-%m-%d"))
-    fig, ax = plt.subplots(figsize=(10, 4))
 
     x_values = []
     y_values = []
@@ -55,167 +144,289 @@ def daily_curve(rows) -> BytesIO:
             widths.append(bar_width)
         labels.append(day)
 
-    ax.bar(x_values, y_values, width=widths, color="#4dabf7", align="center")
+    ax.bar(x_values, y_values, width=widths, color=DAILY_STYLE.color, align="center")
     _shade_ranges(ax, 4, 10)
-    ax.set_title("Суточная кривая")
-    ax.set_ylabel("Уровень сахара")
-    ax.set_xlabel("Дата")
     ax.set_xticks(range(len(labels)))
     ax.set_xticklabels(labels, rotation=45, ha="right")
     ax.set_ylim(bottom=0)
-    fig.tight_layout()
 
-    buffer = BytesIO()
-    fig.savefig(buffer, format="png")
-    buffer.seek(0)
-    plt.close(fig)
-    return buffer
 
-
-def nadir_chart(rows) -> BytesIO:
-    # Линия минимальных значений по дням
-    grouped = _group_by_date(rows)
-    dates = sorted(grouped.keys())
-    nadirs = []
-    for day in dates:
-        values = [row["amount"] for row in grouped[day]]
-        nadirs.append(min(values))
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(dates, nadirs, marker="o", color="#845ef7")
-    _shade_ranges(ax, 4, 9)
-    ax.set_title("Nadir за день")
-    ax.set_ylabel("Минимальный сахар")
-    ax.set_xlabel("Дата")
-    ax.set_ylim(bottom=0)
-    fig.autofmt_xdate(rotation=45)
+@metrics.timed("chart_build_seconds")
+def daily_curve(rows) -> BytesIO:
+    # Столбчатая диаграмма всех замеров за день
+    fig, ax = _styled_axes(DAILY_STYLE)
+    _draw_daily_bars(ax, rows)
     fig.tight_layout()
+    return _encode_image(fig)
 
-    buffer = BytesIO()
-    fig.savefig(buffer, format="png")
-    buffer.seek(0)
-    plt.close(fig)
-    return buffer
 
+@metrics.timed("chart_build_seconds")
+def nadir_chart(nadirs) -> BytesIO:
+    # Линия минимальных значений по дням; nadirs — строки (date, nadir) из SQLite
+    dates = [day["date"] for day in nadirs]
+    values = [day["nadir"] for day in nadirs]
+    return _line_chart(dates, values, NADIR_STYLE, shade=(4, 9))
 
-def _pick_tag_or_fallback(day_rows, tag: str, fallback: str):
-    for row in day_rows:
-        if row["tag"] == tag:
-            return row["amount"]
-    if fallback == "first":
-        return day_rows[0]["amount"]
-    return day_rows[-1]["amount"]
 
+@metrics.timed("chart_build_seconds")
+def amps_pmps_chart(days) -> tuple[BytesIO, BytesIO]:
+    # Два графика: утренние и вечерние замеры; days — строки (date, amps, pmps)
+    dates = [day["date"] for day in days]
+    amps = [day["amps"] for day in days]
+    pmps = [day["pmps"] for day in days]
+    return _line_chart(dates, amps, AMPS_STYLE), _line_chart(dates, pmps, PMPS_STYLE)
 
-def amps_pmps_chart(rows) -> tuple[BytesIO, BytesIO]:
-    # Два графика: утренние и вечерние замеры
-    grouped = _group_by_date(rows)
-    dates = sorted(grouped.keys())
 
-    amps = []
-    pmps = []
-    for day in dates:
-        day_rows = sorted(grouped[day], key=lambda r: r["time"])
-        amps.append(_pick_tag_or_fallback(day_rows, "AMPS", "first"))
-        pmps.append(_pick_tag_or_fallback(day_rows, "PMPS", "last"))
-
-    fig1, ax1 = plt.subplots(figsize=(10, 4))
-    ax1.plot(dates, amps, marker="o", color="#12b886")
-    ax1.set_title("AMPS по дням")
-    ax1.set_ylabel("Уровень сахара")
-    ax1.set_xlabel("Дата")
-    ax1.set_ylim(bottom=0)
-    fig1.autofmt_xdate(rotation=45)
-    fig1.tight_layout()
-
-    fig2, ax2 = plt.subplots(figsize=(10, 4))
-    ax2.plot(dates, pmps, marker="o", color="#fab005")
-    ax2.set_title("PMPS по дням")
-    ax2.set_ylabel("Уровень сахара")
-    ax2.set_xlabel("Дата")
-    ax2.set_ylim(bottom=0)
-    fig2.autofmt_xdate(rotation=45)
-    fig2.tight_layout()
-
-    buf1 = BytesIO()
-    fig1.savefig(buf1, format="png")
-    buf1.seek(0)
-    buf2 = BytesIO()
-    fig2.savefig(buf2, format="png")
-    buf2.seek(0)
-    plt.close(fig1)
-    plt.close(fig2)
-    return buf1, buf2
-
-
-def range_percent_chart(rows) -> BytesIO:
-    grouped = _group_by_date(rows)
-    dates = sorted(grouped.keys())
-    if not dates:
-        dates = []
+def rolling_in_range_percent(counts, window_days: int = 7) -> tuple[list[str], list[float]]:
+    # counts — строки (date, count, in_range) по возрастанию даты.
+    # Окно двигается двумя указателями, каждый день входит и выходит один раз.
+    dates = [day["date"] for day in counts]
+    ordinals = [date.fromisoformat(day).toordinal() for day in dates]
     percent_values = []
+    window_total = 0
+    window_good = 0
+    start = 0
+    for end, day in enumerate(counts):
+        window_total += day["count"]
+        window_good += day["in_range"]
+        while ordinals[start] <= ordinals[end] - window_days:
+            window_total -= counts[start]["count"]
+            window_good -= counts[start]["in_range"]
+            start += 1
+        percent_values.append(round(window_good / window_total * 100, 1))
+    return dates, percent_values
+
+
+def _range_title(window_days: int, low: float, high: float) -> str:
+    return f"{RANGE_STYLE.title} {low:g}–{high:g} (скользящее окно {window_days} дней)"
+
+
+@metrics.timed("chart_build_seconds")
+def range_percent_chart(
+    counts,
+    window_days: int = 7,
+    low: float = 4,
+    high: float = 10,
+) -> BytesIO:
+    # in_range в counts считается запросом: вызывающий передаёт туда те же low/high,
+    # здесь они только для подписи
+    fig, ax = _styled_axes(RANGE_STYLE)
+    _draw_range_bars(ax, counts, window_days, low, high)
+    fig.tight_layout()
+    return _encode_image(fig)
 
-    parsed_dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in dates]
-    for day in parsed_dates:
-        start = day - timedelta(days=6)
-        window_rows = [row for row in rows if start <= datetime.strptime(row["date"], "%Y-%m-%d").date() <= day]
-        if not window_rows:
-            percent_values.append(0)
-            continue
-        good = [row for row in window_rows if 4 < row["amount"] < 10]
-        percent = round(len(good) / len(window_rows) * 100, 1)
-        percent_values.append(percent)
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.bar(dates, percent_values, color="#228be6")
-    ax.set_title("% в диапазоне 4–10 (скользящее окно 7 дней)")
-    ax.set_ylabel("Процент")
+
+def _draw_range_bars(ax, counts, window_days: int, low: float, high: float) -> None:
+    dates, percent_values = rolling_in_range_percent(counts, window_days)
+    ax.bar(dates, percent_values, color=RANGE_STYLE.color)
+    ax.set_title(_range_title(window_days, low, high))
     ax.set_ylim(0, 100)
-    ax.set_xlabel("Дата")
     ax.tick_params(axis="x", rotation=45)
-    fig.tight_layout()
 
-    buffer = BytesIO()
-    fig.savefig(buffer, format="png")
-    buffer.seek(0)
-    plt.close(fig)
-    return buffer
+
+def daily_aggregates(rows, low: float = 4, high: float = 10) -> dict[str, list[dict]]:
+    # Те же агрегаты, что отдают db.get_daily_*, но из уже загруженных замеров.
+    # rows должны идти по возрастанию даты и времени, как их возвращает get_measures.
+    grouped = _group_by_date(rows)
+    counts, nadirs, amps_pmps = [], [], []
+    for day in sorted(grouped.keys()):
+        day_rows = grouped[day]
+        amounts = [row["amount"] for row in day_rows]
+        first_by_tag = {}
+        for row in day_rows:
+            first_by_tag.setdefault(row["tag"], row["amount"])
+        counts.append({"date": day, "count": len(amounts), "in_range": sum(low < v < high for v in amounts)})
+        nadirs.append({"date": day, "nadir": min(amounts)})
+        amps_pmps.append(
+            {
+                "date": day,
+                "amps": first_by_tag.get("AMPS", amounts[0]),
+                "pmps": first_by_tag.get("PMPS", amounts[-1]),
+            }
+        )
+    return {"counts": counts, "nadirs": nadirs, "amps_pmps": amps_pmps}
 
 
-def _build_stats_table_figures(
+def _thin_xticks(ax, max_ticks: int = 10) -> None:
+    # На маленьких панелях оставляем каждую n-ю подпись даты
+    ticks = ax.get_xticks()
+    labels = [label.get_text() for label in ax.get_xticklabels()]
+    step = max(1, -(-len(ticks) // max_ticks))
+    ax.set_xticks(ticks[::step])
+    ax.set_xticklabels(labels[::step], rotation=45, ha="right")
+
+
+@metrics.timed("chart_build_seconds")
+def dashboard_chart(
     rows,
-    max_rows: int = 28,
-    labels: dict[str, str] | None = None,
-):
+    daily_days: int = 30,
+    window_days: int = 7,
+    low: float = 4,
+    high: float = 10,
+) -> BytesIO:
+    # Все четыре графика на одной картинке из одной выборки замеров.
+    # Суточная кривая — за последние daily_days дней, остальное — за весь rows.
+    aggregates = daily_aggregates(rows, low, high)
+    cutoff = (date.today() - timedelta(days=daily_days)).isoformat()
+    recent_rows = [row for row in rows if row["date"] >= cutoff]
+
+    fig = _new_figure((16, 10))
+    (daily_ax, nadir_ax), (amps_ax, range_ax) = fig.subplots(2, 2)
+
+    _apply_style(daily_ax, DAILY_STYLE)
+    _draw_daily_bars(daily_ax, recent_rows)
+
+    dates = [day["date"] for day in aggregates["nadirs"]]
+    _apply_style(nadir_ax, NADIR_STYLE)
+    _draw_line(nadir_ax, dates, [day["nadir"] for day in aggregates["nadirs"]], NADIR_STYLE, shade=(4, 9))
+
+    _apply_style(amps_ax, ChartStyle("AMPS / PMPS по дням", AMPS_STYLE.ylabel, AMPS_STYLE.color))
+    _draw_line(amps_ax, dates, [day["amps"] for day in aggregates["amps_pmps"]], AMPS_STYLE, label="AMPS")
+    _draw_line(amps_ax, dates, [day["pmps"] for day in aggregates["amps_pmps"]], PMPS_STYLE, label="PMPS")
+    amps_ax.legend(loc="upper left")
+
+    _apply_style(range_ax, RANGE_STYLE)
+    _draw_range_bars(range_ax, aggregates["counts"], window_days, low, high)
+
+    for ax in (daily_ax, nadir_ax, amps_ax, range_ax):
+        _thin_xticks(ax)
+    fig.tight_layout()
+    return _encode_image(fig)
+
+
+# --- Длинные периоды: агрегаты по дням/неделям и прореживание LTTB ---
+
+TREND_MAX_POINTS = 120
+
+
+def _downsample(dates: list[str], series: list[float], max_points: int) -> list[int]:
+    ordinals = [date.fromisoformat(day).toordinal() for day in dates]
+    return lttb_indices(ordinals, series, max_points)
+
+
+def _trend_chart(
+    dates: list[str],
+    values: list[float],
+    style: ChartStyle,
+    max_points: int = TREND_MAX_POINTS,
+    shade: tuple[float, float] | None = None,
+    band: tuple[list[float], list[float]] | None = None,
+    ylim: tuple[float, float] | None = None,
+) -> BytesIO:
+    # Ось X — настоящие даты, поэтому размер картинки не зависит от длины истории
+    keep = _downsample(dates, values, max_points)
+    x_values = [date.fromisoformat(dates[idx]) for idx in keep]
+    fig, ax = _styled_axes(style)
+    if band:
+        lower, upper = band
+        ax.fill_between(
+            x_values,
+            [lower[idx] for idx in keep],
+            [upper[idx] for idx in keep],
+            color=style.color,
+            alpha=0.2,
+            linewidth=0,
+        )
+    ax.plot(x_values, [values[idx] for idx in keep], color=style.color)
+    if shade:
+        _shade_ranges(ax, *shade)
+    if ylim:
+        ax.set_ylim(*ylim)
+    else:
+        ax.set_ylim(bottom=0)
+    fig.autofmt_xdate(rotation=45)
+    fig.tight_layout()
+    return _encode_image(fig)
+
+
+@metrics.timed("chart_build_seconds")
+def daily_trend_chart(buckets, max_points: int = TREND_MAX_POINTS) -> BytesIO:
+    # Среднее за день/неделю и коридор от минимума до максимума
+    dates = [bucket["date"] for bucket in buckets]
+    return _trend_chart(
+        dates,
+        [bucket["avg"] for bucket in buckets],
+        DAILY_STYLE,
+        max_points=max_points,
+        shade=(4, 10),
+        band=([bucket["min"] for bucket in buckets], [bucket["max"] for bucket in buckets]),
+    )
+
+
+@metrics.timed("chart_build_seconds")
+def nadir_trend_chart(buckets, max_points: int = TREND_MAX_POINTS) -> BytesIO:
+    dates = [bucket["date"] for bucket in buckets]
+    return _trend_chart(
+        dates,
+        [bucket["nadir"] for bucket in buckets],
+        NADIR_STYLE,
+        max_points=max_points,
+        shade=(4, 9),
+    )
+
+
+@metrics.timed("chart_build_seconds")
+def amps_pmps_trend_chart(days, max_points: int = TREND_MAX_POINTS) -> tuple[BytesIO, BytesIO]:
+    dates = [day["date"] for day in days]
+    return (
+        _trend_chart(dates, [day["amps"] for day in days], AMPS_STYLE, max_points=max_points),
+        _trend_chart(dates, [day["pmps"] for day in days], PMPS_STYLE, max_points=max_points),
+    )
+
+
+@metrics.timed("chart_build_seconds")
+def range_trend_chart(
+    buckets,
+    window_days: int = 7,
+    low: float = 4,
+    high: float = 10,
+    max_points: int = TREND_MAX_POINTS,
+) -> BytesIO:
+    dates, percent_values = rolling_in_range_percent(buckets, window_days)
+    style = ChartStyle(_range_title(window_days, low, high), RANGE_STYLE.ylabel, RANGE_STYLE.color)
+    return _trend_chart(dates, percent_values, style, max_points=max_points, ylim=(0, 100))
+
+
+INSULIN_MARK_COLOR = "#d0ebff"
+
+
+@dataclass
+class StatsLayout:
+    # Готовые ячейки таблицы: группировка и сортировка делаются один раз
+    columns: list[str]
+    rows: list[list[str]]
+    highlights: list[dict[str, bool]]
+
+
+def _stats_row_values(day_rows, other_columns: int):
+    by_tag = {}
+    for row in day_rows:
+        tag = row["tag"]
+        if tag not in by_tag:
+            by_tag[tag] = row
+    amps = by_tag.get("AMPS")
+    peak = by_tag.get("PEAK")
+    pmps = by_tag.get("PMPS")
+    other_rows = [row for row in day_rows if row["tag"] == "OTHER"]
+    other_cells = [
+        f"{row['amount']:.1f} ({row['time']})"
+        for row in other_rows
+    ]
+    if len(other_cells) < other_columns:
+        other_cells.extend([""] * (other_columns - len(other_cells)))
+    return {
+        "amps": f"{amps['amount']:.1f}" if amps else "",
+        "peak": f"{peak['amount']:.1f}" if peak else "",
+        "pmps": f"{pmps['amount']:.1f}" if pmps else "",
+        "other_cells": other_cells,
+        "amps_insulin": bool(amps and amps["amount"] > 10),
+        "pmps_insulin": bool(pmps and pmps["amount"] > 10),
+    }
+
+
+def stats_table_layout(rows, labels: dict[str, str] | None = None) -> StatsLayout:
     grouped = _group_by_date(rows)
     dates = sorted(grouped.keys())
-    figures = []
-    insulin_mark_color = "#d0ebff"
-
-    def _row_values(day_rows, other_columns: int):
-        by_tag = {}
-        for row in day_rows:
-            tag = row["tag"]
-            if tag not in by_tag:
-                by_tag[tag] = row
-        amps = by_tag.get("AMPS")
-        peak = by_tag.get("PEAK")
-        pmps = by_tag.get("PMPS")
-        other_rows = [row for row in day_rows if row["tag"] == "OTHER"]
-        other_cells = [
-            f"{row['amount']:.1f} ({row['time']})"
-            for row in other_rows
-        ]
-        if len(other_cells) < other_columns:
-            other_cells.extend([""] * (other_columns - len(other_cells)))
-        return {
-            "amps": f"{amps['amount']:.1f}" if amps else "",
-            "peak": f"{peak['amount']:.1f}" if peak else "",
-            "pmps": f"{pmps['amount']:.1f}" if pmps else "",
-            "other_cells": other_cells,
-            "amps_insulin": bool(amps and amps["amount"] > 10),
-            "pmps_insulin": bool(pmps and pmps["amount"] > 10),
-        }
 
     other_counts = [
         len([row for row in grouped[day] if row["tag"] == "OTHER"])
@@ -227,7 +438,7 @@ def _build_stats_table_figures(
     highlighted_rows = []
     for day in dates:
         day_rows = sorted(grouped[day], key=lambda r: r["time"])
-        values = _row_values(day_rows, max_other)
+        values = _stats_row_values(day_rows, max_other)
         rows_data.append([day, values["amps"], values["peak"], values["pmps"], *values["other_cells"]])
         highlighted_rows.append(
             {
@@ -236,80 +447,110 @@ def _build_stats_table_figures(
             }
         )
 
-    for start in range(0, len(rows_data), max_rows):
-        chunk = rows_data[start : start + max_rows]
-        chunk_highlights = highlighted_rows[start : start + max_rows]
-        total_columns = 4 + max_other
-        fig, ax = plt.subplots(figsize=(max(8, 1.35 * total_columns), 0.32 * (len(chunk) + 3)))
-        ax.axis("off")
-        label_map = labels or {}
-        table = ax.table(
-            cellText=chunk,
-            colLabels=[
-                "Дата",
-                label_map.get("AMPS", "AMPS"),
-                label_map.get("PEAK", "PEAK"),
-                label_map.get("PMPS", "PMPS"),
-                *[""] * max_other,
-            ],
-            loc="center",
-        )
-        table.auto_set_font_size(False)
-        table.set_fontsize(8)
-        for row_idx, highlights in enumerate(chunk_highlights, start=1):
-            if highlights["amps"]:
-                table[(row_idx, 1)].set_facecolor(insulin_mark_color)
-                table[(row_idx, 1)].set_alpha(0.45)
-            if highlights["pmps"]:
-                table[(row_idx, 3)].set_facecolor(insulin_mark_color)
-                table[(row_idx, 3)].set_alpha(0.45)
-
-        table.scale(1, 1.3)
-        ax.set_title("Статистика измерений")
-        ax.add_patch(
-            Rectangle(
-                (0.02, -0.06),
-                0.03,
-                0.03,
-                transform=ax.transAxes,
-                color=insulin_mark_color,
-                alpha=0.45,
-                clip_on=False,
-            )
-        )
-        ax.text(
-            0.06,
-            -0.045,
-            "после измерения был введён инсулин",
+    label_map = labels or {}
+    columns = [
+        "Дата",
+        label_map.get("AMPS", "AMPS"),
+        label_map.get("PEAK", "PEAK"),
+        label_map.get("PMPS", "PMPS"),
+        *[""] * max_other,
+    ]
+    return StatsLayout(columns=columns, rows=rows_data, highlights=highlighted_rows)
+
+
+def _stats_table_page(layout: StatsLayout, start: int, stop: int) -> Figure:
+    chunk = layout.rows[start:stop]
+    chunk_highlights = layout.highlights[start:stop]
+    total_columns = len(layout.columns)
+    fig = _new_figure((max(8, 1.35 * total_columns), 0.32 * (len(chunk) + 3)))
+    ax = fig.subplots()
+    ax.axis("off")
+    table = ax.table(
+        cellText=chunk,
+        colLabels=layout.columns,
+        loc="center",
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(8)
+    for row_idx, highlights in enumerate(chunk_highlights, start=1):
+        if highlights["amps"]:
+            table[(row_idx, 1)].set_facecolor(INSULIN_MARK_COLOR)
+            table[(row_idx, 1)].set_alpha(0.45)
+        if highlights["pmps"]:
+            table[(row_idx, 3)].set_facecolor(INSULIN_MARK_COLOR)
+            table[(row_idx, 3)].set_alpha(0.45)
+
+    table.scale(1, 1.3)
+    ax.set_title("Статистика измерений")
+    ax.add_patch(
+        Rectangle(
+            (0.02, -0.06),
+            0.03,
+            0.03,
             transform=ax.transAxes,
-            ha="left",
-            va="center",
-            fontsize=9,
+            color=INSULIN_MARK_COLOR,
+            alpha=0.45,
+            clip_on=False,
         )
-        fig.tight_layout()
-        figures.append(fig)
+    )
+    ax.text(
+        0.06,
+        -0.045,
+        "после измерения был введён инсулин",
+        transform=ax.transAxes,
+        ha="left",
+        va="center",
+        fontsize=9,
+    )
+    fig.tight_layout()
+    return fig
 
-    return figures
 
+def _stats_table_figures(layout: StatsLayout, max_rows: int = 28):
+    # Страницы строятся по одной, чтобы не держать в памяти все фигуры сразу
+    for start in range(0, len(layout.rows), max_rows):
+        yield _stats_table_page(layout, start, start + max_rows)
 
-def stats_table(rows, max_rows: int = 28, labels: dict[str, str] | None = None) -> list[BytesIO]:
-    figures = _build_stats_table_figures(rows, max_rows=max_rows, labels=labels)
+
+@metrics.timed("chart_build_seconds")
+def stats_report(
+    rows,
+    max_rows: int = 28,
+    labels: dict[str, str] | None = None,
+    png: bool = True,
+    pdf_file=None,
+    png_from: int = 0,
+) -> tuple[list[BytesIO], BytesIO | None]:
+    # Каждая страница строится один раз и сохраняется сразу в PNG и в PDF.
+    # Если передан pdf_file (путь или файл), страницы PDF пишутся в него по мере готовности.
+    # Страницы до png_from идут только в PDF: их PNG уже есть в ночной сводке.
+    layout = stats_table_layout(rows, labels=labels)
     tables = []
-    for fig in figures:
-        buffer = BytesIO()
-        fig.savefig(buffer, format="png", bbox_inches="tight")
-        buffer.seek(0)
-        plt.close(fig)
-        tables.append(buffer)
-    return tables
+    pdf_buffer = BytesIO() if pdf_file is None else None
+    with PdfPages(pdf_file if pdf_file is not None else pdf_buffer) as pdf:
+        for page, fig in enumerate(_stats_table_figures(layout, max_rows=max_rows)):
+            # Обрезку по содержимому считаем один раз для обоих форматов
+            bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(
+                matplotlib.rcParams["savefig.pad_inches"]
+            )
+            if png and page >= png_from:
+                tables.append(_encode_image(fig, bbox_inches=bbox))
+            pdf.savefig(fig, bbox_inches=bbox)
+    if pdf_buffer is not None:
+        pdf_buffer.seek(0)
+    return tables, pdf_buffer
 
 
+@metrics.timed("chart_build_seconds")
+def stats_table(rows, max_rows: int = 28, labels: dict[str, str] | None = None) -> list[BytesIO]:
+    layout = stats_table_layout(rows, labels=labels)
+    return [
+        _encode_image(fig, bbox_inches="tight")
+        for fig in _stats_table_figures(layout, max_rows=max_rows)
+    ]
+
+
+@metrics.timed("chart_build_seconds")
 def stats_table_pdf(rows, max_rows: int = 28, labels: dict[str, str] | None = None) -> BytesIO:
-    figures = _build_stats_table_figures(rows, max_rows=max_rows, labels=labels)
-    buffer = BytesIO()
-    with PdfPages(buffer) as pdf:
-        for fig in figures:
-            pdf.savefig(fig, bbox_inches="tight")
-            plt.close(fig)
-    buffer.seek(0)
+    _, buffer = stats_report(rows, max_rows=max_rows, labels=labels, png=False)
     return buffer
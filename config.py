@@ -0,0 +1,116 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return float(value)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_ids(name: str) -> frozenset[int]:
+    value = os.getenv(name, "")
+    return frozenset(int(item) for item in value.replace(" ", "").split(",") if item)
+
+
+# Число процессов, которые рисуют графики
+RENDER_WORKERS = _env_int("DIABOT_RENDER_WORKERS", 2)
+
+# Прогревать процессы отрисовки сразу после запуска бота
+RENDER_WARMUP = _env_flag("DIABOT_RENDER_WARMUP", True)
+
+# Профиль картинок графиков: default, phone, webp или jpeg (см. image_profiles)
+CHART_PROFILE = os.getenv("DIABOT_CHART_PROFILE", "default")
+
+# Целевой диапазон сахара для графика «% в диапазоне» (границы не включаются)
+RANGE_LOW = _env_float("DIABOT_RANGE_LOW", 4)
+RANGE_HIGH = _env_float("DIABOT_RANGE_HIGH", 10)
+
+# Режим работы: polling или webhook
+BOT_MODE = os.getenv("DIABOT_MODE", "polling")
+
+# Webhook: адрес, который видит Telegram, и где слушает встроенный сервер
+WEBHOOK_URL = os.getenv("DIABOT_WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("DIABOT_WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("DIABOT_WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = _env_int("DIABOT_WEBHOOK_PORT", 8080)
+WEBHOOK_SECRET = os.getenv("DIABOT_WEBHOOK_SECRET", "")
+# Сколько апдейтов обрабатывается одновременно
+WEBHOOK_CONCURRENCY = _env_int("DIABOT_WEBHOOK_CONCURRENCY", 32)
+# Сколько секунд ждать незавершённые апдейты при остановке
+WEBHOOK_SHUTDOWN_TIMEOUT = _env_int("DIABOT_WEBHOOK_SHUTDOWN_TIMEOUT", 30)
+
+# Ограничение частоты на чат: дешёвые сообщения и тяжёлые графики отдельно
+THROTTLE_TEXT_BURST = _env_float("DIABOT_THROTTLE_TEXT_BURST", 10)
+THROTTLE_TEXT_RATE = _env_float("DIABOT_THROTTLE_TEXT_RATE", 1)
+# Запас на просмотр всех графиков подряд (их 7 вместе с экспортом), дальше один раз в 2 с
+THROTTLE_RENDER_BURST = _env_float("DIABOT_THROTTLE_RENDER_BURST", 8)
+THROTTLE_RENDER_RATE = _env_float("DIABOT_THROTTLE_RENDER_RATE", 0.5)
+# Сколько чатов помнить; самые давние вытесняются
+THROTTLE_MAX_CHATS = _env_int("DIABOT_THROTTLE_MAX_CHATS", 100_000)
+
+# Метрики Prometheus: по умолчанию выключены, включаются портом (например, 9108)
+METRICS_HOST = os.getenv("DIABOT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _env_int("DIABOT_METRICS_PORT", 0)
+
+# Профилирование: доля апдейтов под cProfile (0 — выключено), каталог и сколько файлов хранить
+PROFILE_SAMPLE_RATE = _env_float("DIABOT_PROFILE_SAMPLE_RATE", 0)
+PROFILE_DIR = os.getenv("DIABOT_PROFILE_DIR", "profiles")
+PROFILE_KEEP = _env_int("DIABOT_PROFILE_KEEP", 100)
+# Глубина стека для tracemalloc; 0 — не запускать при старте, только по команде
+TRACEMALLOC_FRAMES = _env_int("DIABOT_TRACEMALLOC_FRAMES", 0)
+
+# Telegram id администраторов через запятую: им доступна команда /profile
+ADMIN_IDS = _env_ids("DIABOT_ADMIN_IDS")
+
+# Фоновые задачи: пауза перед перезапуском растёт от начальной до максимальной
+TASK_BACKOFF_INITIAL = _env_float("DIABOT_TASK_BACKOFF_INITIAL", 1)
+TASK_BACKOFF_MAX = _env_float("DIABOT_TASK_BACKOFF_MAX", 300)
+
+# Проверка цикла событий: как часто и после скольких секунд остановки писать стек
+LOOP_LAG_INTERVAL = _env_float("DIABOT_LOOP_LAG_INTERVAL", 0.1)
+LOOP_LAG_THRESHOLD = _env_float("DIABOT_LOOP_LAG_THRESHOLD", 0.5)
+
+# Выгрузка истории: строк за одно чтение из БД и сколько байт держать в памяти до сброса на диск
+EXPORT_CHUNK_ROWS = _env_int("DIABOT_EXPORT_CHUNK_ROWS", 1000)
+EXPORT_SPOOL_BYTES = _env_int("DIABOT_EXPORT_SPOOL_BYTES", 5 * 2**20)
+
+# Архив: замеры старше стольких дней переносятся в measure_archive (0 — не переносить).
+# Периоды графиков до этого числа дней читаются только из горячей таблицы.
+ARCHIVE_AFTER_DAYS = _env_int("DIABOT_ARCHIVE_AFTER_DAYS", 400)
+ARCHIVE_BATCH_ROWS = _env_int("DIABOT_ARCHIVE_BATCH_ROWS", 500)
+# Пауза между пачками, чтобы перенос не мешал обработчикам
+ARCHIVE_BATCH_PAUSE = _env_float("DIABOT_ARCHIVE_BATCH_PAUSE", 0.05)
+
+# Резервные копии: каталог (пусто — не делать), сколько хранить,
+# страниц за шаг копирования и пауза между шагами для писателей
+BACKUP_DIR = os.getenv("DIABOT_BACKUP_DIR", "backups")
+BACKUP_KEEP = _env_int("DIABOT_BACKUP_KEEP", 7)
+BACKUP_PAGES = _env_int("DIABOT_BACKUP_PAGES", 256)
+BACKUP_STEP_PAUSE = _env_float("DIABOT_BACKUP_STEP_PAUSE", 0.05)
+
+# Ночная сводка статистики: итоги и таблицы прошлых дней считаются заранее
+STATS_DIGEST = _env_flag("DIABOT_STATS_DIGEST", True)
+
+# Кэш замеров в памяти: сколько последних дней держать по каждому коту
+# и сколько байт на все серии (0 — выключен, всё читается из базы)
+MEASURE_CACHE_DAYS = _env_int("DIABOT_MEASURE_CACHE_DAYS", 60)
+MEASURE_CACHE_BYTES = _env_int("DIABOT_MEASURE_CACHE_BYTES", 16 * 2**20)
+
+# Хранилище: sqlite (файл DB_PATH) или memory — всё в памяти процесса,
+# пропадает при перезапуске; для прогонов и бенчмарков
+STORAGE = os.getenv("DIABOT_STORAGE", "sqlite")
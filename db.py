@@ -1,82 +1,23 @@
 import sqlite3
 from contextlib import contextmanager
 from datetime import date, datetime, timedelta
-from typing import Iterable, Optional
+from typing import Iterable, Iterator, Optional
+
+import config
+import metrics
+from repository import date_from
 
 
 DB_PATH = "data.db"
 
-
-def ensure_schema() -> None:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        conn.execute("PRAGMA foreign_keys = OFF")
-        fk_rows = conn.execute("PRAGMA foreign_key_list(measure)").fetchall()
-        needs_migration = any(row["from"] == "user_id" for row in fk_rows)
-        if not needs_migration:
-            return
-
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS cats_new (
-                chat_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                is_active INTEGER NOT NULL DEFAULT 1,
-                am_time TEXT NOT NULL,
-                peak INTEGER NOT NULL,
-                pm_time TEXT NOT NULL,
-                PRIMARY KEY (chat_id, name)
-            )
-            """
-        )
-        conn.execute(
-            """
-            INSERT INTO cats_new (chat_id, user_id, name, is_active, am_time, peak, pm_time)
-            SELECT chat_id, user_id, name, is_active, am_time, peak, pm_time
-            FROM cats
-            GROUP BY chat_id, name
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS measure_new (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                amount REAL NOT NULL CHECK (amount >= 0),
-                tag TEXT NOT NULL,
-                FOREIGN KEY (chat_id, name)
-                    REFERENCES cats_new (chat_id, name)
-                    ON DELETE CASCADE
-            )
-            """
-        )
-        conn.execute(
-            """
-            INSERT INTO measure_new (id, chat_id, user_id, name, date, time, amount, tag)
-            SELECT id, chat_id, user_id, name, date, time, amount, tag
-            FROM measure
-            """
-        )
-        conn.execute("DROP TABLE measure")
-        conn.execute("DROP TABLE cats")
-        conn.execute("ALTER TABLE cats_new RENAME TO cats")
-        conn.execute("ALTER TABLE measure_new RENAME TO measure")
-        conn.commit()
-    finally:
-        conn.execute("PRAGMA foreign_keys = ON")
-        conn.close()
+# Время каждого запроса (вместе с открытием соединения) по имени функции
+timed_query = metrics.timed("db_query_seconds")
 
 
 @contextmanager
-def get_connection():
+def get_connection(db_path: str):
     # Контекст для безопасного открытия/закрытия SQLite
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     try:
@@ -85,168 +26,451 @@ def get_connection():
         conn.close()
 
 
-# --- Коты ---
-
-def get_cat_by_chat(chat_id: int):
-    # Для MVP берём первого найденного кота в чате
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM cats
-            WHERE chat_id = ?
-            LIMIT 1
-            """,
-            (chat_id,),
-        )
-        return cursor.fetchone()
-
-
-def get_cat_by_chat_and_name(chat_id: int, name: str):
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM cats
-            WHERE chat_id = ? AND name = ?
-            LIMIT 1
-            """,
-            (chat_id, name),
-        )
-        return cursor.fetchone()
-
-
-def create_cat(
-    chat_id: int,
-    user_id: int,
-    name: str,
-    am_time: str,
-    peak: int,
-    pm_time: str,
-):
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO cats (chat_id, user_id, name, am_time, peak, pm_time)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (chat_id, user_id, name, am_time, peak, pm_time),
-        )
-        conn.commit()
-
-
-def update_cat_field(chat_id: int, name: str, field: str, value):
-    # Поле приходит из кода, а не от пользователя
-    with get_connection() as conn:
-        conn.execute(
-            f"UPDATE cats SET {field} = ? WHERE chat_id = ? AND name = ?",
-            (value, chat_id, name),
-        )
-        conn.commit()
-
-
-def rename_cat(chat_id: int, old_name: str, new_name: str):
-    with get_connection() as conn:
-        # Временно отключаем проверки, чтобы синхронно переименовать записи
-        conn.execute("PRAGMA foreign_keys = OFF")
-        conn.execute(
-            "UPDATE cats SET name = ? WHERE chat_id = ? AND name = ?",
-            (new_name, chat_id, old_name),
-        )
-        conn.execute(
-            "UPDATE measure SET name = ? WHERE chat_id = ? AND name = ?",
-            (new_name, chat_id, old_name),
-        )
-        conn.commit()
-
-
-# --- Замеры ---
-
-def add_measure(
-    chat_id: int,
-    user_id: int,
-    name: str,
-    amount: float,
-    tag: str,
-    when: Optional[datetime] = None,
-):
-    when = when or datetime.now()
-    # Храним дату и время отдельно, чтобы удобнее группировать
-    date_str = when.date().isoformat()
-    time_str = when.time().strftime("%H:%M")
-    with get_connection() as conn:
-        conn.execute(
-            """
-            INSERT INTO measure (chat_id, user_id, name, date, time, amount, tag)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (chat_id, user_id, name, date_str, time_str, amount, tag),
-        )
-        conn.commit()
-
-
-def get_measures(chat_id: int, name: str, days: int):
-    date_from = (date.today() - timedelta(days=days)).isoformat()
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM measure
-            WHERE chat_id = ? AND name = ? AND date >= ?
-            ORDER BY date ASC, time ASC
-            """,
-            (chat_id, name, date_from),
-        )
-        return cursor.fetchall()
-
-
-def get_measures_between(chat_id: int, name: str, start_date: date, end_date: date):
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM measure
-            WHERE chat_id = ? AND name = ? AND date BETWEEN ? AND ?
-            ORDER BY date ASC, time ASC
-            """,
-            (chat_id, name, start_date.isoformat(), end_date.isoformat()),
-        )
-        return cursor.fetchall()
-
-
-def get_daily_measures(chat_id: int, name: str, days: int):
-    measures = get_measures(chat_id, name, days)
-    by_date: dict[str, list[sqlite3.Row]] = {}
-    for row in measures:
-        by_date.setdefault(row["date"], []).append(row)
-    return by_date
-
-
-def get_last_measures(chat_id: int, name: str, count: int = 1):
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM measure
-            WHERE chat_id = ? AND name = ?
-            ORDER BY date DESC, time DESC
-            LIMIT ?
-            """,
-            (chat_id, name, count),
-        )
-        return cursor.fetchall()
-
-
-def get_last_days(chat_id: int, name: str, days: int):
-    date_from = (date.today() - timedelta(days=days - 1)).isoformat()
-    with get_connection() as conn:
-        cursor = conn.execute(
-            """
-            SELECT * FROM measure
-            WHERE chat_id = ? AND name = ? AND date >= ?
-            ORDER BY date ASC, time ASC
-            """,
-            (chat_id, name, date_from),
-        )
-        return cursor.fetchall()
-
-
-def list_chats():
-    with get_connection() as conn:
-        cursor = conn.execute("SELECT DISTINCT chat_id, name FROM cats WHERE is_active = 1")
-        return cursor.fetchall()
+def _measure_source(days: Optional[int]) -> str:
+    # Замеры старше ARCHIVE_AFTER_DAYS лежат в measure_archive.
+    # Короткие периоды целиком в горячей таблице, остальное читаем через measure_all.
+    if days is not None and days <= config.ARCHIVE_AFTER_DAYS:
+        return "measure"
+    return "measure_all"
+
+
+_DAILY_BUCKETS_SQL = """
+    SELECT
+        date,
+        COUNT(*) AS count,
+        MIN(amount) AS min,
+        AVG(amount) AS avg,
+        MAX(amount) AS max,
+        SUM(amount) AS total,
+        SUM(amount > ? AND amount < ?) AS in_range
+    FROM {source}
+    WHERE chat_id = ? AND name = ? AND date >= ?
+    GROUP BY date
+"""
+
+
+def _delete_stats_digest(conn: sqlite3.Connection, chat_id: int, name: str) -> None:
+    conn.execute("DELETE FROM stats_digest_page WHERE chat_id = ? AND name = ?", (chat_id, name))
+    conn.execute("DELETE FROM stats_digest WHERE chat_id = ? AND name = ?", (chat_id, name))
+
+
+class SqliteRepository:
+    # Реализация repository.Repository поверх одного файла SQLite.
+    # Схему создаёт migrations.migrate, здесь только запросы.
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+
+    # --- Коты ---
+
+    @timed_query
+    def get_cat_by_chat(self, chat_id: int):
+        # Для MVP берём первого найденного кота в чате
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT * FROM cats
+                WHERE chat_id = ?
+                LIMIT 1
+                """,
+                (chat_id,),
+            )
+            return cursor.fetchone()
+
+    @timed_query
+    def get_cat_by_chat_and_name(self, chat_id: int, name: str):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT * FROM cats
+                WHERE chat_id = ? AND name = ?
+                LIMIT 1
+                """,
+                (chat_id, name),
+            )
+            return cursor.fetchone()
+
+    @timed_query
+    def create_cat(
+        self,
+        chat_id: int,
+        user_id: int,
+        name: str,
+        am_time: str,
+        peak: int,
+        pm_time: str,
+    ):
+        with get_connection(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO cats (chat_id, user_id, name, am_time, peak, pm_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (chat_id, user_id, name, am_time, peak, pm_time),
+            )
+            conn.commit()
+
+    @timed_query
+    def update_cat_field(self, chat_id: int, name: str, field: str, value):
+        # Поле приходит из кода, а не от пользователя
+        with get_connection(self.db_path) as conn:
+            conn.execute(
+                f"UPDATE cats SET {field} = ? WHERE chat_id = ? AND name = ?",
+                (value, chat_id, name),
+            )
+            # В готовых таблицах статистики подписи столбцов по старому времени
+            _delete_stats_digest(conn, chat_id, name)
+            conn.commit()
+
+    @timed_query
+    def rename_cat(self, chat_id: int, old_name: str, new_name: str):
+        with get_connection(self.db_path) as conn:
+            # Временно отключаем проверки, чтобы синхронно переименовать записи
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute(
+                "UPDATE cats SET name = ? WHERE chat_id = ? AND name = ?",
+                (new_name, chat_id, old_name),
+            )
+            conn.execute(
+                "UPDATE measure SET name = ? WHERE chat_id = ? AND name = ?",
+                (new_name, chat_id, old_name),
+            )
+            conn.execute(
+                "UPDATE measure_archive SET name = ? WHERE chat_id = ? AND name = ?",
+                (new_name, chat_id, old_name),
+            )
+            _delete_stats_digest(conn, chat_id, old_name)
+            conn.commit()
+
+    @timed_query
+    def list_chats(self):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute("SELECT DISTINCT chat_id, name FROM cats WHERE is_active = 1")
+            return cursor.fetchall()
+
+    # --- Замеры ---
+
+    @timed_query
+    def add_measure(
+        self,
+        chat_id: int,
+        user_id: int,
+        name: str,
+        amount: float,
+        tag: str,
+        when: Optional[datetime] = None,
+    ):
+        when = when or datetime.now()
+        # Храним дату и время отдельно, чтобы удобнее группировать
+        date_str = when.date().isoformat()
+        time_str = when.time().strftime("%H:%M")
+        with get_connection(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO measure (chat_id, user_id, name, date, time, amount, tag)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (chat_id, user_id, name, date_str, time_str, amount, tag),
+            )
+            conn.commit()
+
+    @timed_query
+    def get_measures(self, chat_id: int, name: str, days: Optional[int]):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT * FROM {_measure_source(days)}
+                WHERE chat_id = ? AND name = ? AND date >= ?
+                ORDER BY date ASC, time ASC
+                """,
+                (chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_measures_between(self, chat_id: int, name: str, start_date: date, end_date: date):
+        source = _measure_source((date.today() - start_date).days)
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT * FROM {source}
+                WHERE chat_id = ? AND name = ? AND date BETWEEN ? AND ?
+                ORDER BY date ASC, time ASC
+                """,
+                (chat_id, name, start_date.isoformat(), end_date.isoformat()),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_daily_measures(self, chat_id: int, name: str, days: int):
+        measures = self.get_measures(chat_id, name, days)
+        by_date: dict[str, list[sqlite3.Row]] = {}
+        for row in measures:
+            by_date.setdefault(row["date"], []).append(row)
+        return by_date
+
+    @timed_query
+    def get_daily_buckets(
+        self,
+        chat_id: int,
+        name: str,
+        days: Optional[int],
+        low: float = 4,
+        high: float = 10,
+    ):
+        # Агрегаты по дням считает SQLite, в Python приходит по строке на день.
+        # Сводной таблицы нет намеренно: границы диапазона приходят параметрами
+        # (config.RANGE_LOW/RANGE_HIGH), in_range заранее не посчитать
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT date, count, min, avg, max, in_range, min AS nadir
+                FROM ({_DAILY_BUCKETS_SQL.format(source=_measure_source(days))})
+                ORDER BY date ASC
+                """,
+                (low, high, chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_weekly_buckets(
+        self,
+        chat_id: int,
+        name: str,
+        days: Optional[int],
+        low: float = 4,
+        high: float = 10,
+    ):
+        # Недели начинаются с понедельника; nadir — средний минимум дней недели
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT
+                    date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days') AS date,
+                    SUM(count) AS count,
+                    MIN(min) AS min,
+                    SUM(total) / SUM(count) AS avg,
+                    MAX(max) AS max,
+                    SUM(in_range) AS in_range,
+                    AVG(min) AS nadir
+                FROM ({_DAILY_BUCKETS_SQL.format(source=_measure_source(days))})
+                GROUP BY 1
+                ORDER BY 1 ASC
+                """,
+                (low, high, chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_daily_nadirs(self, chat_id: int, name: str, days: Optional[int]):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT date, MIN(amount) AS nadir
+                FROM {_measure_source(days)}
+                WHERE chat_id = ? AND name = ? AND date >= ?
+                GROUP BY date
+                ORDER BY date ASC
+                """,
+                (chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_daily_amps_pmps(self, chat_id: int, name: str, days: Optional[int]):
+        # AMPS — первый замер с тегом AMPS, иначе первый за день;
+        # PMPS — первый с тегом PMPS, иначе последний за день
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                WITH ordered AS (
+                    SELECT
+                        date,
+                        amount,
+                        tag,
+                        ROW_NUMBER() OVER (PARTITION BY date ORDER BY time ASC, id ASC) AS first_pos,
+                        ROW_NUMBER() OVER (PARTITION BY date ORDER BY time DESC, id DESC) AS last_pos,
+                        ROW_NUMBER() OVER (PARTITION BY date, tag ORDER BY time ASC, id ASC) AS tag_pos
+                    FROM {_measure_source(days)}
+                    WHERE chat_id = ? AND name = ? AND date >= ?
+                )
+                SELECT
+                    date,
+                    COALESCE(
+                        MAX(CASE WHEN tag = 'AMPS' AND tag_pos = 1 THEN amount END),
+                        MAX(CASE WHEN first_pos = 1 THEN amount END)
+                    ) AS amps,
+                    COALESCE(
+                        MAX(CASE WHEN tag = 'PMPS' AND tag_pos = 1 THEN amount END),
+                        MAX(CASE WHEN last_pos = 1 THEN amount END)
+                    ) AS pmps
+                FROM ordered
+                GROUP BY date
+                ORDER BY date ASC
+                """,
+                (chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_daily_range_counts(
+        self,
+        chat_id: int,
+        name: str,
+        days: Optional[int],
+        low: float = 4,
+        high: float = 10,
+    ):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT date, COUNT(*) AS count, SUM(amount > ? AND amount < ?) AS in_range
+                FROM {_measure_source(days)}
+                WHERE chat_id = ? AND name = ? AND date >= ?
+                GROUP BY date
+                ORDER BY date ASC
+                """,
+                (low, high, chat_id, name, date_from(days)),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_history_start(self, chat_id: int, name: str) -> Optional[str]:
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                "SELECT MIN(date) FROM measure_all WHERE chat_id = ? AND name = ?",
+                (chat_id, name),
+            )
+            return cursor.fetchone()[0]
+
+    @timed_query
+    def get_last_measures(self, chat_id: int, name: str, count: int = 1):
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT * FROM measure_all
+                WHERE chat_id = ? AND name = ?
+                ORDER BY date DESC, time DESC
+                LIMIT ?
+                """,
+                (chat_id, name, count),
+            )
+            return cursor.fetchall()
+
+    @timed_query
+    def get_last_days(self, chat_id: int, name: str, days: int):
+        start = (date.today() - timedelta(days=days - 1)).isoformat()
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                f"""
+                SELECT * FROM {_measure_source(days)}
+                WHERE chat_id = ? AND name = ? AND date >= ?
+                ORDER BY date ASC, time ASC
+                """,
+                (chat_id, name, start),
+            )
+            return cursor.fetchall()
+
+    def iter_measures(self, chat_id: int, name: str, chunk_size: int = 1000) -> Iterator[tuple]:
+        # Вся история порциями: в памяти не больше chunk_size строк.
+        # Соединение открыто, пока генератор не дочитан или не закрыт.
+        with get_connection(self.db_path) as conn:
+            cursor = conn.execute(
+                """
+                SELECT date, time, amount, tag FROM measure_all
+                WHERE chat_id = ? AND name = ?
+                ORDER BY date ASC, time ASC
+                """,
+                (chat_id, name),
+            )
+            while rows := cursor.fetchmany(chunk_size):
+                for row in rows:
+                    yield tuple(row)
+
+    @timed_query
+    def archive_measures_batch(self, before: str, batch_size: int) -> int:
+        # Переносит в архив до batch_size самых ранних замеров с датой раньше before.
+        # Одна короткая транзакция на пачку; возвращает число перенесённых строк.
+        with get_connection(self.db_path) as conn:
+            last_id = conn.execute(
+                """
+                SELECT MAX(id) FROM (
+                    SELECT id FROM measure WHERE date < ? ORDER BY id LIMIT ?
+                )
+                """,
+                (before, batch_size),
+            ).fetchone()[0]
+            if last_id is None:
+                return 0
+            conn.execute(
+                """
+                INSERT INTO measure_archive (id, chat_id, user_id, name, date, time, amount, tag)
+                SELECT id, chat_id, user_id, name, date, time, amount, tag
+                FROM measure
+                WHERE date < ? AND id <= ?
+                """,
+                (before, last_id),
+            )
+            moved = conn.execute(
+                "DELETE FROM measure WHERE date < ? AND id <= ?",
+                (before, last_id),
+            ).rowcount
+            conn.commit()
+            return moved
+
+    # --- Ночная сводка статистики ---
+
+    @timed_query
+    def save_stats_digest(self, chat_id: int, name: str, summary: dict, pages: list[bytes], pdf: bytes):
+        with get_connection(self.db_path) as conn:
+            _delete_stats_digest(conn, chat_id, name)
+            conn.execute(
+                """
+                INSERT INTO stats_digest (
+                    chat_id, name, digest_date, glucose_sum, glucose_count,
+                    nadir_sum, nadir_days, table_rows, other_columns, pdf
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    chat_id,
+                    name,
+                    summary["digest_date"],
+                    summary["glucose_sum"],
+                    summary["glucose_count"],
+                    summary["nadir_sum"],
+                    summary["nadir_days"],
+                    summary["table_rows"],
+                    summary["other_columns"],
+                    pdf,
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO stats_digest_page (chat_id, name, page, png) VALUES (?, ?, ?, ?)",
+                [(chat_id, name, page, png) for page, png in enumerate(pages)],
+            )
+            conn.commit()
+
+    @timed_query
+    def get_stats_digest(self, chat_id: int, name: str):
+        # Сводка и её страницы по порядку; None, если сводки нет
+        with get_connection(self.db_path) as conn:
+            digest = conn.execute(
+                "SELECT * FROM stats_digest WHERE chat_id = ? AND name = ?",
+                (chat_id, name),
+            ).fetchone()
+            if digest is None:
+                return None
+            pages = conn.execute(
+                "SELECT png FROM stats_digest_page WHERE chat_id = ? AND name = ? ORDER BY page",
+                (chat_id, name),
+            ).fetchall()
+            return digest, [row["png"] for row in pages]
+
+    @timed_query
+    def get_stats_digest_date(self, chat_id: int, name: str) -> Optional[str]:
+        with get_connection(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT digest_date FROM stats_digest WHERE chat_id = ? AND name = ?",
+                (chat_id, name),
+            ).fetchone()
+            return row["digest_date"] if row else None
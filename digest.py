@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import render
+from repository import Repository
+
+# Таблица статистики за столько дней (как Repository.get_measures) и строк на странице
+STATS_DAYS = 60
+STATS_PAGE_ROWS = 28
+# Окна средних как в notifications: глюкоза за 7 дней вместе с сегодняшним,
+# nadir по get_daily_measures(7), то есть начиная с даты «сегодня минус 7»
+GLUCOSE_DAYS = 7
+NADIR_DAYS = 7
+
+
+@dataclass
+class StatsDigest:
+    # Итоги по дням до digest_date (не включая его) и готовые страницы таблицы
+    digest_date: str
+    glucose_sum: float
+    glucose_count: int
+    nadir_sum: float
+    nadir_days: int
+    table_rows: int
+    other_columns: int
+    pages: list[bytes]
+    pdf: bytes
+
+
+def stats_labels(cat) -> dict[str, str]:
+    am_time = cat["am_time"]
+    pm_time = cat["pm_time"]
+    peak_hours = int(cat["peak"])
+    base = datetime.strptime(am_time, "%H:%M")
+    peak_time = (base + timedelta(hours=peak_hours)).time().strftime("%H:%M")
+    return {
+        "AMPS": f"AMPS ({am_time})",
+        "PEAK": f"PEAK ({peak_time})",
+        "PMPS": f"PMPS ({pm_time})",
+    }
+
+
+def _other_columns(rows) -> int:
+    # Столько столбцов OTHER в таблице: по дню с наибольшим числом таких замеров
+    counts: dict[str, int] = {}
+    for row in rows:
+        if row["tag"] == "OTHER":
+            counts[row["date"]] = counts.get(row["date"], 0) + 1
+    return max(counts.values(), default=0)
+
+
+async def build_digest(repo: Repository, cat) -> bool:
+    # Сводка на сегодня по замерам прошлых дней; False — до сегодня замеров нет
+    chat_id = cat["chat_id"]
+    name = cat["name"]
+    today = date.today()
+    rows = [
+        row
+        for row in repo.get_measures(chat_id, name, STATS_DAYS)
+        if row["date"] < today.isoformat()
+    ]
+    if not rows:
+        return False
+
+    glucose_from = (today - timedelta(days=GLUCOSE_DAYS - 1)).isoformat()
+    nadir_from = (today - timedelta(days=NADIR_DAYS)).isoformat()
+    glucose = [row["amount"] for row in rows if row["date"] >= glucose_from]
+    nadirs: dict[str, float] = {}
+    for row in rows:
+        if row["date"] >= nadir_from:
+            nadirs[row["date"]] = min(row["amount"], nadirs.get(row["date"], row["amount"]))
+
+    pages, pdf = await render.render(
+        "stats_report",
+        render.plain_rows(rows),
+        max_rows=STATS_PAGE_ROWS,
+        labels=stats_labels(cat),
+    )
+    summary = {
+        "digest_date": today.isoformat(),
+        "glucose_sum": sum(glucose),
+        "glucose_count": len(glucose),
+        "nadir_sum": sum(nadirs.values()),
+        "nadir_days": len(nadirs),
+        "table_rows": len({row["date"] for row in rows}),
+        "other_columns": _other_columns(rows),
+    }
+    repo.save_stats_digest(chat_id, name, summary, pages, pdf)
+    return True
+
+
+def load_digest(repo: Repository, chat_id: int, name: str) -> StatsDigest | None:
+    # Сводка за другой день уже не годится: до ночного пересчёта считаем как раньше
+    found = repo.get_stats_digest(chat_id, name)
+    if found is None:
+        return None
+    row, pages = found
+    if row["digest_date"] != date.today().isoformat():
+        return None
+    return StatsDigest(
+        digest_date=row["digest_date"],
+        glucose_sum=row["glucose_sum"],
+        glucose_count=row["glucose_count"],
+        nadir_sum=row["nadir_sum"],
+        nadir_days=row["nadir_days"],
+        table_rows=row["table_rows"],
+        other_columns=row["other_columns"],
+        pages=pages,
+        pdf=row["pdf"],
+    )
+
+
+def digest_is_fresh(repo: Repository, chat_id: int, name: str) -> bool:
+    return repo.get_stats_digest_date(chat_id, name) == date.today().isoformat()
+
+
+def top_up_averages(digest: StatsDigest, today_rows) -> tuple[float | None, float | None]:
+    # Средние за 7 дней: к итогам прошлых дней добавляются сегодняшние замеры
+    glucose_sum = digest.glucose_sum + sum(row["amount"] for row in today_rows)
+    glucose_count = digest.glucose_count + len(today_rows)
+    nadir_sum = digest.nadir_sum
+    nadir_days = digest.nadir_days
+    if today_rows:
+        nadir_sum += min(row["amount"] for row in today_rows)
+        nadir_days += 1
+    avg_glucose = glucose_sum / glucose_count if glucose_count else None
+    avg_nadir = nadir_sum / nadir_days if nadir_days else None
+    return avg_glucose, avg_nadir
+
+
+async def top_up_report(
+    repo: Repository,
+    digest: StatsDigest,
+    chat_id: int,
+    name: str,
+    today_rows,
+    labels: dict[str, str],
+) -> tuple[list[bytes], bytes]:
+    if not today_rows:
+        return digest.pages, digest.pdf
+    # Сегодняшняя строка дописывается в конец таблицы: PNG перерисовываем с последней
+    # страницы. Если сегодня замеров OTHER больше, чем столбцов, меняется шапка всех страниц.
+    if _other_columns(today_rows) > digest.other_columns:
+        first_page = 0
+    else:
+        first_page = digest.table_rows // STATS_PAGE_ROWS
+    rows = repo.get_measures(chat_id, name, STATS_DAYS)
+    pages, pdf = await render.render(
+        "stats_report",
+        render.plain_rows(rows),
+        max_rows=STATS_PAGE_ROWS,
+        labels=labels,
+        png_from=first_page,
+    )
+    return digest.pages[:first_page] + pages, pdf
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Sequence
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
+    # Largest-Triangle-Three-Buckets: оставляет точки, которые сильнее всего
+    # влияют на форму кривой. Возвращает индексы, чтобы по ним можно было
+    # выбрать и соседние ряды (min/max) для тех же дат.
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return list(range(count))
+
+    indices = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+
+        # Среднее следующей корзины — третья вершина треугольника
+        next_start = stop
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, count)
+        span = next_stop - next_start
+        avg_x = sum(xs[next_start:next_stop]) / span
+        avg_y = sum(ys[next_start:next_stop]) / span
+
+        point_x = xs[selected]
+        point_y = ys[selected]
+        best_area = -1.0
+        best_index = start
+        for idx in range(start, stop):
+            area = abs(
+                (point_x - avg_x) * (ys[idx] - point_y)
+                - (point_x - xs[idx]) * (avg_y - point_y)
+            )
+            if area > best_area:
+                best_area = area
+                best_index = idx
+        indices.append(best_index)
+        selected = best_index
+
+    indices.append(count - 1)
+    return indices
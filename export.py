@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import csv
+import io
+import tempfile
+from datetime import date
+from typing import IO, AsyncGenerator, Iterable
+
+from aiogram.types import InputFile
+
+import config
+from repository import Repository
+
+COLUMNS = ("Дата", "Время", "Сахар", "Тег")
+
+try:
+    # openpyxl нужен только для XLSX; без него доступна выгрузка в CSV
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+FORMATS = ("csv", "xlsx") if Workbook is not None else ("csv",)
+
+
+class SpooledInputFile(InputFile):
+    # Отправка временного файла кусками, без чтения целиком в память
+    def __init__(self, file: IO[bytes], filename: str):
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+def _write_csv(rows: Iterable[tuple], out: IO[bytes]) -> int:
+    # utf-8-sig: Excel без BOM показывает кириллицу кракозябрами
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+
+def _write_xlsx(rows: Iterable[tuple], out: IO[bytes]) -> int:
+    # write_only: строки сразу уходят во временный файл openpyxl, а не в память
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Замеры")
+    sheet.append(COLUMNS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(out)
+    return count
+
+
+def build_export(repo: Repository, chat_id: int, name: str, file_format: str) -> tuple[IO[bytes], int]:
+    # Синхронная функция: вызывать через asyncio.to_thread
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    out = tempfile.SpooledTemporaryFile(max_size=config.EXPORT_SPOOL_BYTES, mode="w+b")
+    rows = repo.iter_measures(chat_id, name, chunk_size=config.EXPORT_CHUNK_ROWS)
+    try:
+        writer = _write_xlsx if file_format == "xlsx" else _write_csv
+        count = writer(rows, out)
+    except BaseException:
+        out.close()
+        raise
+    finally:
+        rows.close()
+    return out, count
+
+
+def file_name(name: str, file_format: str) -> str:
+    return f"{name}_{date.today().isoformat()}.{file_format}"
@@ -9,6 +9,7 @@ HELP_TEXT = (
     "Как пользоваться:\n"
     "• /start — регистрация пациента и доступ к меню.\n"
     "• /measure — ручной ввод замера (выберите тег и введите число).\n"
+    "• /export — вся история замеров файлом CSV для врача (/export xlsx — таблица Excel).\n"
     "• Кнопки меню — графики, статистика и настройки пациента.\n\n"
     "Настройки пациента:\n"
     "• Укажите утреннее/вечернее время и время пика — они влияют на напоминания.\n"
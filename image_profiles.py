@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import config
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    # Настройки кодирования картинок, которые уходят в Telegram
+    dpi: float | None = None
+    image_format: str = "png"
+    colors: int | None = None
+    compress_level: int = 6
+    quality: int = 85
+
+
+OUTPUT_PROFILES = {
+    # Вывод matplotlib по умолчанию
+    "default": OutputProfile(),
+    # PNG с палитрой: для графиков и таблиц хватает 128 цветов
+    "phone": OutputProfile(dpi=80, colors=128, compress_level=9),
+    "webp": OutputProfile(dpi=80, image_format="webp", quality=80),
+    "jpeg": OutputProfile(dpi=80, image_format="jpeg", quality=85),
+}
+
+_active = OUTPUT_PROFILES[config.CHART_PROFILE]
+
+
+def active_profile() -> OutputProfile:
+    return _active
+
+
+def set_active_profile(name: str) -> None:
+    global _active
+    _active = OUTPUT_PROFILES[name]
+
+
+def file_name(stem: str) -> str:
+    # Имя файла для Telegram с расширением текущего формата
+    extension = "jpg" if _active.image_format == "jpeg" else _active.image_format
+    return f"{stem}.{extension}"
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Внутренний middleware: к этому моменту известен обработчик, время пишем по его имени
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("handler_errors_total", handler=name)
+            raise
+        finally:
+            metrics.observe("handler_seconds", time.perf_counter() - started, handler=name)
+
+
+class LoopLagMonitor:
+    # Корутина раз в interval отмечается и меряет, насколько позже проснулась.
+    # Отдельный поток следит за отметкой: если цикл событий занят дольше threshold,
+    # в лог пишется стек того, что его держит (синхронный SQLite, отрисовка и т. п.).
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: int | None = None
+
+    async def run(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        stop = threading.Event()
+        watchdog = threading.Thread(target=self._watch, args=(stop,), name="loop-lag-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self._heartbeat = time.monotonic()
+                lag = max(0.0, self._heartbeat - started - self.interval)
+                metrics.observe("event_loop_lag_seconds", lag)
+                metrics.set_gauge("event_loop_lag_last_seconds", lag)
+        finally:
+            stop.set()
+
+    def _watch(self, stop: threading.Event) -> None:
+        reported = False
+        while not stop.wait(self.interval):
+            # Отметка в норме отстаёт не больше чем на interval
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if blocked <= self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            # Одна запись на каждую остановку цикла
+            reported = True
+            metrics.inc("event_loop_stalls_total")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "стек недоступен\n"
+            logger.warning("Event loop blocked for %.2f s, current stack:\n%s", blocked, stack)
+
+
+async def _metrics_view(_: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.render_prometheus(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+async def serve_metrics(host: str, port: int) -> web.AppRunner:
+    # Отдельный маленький сервер: /metrics в текстовом формате Prometheus
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info("Metrics available on http://%s:%s/metrics", host, port)
+    return runner
@@ -1,5 +1,7 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 
+import config
+
 
 def main_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
@@ -23,14 +25,35 @@ def back_keyboard(target: str = "menu:main") -> InlineKeyboardMarkup:
     )
 
 
-def charts_menu_keyboard() -> InlineKeyboardMarkup:
+CHART_PERIODS = (
+    ("Обычный", "std"),
+    ("90 дней", "90"),
+    ("180 дней", "180"),
+    ("Год", "365"),
+    ("Всё время", "all"),
+)
+
+
+def charts_menu_keyboard(period: str = "std") -> InlineKeyboardMarkup:
+    # Период передаётся в callback графика: chart:<вид>[:<период>]
+    suffix = "" if period == "std" else f":{period}"
+    period_buttons = [
+        InlineKeyboardButton(
+            text=f"• {label}" if value == period else label,
+            callback_data=f"charts:period:{value}",
+        )
+        for label, value in CHART_PERIODS
+    ]
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="< Назад", callback_data="menu:main")],
-            [InlineKeyboardButton(text="Суточная кривая", callback_data="chart:daily")],
-            [InlineKeyboardButton(text="Nadir", callback_data="chart:nadir")],
-            [InlineKeyboardButton(text="AMPS / PMPS", callback_data="chart:amps_pmps")],
-            [InlineKeyboardButton(text="% в диапазоне 4–10", callback_data="chart:range")],
+            [InlineKeyboardButton(text="Сводка: все графики", callback_data="chart:dashboard")],
+            [InlineKeyboardButton(text="Суточная кривая", callback_data=f"chart:daily{suffix}")],
+            [InlineKeyboardButton(text="Nadir", callback_data=f"chart:nadir{suffix}")],
+            [InlineKeyboardButton(text="AMPS / PMPS", callback_data=f"chart:amps_pmps{suffix}")],
+            [InlineKeyboardButton(text=f"% в диапазоне {config.RANGE_LOW:g}–{config.RANGE_HIGH:g}", callback_data=f"chart:range{suffix}")],
+            period_buttons[:3],
+            period_buttons[3:],
         ]
     )
 
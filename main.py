@@ -1,23 +1,42 @@
 import asyncio
-from datetime import datetime, timedelta
+import functools
+import logging
+import time
+from datetime import date
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.filters import Command, CommandStart
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import StorageKey
 from aiogram.types import (
     BufferedInputFile,
     CallbackQuery,
+    InputMediaPhoto,
     Message,
     ReplyKeyboardRemove,
 )
 
-import charts
+import config
 import db
+import digest
+import export
+import image_profiles
+import instrumentation
+import measure_cache
+import metrics
+import migrations
 import notifications
 import measure_flow
+import profiling
+import render
+import throttling
+import webhook
+from singleflight import SingleFlight
+from supervisor import Supervisor
 from help import help_router
+from repository import MemoryRepository, Repository
 from keyboards import (
     back_keyboard,
     cancel_keyboard,
@@ -28,12 +47,39 @@ from keyboards import (
     register_keyboard,
     settings_menu_keyboard,
 )
-from scheduler import schedule_daily_checks, schedule_procedure_reminders
+from scheduler import (
+    schedule_archival,
+    schedule_backups,
+    schedule_daily_checks,
+    schedule_procedure_reminders,
+    schedule_stats_digests,
+)
 from states import EditCat, Measure, RegisterCat
 from utils import parse_measure, parse_peak, parse_time
 
+logger = logging.getLogger(__name__)
+
 router = Router()
 
+# Telegram принимает в альбоме от 2 до 10 файлов
+MEDIA_GROUP_LIMIT = 10
+
+_render_flights = SingleFlight("render")
+
+
+def single_flight(handler):
+    # Повторные нажатия той же кнопки в том же чате, пока первое ещё
+    # обрабатывается, сразу получают ответ и ждут общий результат
+    @functools.wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args, **kwargs):
+        key = (callback.message.chat.id, callback.data)
+        action = callback.data.split(":")[1]
+        if _render_flights.in_flight(key):
+            await callback.answer("Уже готовлю, подождите немного.")
+        return await _render_flights.run(key, lambda: handler(callback, *args, **kwargs), action=action)
+
+    return wrapper
+
 
 def reminder_context(message: Message, state: FSMContext) -> FSMContext:
     return FSMContext(
@@ -46,7 +92,7 @@ def reminder_context(message: Message, state: FSMContext) -> FSMContext:
     )
 
 
-async def handle_measure_value(message: Message, state: FSMContext) -> bool:
+async def handle_measure_value(message: Message, state: FSMContext, repo: Repository) -> bool:
     # Запись замера и проверка уведомлений
     if not message.text:
         await message.answer("Нужно число, например 6.4")
@@ -59,13 +105,13 @@ async def handle_measure_value(message: Message, state: FSMContext) -> bool:
     data = await state.get_data()
     tag = data.get("tag", "OTHER")
     name = data.get("name")
-    cat = db.get_cat_by_chat_and_name(message.chat.id, name) if name else None
+    cat = repo.get_cat_by_chat_and_name(message.chat.id, name) if name else None
     if not cat:
         await message.answer("Не найден пациент, начните с /start.")
         await state.clear()
         return True
 
-    db.add_measure(
+    repo.add_measure(
         chat_id=message.chat.id,
         user_id=message.from_user.id,
         name=name,
@@ -82,7 +128,7 @@ async def handle_measure_value(message: Message, state: FSMContext) -> bool:
             "Уточните состояние питомца и действуйте по плану врача."
         )
 
-    avg_glucose = notifications.average_glucose_last_days(message.chat.id, name, 7)
+    avg_glucose = notifications.average_glucose_last_days(repo, message.chat.id, name, 7)
     if avg_glucose is not None and avg_glucose < 9:
         await message.answer("✅ Средняя глюкоза за 7 дней ниже 9 — прогресс к ремиссии!")
 
@@ -97,6 +143,11 @@ async def handle_measure_value(message: Message, state: FSMContext) -> bool:
     return True
 
 
+def _photo(data: bytes, stem: str) -> BufferedInputFile:
+    # Расширение файла зависит от профиля картинок (png/webp/jpg)
+    return BufferedInputFile(data, filename=image_profiles.file_name(stem))
+
+
 def load_token() -> str:
     # Токен бота хранится в файле secret рядом с проектом
     return Path("secret").read_text(encoding="utf-8").strip()
@@ -112,10 +163,13 @@ def main_menu_text(cat_name: str) -> str:
 def charts_menu_text() -> str:
     return (
         "Выберите график: \n"
+        "• Сводка — все четыре графика одной картинкой за 2 месяца.\n"
         "• Суточная кривая — все замеры по дням за месяц.\n"
         "• Nadir — минимальные значения сахара по дням.\n"
         "• AMPS/PMPS — утро и вечер по каждому дню.\n"
-        "• % в 4–10 — доля целевых замеров за 7 дней."
+        f"• % в {config.RANGE_LOW:g}–{config.RANGE_HIGH:g} — доля целевых замеров за 7 дней.\n\n"
+        "Период внизу меню: «Обычный» — последние 1–2 месяца, "
+        "длинные периоды показывают тренд по дням или неделям."
     )
 
 
@@ -130,23 +184,21 @@ def settings_menu_text(cat) -> str:
     )
 
 
-def _stats_labels(cat) -> dict[str, str]:
-    am_time = cat["am_time"]
-    pm_time = cat["pm_time"]
-    peak_hours = int(cat["peak"])
-    base = datetime.strptime(am_time, "%H:%M")
-    peak_time = (base + timedelta(hours=peak_hours)).time().strftime("%H:%M")
-    return {
-        "AMPS": f"AMPS ({am_time})",
-        "PEAK": f"PEAK ({peak_time})",
-        "PMPS": f"PMPS ({pm_time})",
-    }
+def _stats_text(avg_glucose: float | None, avg_nadir: float | None) -> str:
+    message_text = "Статистика за последние дни:\n"
+    if avg_glucose is not None:
+        mark = "✅" if avg_glucose < 9 else "❌"
+        message_text += f"{mark} Средняя глюкоза за 7 дней: {avg_glucose:.1f}\n"
+    if avg_nadir is not None:
+        mark = "✅" if avg_nadir < 6 else "❌"
+        message_text += f"{mark} Средний nadir за 7 дней: {avg_nadir:.1f}\n"
+    return message_text
 
 
 @router.message(CommandStart())
-async def start(message: Message):
+async def start(message: Message, repo: Repository):
     # Проверяем, есть ли пациент в текущем чате
-    cat = db.get_cat_by_chat(message.chat.id)
+    cat = repo.get_cat_by_chat(message.chat.id)
     if not cat:
         text = (
             "Привет! Я помогу вести дневник сахара и строить графики.\n"
@@ -159,8 +211,8 @@ async def start(message: Message):
 
 
 @router.callback_query(F.data == "menu:main")
-async def menu_main(callback: CallbackQuery):
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+async def menu_main(callback: CallbackQuery, repo: Repository):
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         text = (
             "Привет! Я помогу вести дневник сахара и строить графики.\n"
@@ -181,8 +233,8 @@ async def menu_charts(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "menu:settings")
-async def menu_settings(callback: CallbackQuery):
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+async def menu_settings(callback: CallbackQuery, repo: Repository):
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
@@ -190,125 +242,235 @@ async def menu_settings(callback: CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data == "menu:stats")
-async def menu_stats(callback: CallbackQuery):
+@router.callback_query(F.data == "menu:stats", flags={"throttle": "render"})
+@single_flight
+async def menu_stats(callback: CallbackQuery, repo: Repository):
     # Статистика — отдельный вывод без подменю
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+    started = time.perf_counter()
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    rows = db.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=60)
-    if not rows:
-        await callback.answer("Пока нет данных для статистики.", show_alert=True)
-        return
-
-    avg_glucose = notifications.average_glucose_last_days(
-        callback.message.chat.id, cat["name"], 7
-    )
-    avg_nadir = notifications.average_nadir_last_days(
-        callback.message.chat.id, cat["name"], 7
-    )
-
-    message_text = "Статистика за последние дни:\n"
-    if avg_glucose is not None:
-        mark = "✅" if avg_glucose < 9 else "❌"
-        message_text += f"{mark} Средняя глюкоза за 7 дней: {avg_glucose:.1f}\n"
-    if avg_nadir is not None:
-        mark = "✅" if avg_nadir < 6 else "❌"
-        message_text += f"{mark} Средний nadir за 7 дней: {avg_nadir:.1f}\n"
-
-    await callback.message.answer(message_text)
+    chat_id = callback.message.chat.id
+    labels = digest.stats_labels(cat)
+    cached = digest.load_digest(repo, chat_id, cat["name"])
+    metrics.inc("stats_digest_requests_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        # Прошлые дни взяты из ночной сводки, досчитываются только сегодняшние замеры
+        today = date.today()
+        today_rows = repo.get_measures_between(chat_id, cat["name"], today, today)
+        avg_glucose, avg_nadir = digest.top_up_averages(cached, today_rows)
+        report = asyncio.create_task(
+            digest.top_up_report(repo, cached, chat_id, cat["name"], today_rows, labels)
+        )
+    else:
+        rows = repo.get_measures(chat_id=chat_id, name=cat["name"], days=digest.STATS_DAYS)
+        if not rows:
+            await callback.answer("Пока нет данных для статистики.", show_alert=True)
+            return
+        avg_glucose = notifications.average_glucose_last_days(repo, chat_id, cat["name"], digest.GLUCOSE_DAYS)
+        avg_nadir = notifications.average_nadir_last_days(repo, chat_id, cat["name"], digest.NADIR_DAYS)
+        report = asyncio.create_task(
+            render.render(
+                "stats_report",
+                render.plain_rows(rows),
+                max_rows=digest.STATS_PAGE_ROWS,
+                labels=labels,
+            )
+        )
 
-    labels = _stats_labels(cat)
-    tables = charts.stats_table(rows, labels=labels)
-    for table in tables:
-        await callback.message.answer_photo(BufferedInputFile(table.getvalue(), filename="stats.png"))
-    stats_pdf = charts.stats_table_pdf(rows, labels=labels)
-    await callback.message.answer_document(
-        BufferedInputFile(stats_pdf.getvalue(), filename="stats.pdf")
-    )
+    # Таблицы рисуются в пуле, пока отправляется текст
+    await callback.message.answer(_stats_text(avg_glucose, avg_nadir))
+    tables, stats_pdf = await report
+
+    # Страницы уходят альбомами, а не отдельным сообщением на каждую
+    for start in range(0, len(tables), MEDIA_GROUP_LIMIT):
+        chunk = tables[start : start + MEDIA_GROUP_LIMIT]
+        if len(chunk) == 1:
+            await callback.message.answer_photo(_photo(chunk[0], "stats"))
+            continue
+        await callback.message.answer_media_group(
+            [
+                InputMediaPhoto(media=_photo(table, f"stats_{start + idx + 1}"))
+                for idx, table in enumerate(chunk)
+            ]
+        )
+    await callback.message.answer_document(BufferedInputFile(stats_pdf, filename="stats.pdf"))
 
     await callback.answer()
-
-
-@router.callback_query(F.data == "chart:daily")
-async def chart_daily(callback: CallbackQuery):
-    # Суточная кривая за последний месяц
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+    elapsed = time.perf_counter() - started
+    metrics.observe("stats_reply_seconds", elapsed)
+    logger.info("Stats for chat %s sent in %.2f s (%d pages)", chat_id, elapsed, len(tables))
+
+
+# Длинные периоды рисуются по агрегатам из SQLite, а не по сырым замерам
+LONG_PERIODS: dict[str, int | None] = {"90": 90, "180": 180, "365": 365, "all": None}
+WEEKLY_BUCKETS_AFTER_DAYS = 365
+
+
+def _chart_period(data: str) -> str | None:
+    # chart:<вид>[:<период>]
+    parts = data.split(":")
+    if len(parts) > 2 and parts[2] in LONG_PERIODS:
+        return parts[2]
+    return None
+
+
+def _long_range_buckets(repo: Repository, chat_id: int, name: str, period: str) -> list[dict]:
+    days = LONG_PERIODS[period]
+    if days is None:
+        start = repo.get_history_start(chat_id, name)
+        if start and (date.today() - date.fromisoformat(start)).days > WEEKLY_BUCKETS_AFTER_DAYS:
+            return render.plain_dicts(
+                repo.get_weekly_buckets(chat_id, name, None, config.RANGE_LOW, config.RANGE_HIGH)
+            )
+    return render.plain_dicts(repo.get_daily_buckets(chat_id, name, days, config.RANGE_LOW, config.RANGE_HIGH))
+
+
+@router.callback_query(F.data.startswith("charts:period:"))
+async def charts_period(callback: CallbackQuery):
+    period = callback.data.split(":", 2)[2]
+    try:
+        await callback.message.edit_reply_markup(reply_markup=charts_menu_keyboard(period))
+    except TelegramBadRequest as exc:
+        # Повторное нажатие на уже выбранный период: разметка та же, Telegram отказывает
+        if "message is not modified" not in str(exc):
+            raise
+    finally:
+        await callback.answer()
+
+
+@router.callback_query(F.data == "chart:dashboard", flags={"throttle": "render"})
+@single_flight
+async def chart_dashboard(callback: CallbackQuery, repo: Repository):
+    # Все графики одной картинкой из одной выборки замеров
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    rows = db.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=30)
+    rows = repo.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=60)
     if not rows:
         await callback.answer("Недостаточно данных для графика.", show_alert=True)
         return
 
-    image = charts.daily_curve(rows)
-    await callback.message.answer_photo(BufferedInputFile(image.getvalue(), filename="daily.png"))
+    image = await render.render(
+        "dashboard_chart", render.plain_rows(rows), low=config.RANGE_LOW, high=config.RANGE_HIGH
+    )
+    await callback.message.answer_photo(_photo(image, "dashboard"))
     await callback.answer()
 
 
-@router.callback_query(F.data == "chart:nadir")
-async def chart_nadir(callback: CallbackQuery):
-    # Nadir за последние 60 дней
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+@router.callback_query(F.data.startswith("chart:daily"), flags={"throttle": "render"})
+@single_flight
+async def chart_daily(callback: CallbackQuery, repo: Repository):
+    # Суточная кривая за последний месяц или тренд за выбранный период
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    rows = db.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=60)
-    if not rows:
-        await callback.answer("Недостаточно данных для графика.", show_alert=True)
+    period = _chart_period(callback.data)
+    if period:
+        buckets = _long_range_buckets(repo, callback.message.chat.id, cat["name"], period)
+        if not buckets:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render("daily_trend_chart", buckets)
+    else:
+        rows = repo.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=30)
+        if not rows:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render("daily_curve", render.plain_rows(rows))
+    await callback.message.answer_photo(_photo(image, "daily"))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("chart:nadir"), flags={"throttle": "render"})
+@single_flight
+async def chart_nadir(callback: CallbackQuery, repo: Repository):
+    # Nadir за последние 60 дней или за выбранный период
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
+    if not cat:
+        await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    image = charts.nadir_chart(rows)
-    await callback.message.answer_photo(BufferedInputFile(image.getvalue(), filename="nadir.png"))
+    period = _chart_period(callback.data)
+    if period:
+        buckets = _long_range_buckets(repo, callback.message.chat.id, cat["name"], period)
+        if not buckets:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render("nadir_trend_chart", buckets)
+    else:
+        nadirs = repo.get_daily_nadirs(callback.message.chat.id, cat["name"], days=60)
+        if not nadirs:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render("nadir_chart", render.plain_dicts(nadirs))
+    await callback.message.answer_photo(_photo(image, "nadir"))
     await callback.answer()
 
 
-@router.callback_query(F.data == "chart:amps_pmps")
-async def chart_amps_pmps(callback: CallbackQuery):
-    # AMPS/PMPS за последние 60 дней
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+@router.callback_query(F.data.startswith("chart:amps_pmps"), flags={"throttle": "render"})
+@single_flight
+async def chart_amps_pmps(callback: CallbackQuery, repo: Repository):
+    # AMPS/PMPS за последние 60 дней или за выбранный период
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    rows = db.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=60)
-    if not rows:
+    period = _chart_period(callback.data)
+    days = LONG_PERIODS[period] if period else 60
+    days_data = repo.get_daily_amps_pmps(callback.message.chat.id, cat["name"], days=days)
+    if not days_data:
         await callback.answer("Недостаточно данных для графика.", show_alert=True)
         return
 
-    amps, pmps = charts.amps_pmps_chart(rows)
-    await callback.message.answer_photo(BufferedInputFile(amps.getvalue(), filename="amps.png"))
-    await callback.message.answer_photo(BufferedInputFile(pmps.getvalue(), filename="pmps.png"))
+    kind = "amps_pmps_trend_chart" if period else "amps_pmps_chart"
+    amps, pmps = await render.render(kind, render.plain_dicts(days_data))
+    await callback.message.answer_photo(_photo(amps, "amps"))
+    await callback.message.answer_photo(_photo(pmps, "pmps"))
     await callback.answer()
 
 
-@router.callback_query(F.data == "chart:range")
-async def chart_range(callback: CallbackQuery):
-    # Процент в целевом диапазоне 4–10
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+@router.callback_query(F.data.startswith("chart:range"), flags={"throttle": "render"})
+@single_flight
+async def chart_range(callback: CallbackQuery, repo: Repository):
+    # Процент в целевом диапазоне; те же границы уходят в запрос и в подпись графика
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
 
-    rows = db.get_measures(chat_id=callback.message.chat.id, name=cat["name"], days=60)
-    if not rows:
-        await callback.answer("Недостаточно данных для графика.", show_alert=True)
-        return
-
-    image = charts.range_percent_chart(rows)
-    await callback.message.answer_photo(BufferedInputFile(image.getvalue(), filename="range.png"))
+    period = _chart_period(callback.data)
+    if period:
+        buckets = _long_range_buckets(repo, callback.message.chat.id, cat["name"], period)
+        if not buckets:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render("range_trend_chart", buckets, low=config.RANGE_LOW, high=config.RANGE_HIGH)
+    else:
+        counts = repo.get_daily_range_counts(
+            callback.message.chat.id, cat["name"], days=60, low=config.RANGE_LOW, high=config.RANGE_HIGH
+        )
+        if not counts:
+            await callback.answer("Недостаточно данных для графика.", show_alert=True)
+            return
+        image = await render.render(
+            "range_percent_chart", render.plain_dicts(counts), low=config.RANGE_LOW, high=config.RANGE_HIGH
+        )
+    await callback.message.answer_photo(_photo(image, "range"))
     await callback.answer()
 
 
 @router.callback_query(F.data == "register:start")
-async def register_start(callback: CallbackQuery, state: FSMContext):
+async def register_start(callback: CallbackQuery, state: FSMContext, repo: Repository):
     # Запускаем регистрацию пациента
-    if db.get_cat_by_chat(callback.message.chat.id):
+    if repo.get_cat_by_chat(callback.message.chat.id):
         await callback.answer("Пациент уже зарегистрирован.", show_alert=True)
         return
 
@@ -371,7 +533,7 @@ async def register_peak(message: Message, state: FSMContext):
 
 
 @router.message(RegisterCat.pm_time)
-async def register_pm_time(message: Message, state: FSMContext):
+async def register_pm_time(message: Message, state: FSMContext, repo: Repository):
     # Шаг 4: вечернее время и сохранение пациента
     time_str = parse_time(message.text)
     if not time_str:
@@ -379,7 +541,7 @@ async def register_pm_time(message: Message, state: FSMContext):
         return
 
     data = await state.get_data()
-    db.create_cat(
+    repo.create_cat(
         chat_id=message.chat.id,
         user_id=message.from_user.id,
         name=data["name"],
@@ -399,9 +561,9 @@ async def register_pm_time(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("settings:"))
-async def settings_edit(callback: CallbackQuery, state: FSMContext):
+async def settings_edit(callback: CallbackQuery, state: FSMContext, repo: Repository):
     # Выбираем, какой параметр редактировать
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
@@ -426,14 +588,14 @@ async def settings_edit(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(EditCat.name)
-async def edit_name(message: Message, state: FSMContext):
+async def edit_name(message: Message, state: FSMContext, repo: Repository):
     new_name = message.text.strip()
     if not new_name or len(new_name) > 30:
         await message.answer("Имя должно быть не пустым и до 30 символов.")
         return
 
     data = await state.get_data()
-    db.rename_cat(message.chat.id, data["name"], new_name)
+    repo.rename_cat(message.chat.id, data["name"], new_name)
     await state.clear()
     await message.answer(
         "Имя обновлено.", reply_markup=ReplyKeyboardRemove()
@@ -441,48 +603,48 @@ async def edit_name(message: Message, state: FSMContext):
 
 
 @router.message(EditCat.am_time)
-async def edit_am_time(message: Message, state: FSMContext):
+async def edit_am_time(message: Message, state: FSMContext, repo: Repository):
     time_str = parse_time(message.text)
     if not time_str:
         await message.answer("Неверный формат. Пример: 07:30")
         return
 
     data = await state.get_data()
-    db.update_cat_field(message.chat.id, data["name"], "am_time", time_str)
+    repo.update_cat_field(message.chat.id, data["name"], "am_time", time_str)
     await state.clear()
     await message.answer("Утреннее время обновлено.", reply_markup=ReplyKeyboardRemove())
 
 
 @router.message(EditCat.peak)
-async def edit_peak(message: Message, state: FSMContext):
+async def edit_peak(message: Message, state: FSMContext, repo: Repository):
     peak = parse_peak(message.text)
     if peak is None:
         await message.answer("Нужен целый час, например 4.")
         return
 
     data = await state.get_data()
-    db.update_cat_field(message.chat.id, data["name"], "peak", peak)
+    repo.update_cat_field(message.chat.id, data["name"], "peak", peak)
     await state.clear()
     await message.answer("Время пика обновлено.", reply_markup=ReplyKeyboardRemove())
 
 
 @router.message(EditCat.pm_time)
-async def edit_pm_time(message: Message, state: FSMContext):
+async def edit_pm_time(message: Message, state: FSMContext, repo: Repository):
     time_str = parse_time(message.text)
     if not time_str:
         await message.answer("Неверный формат. Пример: 19:00")
         return
 
     data = await state.get_data()
-    db.update_cat_field(message.chat.id, data["name"], "pm_time", time_str)
+    repo.update_cat_field(message.chat.id, data["name"], "pm_time", time_str)
     await state.clear()
     await message.answer("Вечернее время обновлено.", reply_markup=ReplyKeyboardRemove())
 
 
 @router.message(Command("measure"))
-async def measure_start(message: Message, state: FSMContext):
+async def measure_start(message: Message, state: FSMContext, repo: Repository):
     # Ручной ввод замера через команду
-    cat = db.get_cat_by_chat(message.chat.id)
+    cat = repo.get_cat_by_chat(message.chat.id)
     if not cat:
         await message.answer("Сначала зарегистрируйте пациента командой /start.")
         return
@@ -495,9 +657,35 @@ async def measure_start(message: Message, state: FSMContext):
     )
 
 
+@router.message(Command("export"), flags={"throttle": "render"})
+async def export_history(message: Message, command: CommandObject, repo: Repository):
+    # Вся история замеров файлом для врача: /export или /export xlsx
+    cat = repo.get_cat_by_chat(message.chat.id)
+    if not cat:
+        await message.answer("Сначала зарегистрируйте пациента командой /start.")
+        return
+
+    file_format = (command.args or "csv").strip().lower()
+    if file_format not in export.FORMATS:
+        await message.answer("Доступные форматы: " + ", ".join(export.FORMATS))
+        return
+
+    out, count = await asyncio.to_thread(export.build_export, repo, message.chat.id, cat["name"], file_format)
+    try:
+        if not count:
+            await message.answer("Пока нет замеров для выгрузки.")
+            return
+        await message.answer_document(
+            export.SpooledInputFile(out, export.file_name(cat["name"], file_format)),
+            caption=f"Все замеры пациента {cat['name']}: {count}",
+        )
+    finally:
+        out.close()
+
+
 @router.callback_query(F.data.startswith("measure:") & (F.data != "measure:cancel"))
-async def measure_tag(callback: CallbackQuery, state: FSMContext):
-    cat = db.get_cat_by_chat(callback.message.chat.id)
+async def measure_tag(callback: CallbackQuery, state: FSMContext, repo: Repository):
+    cat = repo.get_cat_by_chat(callback.message.chat.id)
     if not cat:
         await callback.answer("Сначала зарегистрируйте пациента.", show_alert=True)
         return
@@ -513,25 +701,25 @@ async def measure_tag(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(Measure.value)
-async def measure_value(message: Message, state: FSMContext):
-    await handle_measure_value(message, state)
+async def measure_value(message: Message, state: FSMContext, repo: Repository):
+    await handle_measure_value(message, state, repo)
 
 
 @router.message(F.text & ~F.text.startswith("/"))
-async def measure_value_from_reminder(message: Message, state: FSMContext):
+async def measure_value_from_reminder(message: Message, state: FSMContext, repo: Repository):
     if not message.text:
         return
     if message.text.casefold() == "отмена":
         return
     reminder_state = reminder_context(message, state)
     if await reminder_state.get_state() == Measure.value.state:
-        await handle_measure_value(message, reminder_state)
+        await handle_measure_value(message, reminder_state, repo)
         return
     pending = measure_flow.get_pending_measure(message.chat.id)
     if not pending:
         return
     await reminder_state.update_data(tag=pending.tag, name=pending.name)
-    was_saved = await handle_measure_value(message, reminder_state)
+    was_saved = await handle_measure_value(message, reminder_state, repo)
     if was_saved:
         measure_flow.clear_pending_measure(message.chat.id)
 
@@ -554,22 +742,101 @@ async def cancel_any(message: Message, state: FSMContext):
     await message.answer("Действие отменено.", reply_markup=ReplyKeyboardRemove())
 
 
-async def on_startup(bot: Bot, dispatcher: Dispatcher):
-    # Запускаем фоновые задачи уведомлений
-    asyncio.create_task(schedule_daily_checks(bot))
-    asyncio.create_task(schedule_procedure_reminders(bot, dispatcher.fsm.storage))
+async def on_startup(
+    bot: Bot,
+    dispatcher: Dispatcher,
+    started_at: float,
+    repo: Repository,
+    db_path: str | None,
+):
+    # Фоновые задачи под присмотром: упавшие перезапускаются, состояние в метриках
+    supervisor = Supervisor(config.TASK_BACKOFF_INITIAL, config.TASK_BACKOFF_MAX)
+    dispatcher["supervisor"] = supervisor
+    supervisor.start("daily_checks", lambda: schedule_daily_checks(bot, repo))
+    supervisor.start(
+        "procedure_reminders", lambda: schedule_procedure_reminders(bot, repo, dispatcher.fsm.storage)
+    )
+    if config.ARCHIVE_AFTER_DAYS:
+        supervisor.start("archival", lambda: schedule_archival(repo))
+    # Резервные копии есть только у базы в файле
+    if config.BACKUP_DIR and db_path:
+        supervisor.start("backups", lambda: schedule_backups(db_path))
+    if config.STATS_DIGEST:
+        supervisor.start("stats_digests", lambda: schedule_stats_digests(repo))
+    loop_monitor = instrumentation.LoopLagMonitor(config.LOOP_LAG_INTERVAL, config.LOOP_LAG_THRESHOLD)
+    supervisor.start("loop_lag_monitor", loop_monitor.run)
+    if config.TRACEMALLOC_FRAMES:
+        profiling.start_tracemalloc(config.TRACEMALLOC_FRAMES)
+    if config.RENDER_WARMUP:
+        supervisor.start("render_warmup", render.warmup, restart=False)
+    if config.METRICS_PORT:
+        dispatcher["metrics_runner"] = await instrumentation.serve_metrics(
+            config.METRICS_HOST, config.METRICS_PORT
+        )
+
+    startup_seconds = time.perf_counter() - started_at
+    metrics.set_gauge("startup_seconds", startup_seconds)
+    logger.info("Bot started in %.2f s", startup_seconds)
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    # Останавливаем фоновые задачи, процессы отрисовки и сервер метрик вместе с ботом
+    supervisor = dispatcher.workflow_data.get("supervisor")
+    if supervisor is not None:
+        await supervisor.stop()
+    await asyncio.to_thread(render.shutdown)
+    metrics_runner = dispatcher.workflow_data.get("metrics_runner")
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+def build_repository(db_path: str | None) -> Repository:
+    # SQLite и кэш последних замеров в памяти поверх неё; без файла — всё в памяти
+    if db_path is None:
+        return MemoryRepository()
+    repo = db.SqliteRepository(db_path)
+    if not config.MEASURE_CACHE_BYTES:
+        return repo
+    return measure_cache.MeasureCache(repo, config.MEASURE_CACHE_DAYS, config.MEASURE_CACHE_BYTES)
+
+
+def build_dispatcher(started_at: float, repo: Repository, db_path: str | None = None) -> Dispatcher:
+    # Диспетчер со всеми middleware и роутерами; его же использует нагрузочный тест.
+    # Обработчики получают repo из данных диспетчера, db_path нужен для резервных копий.
+    dispatcher = Dispatcher(started_at=started_at, repo=repo, db_path=db_path)
+    # Метрики первыми: время обработчика учитывает и отказы по частоте.
+    # Профилируем только то, что прошло ограничение частоты.
+    handler_metrics = instrumentation.HandlerMetricsMiddleware()
+    throttling_middleware = throttling.build_middleware()
+    profiler = profiling.build_middleware()
+    dispatcher["profiler"] = profiler
+    for observer in (dispatcher.message, dispatcher.callback_query):
+        observer.middleware(handler_metrics)
+        observer.middleware(throttling_middleware)
+        observer.middleware(profiler)
+    # Команды администратора раньше основного роутера, который ловит любой текст в состояниях
+    dispatcher.include_router(profiling.admin_router)
+    dispatcher.include_router(router)
+    dispatcher.include_router(help_router)
+    dispatcher.startup.register(on_startup)
+    dispatcher.shutdown.register(on_shutdown)
+    return dispatcher
 
 
 async def main():
-    db.ensure_schema()
+    started_at = time.perf_counter()
+    db_path = None if config.STORAGE == "memory" else db.DB_PATH
+    if db_path:
+        migrations.migrate(db_path)
     token = load_token()
     bot = Bot(token=token)
-    dispatcher = Dispatcher()
-    dispatcher.include_router(router)
-    dispatcher.include_router(help_router)
-    dispatcher.startup.register(on_startup)
-    await dispatcher.start_polling(bot)
+    dispatcher = build_dispatcher(started_at, build_repository(db_path), db_path)
+    if config.BOT_MODE == "webhook":
+        await webhook.run_webhook(dispatcher, bot)
+    else:
+        await dispatcher.start_polling(bot)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Iterator, Optional
+
+import metrics
+from repository import Repository
+
+MINUTES_PER_DAY = 24 * 60
+
+# Коды тегов для массива tags; незнакомый тег получает следующий код
+_TAGS: list[str] = ["AMPS", "PEAK", "PMPS", "OTHER"]
+_TAG_CODES: dict[str, int] = {tag: code for code, tag in enumerate(_TAGS)}
+
+
+def _tag_code(tag: str) -> int:
+    code = _TAG_CODES.get(tag)
+    if code is None:
+        code = _TAG_CODES[tag] = len(_TAGS)
+        _TAGS.append(tag)
+    return code
+
+
+def _stamp(day: date, time_str: str) -> int:
+    # Минуты от начала эпохи date.toordinal: порядок как у ORDER BY date, time
+    hours, minutes = time_str.split(":")
+    return day.toordinal() * MINUTES_PER_DAY + int(hours) * 60 + int(minutes)
+
+
+class _Series:
+    # Замеры одного кота по возрастанию времени в плотных массивах: 17 байт на замер.
+    # Начиная с first_day (ordinal) в серии есть все замеры из базы.
+    __slots__ = ("first_day", "stamps", "amounts", "tags")
+
+    def __init__(self, first_day: int):
+        self.first_day = first_day
+        self.stamps = array("q")
+        self.amounts = array("d")
+        self.tags = array("B")
+
+    def add(self, stamp: int, amount: float, tag: str) -> None:
+        # Почти всегда это конец массива; вставка в середину — если часы ушли назад
+        pos = bisect_right(self.stamps, stamp)
+        if pos == len(self.stamps):
+            self.stamps.append(stamp)
+            self.amounts.append(amount)
+            self.tags.append(_tag_code(tag))
+        else:
+            self.stamps.insert(pos, stamp)
+            self.amounts.insert(pos, amount)
+            self.tags.insert(pos, _tag_code(tag))
+
+    def trim(self, first_day: int) -> None:
+        # Окно сдвинулось на новые сутки: отрезаем замеры, вышедшие из него
+        if first_day <= self.first_day:
+            return
+        pos = bisect_left(self.stamps, first_day * MINUTES_PER_DAY)
+        if pos:
+            del self.stamps[:pos]
+            del self.amounts[:pos]
+            del self.tags[:pos]
+        self.first_day = first_day
+
+    def rows(self, first_day: int, last_day: Optional[int] = None) -> list[dict]:
+        # Строки с полями date, time, amount, tag — как у sqlite3.Row из db
+        lo = bisect_left(self.stamps, first_day * MINUTES_PER_DAY)
+        if last_day is None:
+            hi = len(self.stamps)
+        else:
+            hi = bisect_left(self.stamps, (last_day + 1) * MINUTES_PER_DAY)
+        rows = []
+        day_strings: dict[int, str] = {}
+        for idx in range(lo, hi):
+            day, minute = divmod(self.stamps[idx], MINUTES_PER_DAY)
+            day_str = day_strings.get(day)
+            if day_str is None:
+                day_str = day_strings[day] = date.fromordinal(day).isoformat()
+            rows.append(
+                {
+                    "date": day_str,
+                    "time": f"{minute // 60:02d}:{minute % 60:02d}",
+                    "amount": self.amounts[idx],
+                    "tag": _TAGS[self.tags[idx]],
+                }
+            )
+        return rows
+
+    def days(self, first_day: int) -> Iterator[tuple[str, list[float], list[int]]]:
+        # Замеры по дням начиная с first_day: дата, значения и коды тегов по времени
+        lo = bisect_left(self.stamps, first_day * MINUTES_PER_DAY)
+        current, amounts, tags = None, [], []
+        for idx in range(lo, len(self.stamps)):
+            day = self.stamps[idx] // MINUTES_PER_DAY
+            if day != current:
+                if amounts:
+                    yield date.fromordinal(current).isoformat(), amounts, tags
+                current, amounts, tags = day, [], []
+            amounts.append(self.amounts[idx])
+            tags.append(self.tags[idx])
+        if amounts:
+            yield date.fromordinal(current).isoformat(), amounts, tags
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.stamps) + sys.getsizeof(self.amounts) + sys.getsizeof(self.tags)
+
+
+class MeasureCache:
+    # Репозиторий с кэшем последних window_days дней замеров по котам поверх другого
+    # репозитория. Серия загружается при первом обращении, дальше пополняется через
+    # add_measure. Если серии вместе занимают больше budget_bytes, вытесняются давно
+    # не использованные. Замеры и дневные агрегаты для графиков за период в пределах
+    # окна отдаются из серии; периоды длиннее окна и остальные методы идут в repo.
+    def __init__(
+        self,
+        repo: Repository,
+        window_days: int,
+        budget_bytes: int,
+        today: Callable[[], date] = date.today,
+    ):
+        self.repo = repo
+        self.window_days = window_days
+        self.budget_bytes = budget_bytes
+        self._today = today
+        self._series: OrderedDict[tuple[int, str], _Series] = OrderedDict()
+        self._bytes = 0
+
+    def __getattr__(self, name: str):
+        # Коты, агрегаты, сводки и выгрузка — без кэша
+        return getattr(self.repo, name)
+
+    def _series_for(self, chat_id: int, name: str, first_day: int) -> Optional[_Series]:
+        # None — кэш выключен или период начинается раньше окна
+        window_start = self._today().toordinal() - self.window_days
+        if not self.budget_bytes or first_day < window_start:
+            return None
+        key = (chat_id, name)
+        series = self._series.get(key)
+        if series is None:
+            metrics.inc("measure_cache_requests_total", result="miss")
+            series = _Series(window_start)
+            for row in self.repo.get_measures(chat_id, name, self.window_days):
+                series.add(_stamp(date.fromisoformat(row["date"]), row["time"]), row["amount"], row["tag"])
+            self._series[key] = series
+            self._bytes += series.nbytes()
+        else:
+            metrics.inc("measure_cache_requests_total", result="hit")
+            self._series.move_to_end(key)
+            before = series.nbytes()
+            series.trim(window_start)
+            self._bytes += series.nbytes() - before
+        self._evict()
+        return series
+
+    def _evict(self) -> None:
+        # Последнюю использованную серию оставляем, даже если она одна больше бюджета
+        while self._bytes > self.budget_bytes and len(self._series) > 1:
+            _, series = self._series.popitem(last=False)
+            self._bytes -= series.nbytes()
+            metrics.inc("measure_cache_evictions_total")
+        metrics.set_gauge("measure_cache_bytes", self._bytes)
+        metrics.set_gauge("measure_cache_series", len(self._series))
+
+    def get_measures(self, chat_id: int, name: str, days: Optional[int]):
+        today = self._today().toordinal()
+        series = self._series_for(chat_id, name, today - days) if days is not None else None
+        if series is None:
+            return self.repo.get_measures(chat_id, name, days)
+        # Как в db: с даты «сегодня минус days» без верхней границы
+        return series.rows(today - days)
+
+    def get_measures_between(self, chat_id: int, name: str, start_date: date, end_date: date):
+        series = self._series_for(chat_id, name, start_date.toordinal())
+        if series is None:
+            return self.repo.get_measures_between(chat_id, name, start_date, end_date)
+        return series.rows(start_date.toordinal(), end_date.toordinal())
+
+    def get_daily_measures(self, chat_id: int, name: str, days: int) -> dict[str, list]:
+        by_date: dict[str, list] = {}
+        for row in self.get_measures(chat_id, name, days):
+            by_date.setdefault(row["date"], []).append(row)
+        return by_date
+
+    # Агрегаты по дням для графиков: те же строки, что у запросов db.get_daily_*
+
+    def _window_days(self, chat_id: int, name: str, days: Optional[int]):
+        if days is None:
+            return None
+        first_day = self._today().toordinal() - days
+        series = self._series_for(chat_id, name, first_day)
+        return series.days(first_day) if series is not None else None
+
+    def get_daily_nadirs(self, chat_id: int, name: str, days: Optional[int]):
+        by_day = self._window_days(chat_id, name, days)
+        if by_day is None:
+            return self.repo.get_daily_nadirs(chat_id, name, days)
+        return [{"date": day, "nadir": min(amounts)} for day, amounts, _ in by_day]
+
+    def get_daily_amps_pmps(self, chat_id: int, name: str, days: Optional[int]):
+        # AMPS — первый замер с тегом AMPS, иначе первый за день;
+        # PMPS — первый с тегом PMPS, иначе последний за день
+        by_day = self._window_days(chat_id, name, days)
+        if by_day is None:
+            return self.repo.get_daily_amps_pmps(chat_id, name, days)
+        amps_code, pmps_code = _TAG_CODES["AMPS"], _TAG_CODES["PMPS"]
+        result = []
+        for day, amounts, tags in by_day:
+            amps = amounts[tags.index(amps_code)] if amps_code in tags else amounts[0]
+            pmps = amounts[tags.index(pmps_code)] if pmps_code in tags else amounts[-1]
+            result.append({"date": day, "amps": amps, "pmps": pmps})
+        return result
+
+    def get_daily_range_counts(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ):
+        by_day = self._window_days(chat_id, name, days)
+        if by_day is None:
+            return self.repo.get_daily_range_counts(chat_id, name, days, low, high)
+        return [
+            {"date": day, "count": len(amounts), "in_range": sum(low < amount < high for amount in amounts)}
+            for day, amounts, _ in by_day
+        ]
+
+    def add_measure(
+        self,
+        chat_id: int,
+        user_id: int,
+        name: str,
+        amount: float,
+        tag: str,
+        when: Optional[datetime] = None,
+    ) -> None:
+        # Запись идёт в repo, а в кэш — только если серия уже загружена
+        when = when or datetime.now()
+        self.repo.add_measure(chat_id, user_id, name, amount, tag, when=when)
+        series = self._series.get((chat_id, name))
+        if series is None or when.date().toordinal() < series.first_day:
+            return
+        before = series.nbytes()
+        series.add(_stamp(when.date(), when.strftime("%H:%M")), amount, tag)
+        self._bytes += series.nbytes() - before
+        self._evict()
+
+    def rename_cat(self, chat_id: int, old_name: str, new_name: str) -> None:
+        self.repo.rename_cat(chat_id, old_name, new_name)
+        self.forget(chat_id, old_name)
+        self.forget(chat_id, new_name)
+
+    def forget(self, chat_id: int, name: str) -> None:
+        series = self._series.pop((chat_id, name), None)
+        if series is not None:
+            self._bytes -= series.nbytes()
+        self._evict()
+
+    def clear(self) -> None:
+        self._series.clear()
+        self._bytes = 0
+        self._evict()
@@ -22,3 +22,7 @@ def get_pending_measure(chat_id: int) -> PendingMeasure | None:
 
 def clear_pending_measure(chat_id: int) -> None:
     _PENDING_MEASURES.pop(chat_id, None)
+
+
+def pending_count() -> int:
+    return len(_PENDING_MEASURES)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import math
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            # Последняя ячейка — +Inf
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+_LOCK = threading.Lock()
+_COUNTERS: dict[str, dict[LabelKey, float]] = {}
+_GAUGES: dict[str, dict[LabelKey, float]] = {}
+_HISTOGRAMS: dict[str, dict[LabelKey, Histogram]] = {}
+
+
+def _label_key(labels: dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    key = _label_key(labels)
+    with _LOCK:
+        series = _COUNTERS.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    key = _label_key(labels)
+    with _LOCK:
+        _GAUGES.setdefault(name, {})[key] = value
+
+
+def add_gauge(name: str, delta: float, **labels) -> None:
+    key = _label_key(labels)
+    with _LOCK:
+        series = _GAUGES.setdefault(name, {})
+        series[key] = series.get(key, 0) + delta
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _label_key(labels)
+    with _LOCK:
+        series = _HISTOGRAMS.setdefault(name, {})
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+
+def snapshot() -> dict:
+    # Копия всех метрик для вывода наружу
+    with _LOCK:
+        return {
+            "counters": {name: dict(series) for name, series in _COUNTERS.items()},
+            "gauges": {name: dict(series) for name, series in _GAUGES.items()},
+            "histograms": {
+                name: {
+                    key: Histogram(h.buckets, list(h.counts), h.total, h.count)
+                    for key, h in series.items()
+                }
+                for name, series in _HISTOGRAMS.items()
+            },
+        }
+
+
+def collect() -> dict:
+    # Забирает накопленное и очищает реестр: так процессы отрисовки
+    # передают свои метрики основному процессу вместе с результатом
+    with _LOCK:
+        data = {
+            "counters": {name: dict(series) for name, series in _COUNTERS.items()},
+            "histograms": {name: dict(series) for name, series in _HISTOGRAMS.items()},
+        }
+        _COUNTERS.clear()
+        _HISTOGRAMS.clear()
+    return data
+
+
+def merge(data: dict) -> None:
+    with _LOCK:
+        for name, series in data["counters"].items():
+            target = _COUNTERS.setdefault(name, {})
+            for key, value in series.items():
+                target[key] = target.get(key, 0) + value
+        for name, series in data["histograms"].items():
+            target = _HISTOGRAMS.setdefault(name, {})
+            for key, histogram in series.items():
+                current = target.get(key)
+                if current is None:
+                    target[key] = histogram
+                    continue
+                current.counts = [a + b for a, b in zip(current.counts, histogram.counts)]
+                current.total += histogram.total
+                current.count += histogram.count
+
+
+def timed(name: str, **labels):
+    # Декоратор: гистограмма длительности вызова с меткой func=<имя функции>.
+    # Работает и для обычных, и для async-функций.
+    def decorator(func):
+        func_labels = {"func": func.__name__, **labels}
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(name, time.perf_counter() - started, **func_labels)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started, **func_labels)
+
+        return wrapper
+
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus() -> str:
+    # Текстовый формат Prometheus 0.0.4
+    data = snapshot()
+    lines = []
+    for name, series in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {name} counter")
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+    for name, series in sorted(data["gauges"].items()):
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+    for name, series in sorted(data["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in series.items():
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, math.inf), histogram.counts):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.total)}")
+            lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,322 @@
+"""Миграции схемы по PRAGMA user_version.
+
+Каждая миграция — отдельная транзакция, после неё user_version = её номер.
+Долгое заполнение данных (backfill) идёт пачками в своих транзакциях, а номер
+версии ставится только после последней пачки, поэтому прерванная миграция
+просто продолжается при следующем запуске.
+
+Запуск из корня проекта:
+    python migrations.py             — применить к data.db
+    python migrations.py --dry-run   — прогнать на копии базы и показать время шагов
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_ROWS = 1000
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    # Изменения схемы: выполняются в одной транзакции, должны быть повторяемыми
+    schema: Callable[[sqlite3.Connection], None]
+    # Заполнение данных пачками: возвращает число обработанных строк, 0 — готово
+    backfill: Optional[Callable[[sqlite3.Connection, int], int]] = None
+
+
+@dataclass
+class MigrationResult:
+    version: int
+    description: str
+    seconds: float
+    backfilled_rows: int = 0
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def _create_cats(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            am_time TEXT NOT NULL,
+            peak INTEGER NOT NULL,
+            pm_time TEXT NOT NULL,
+            PRIMARY KEY (chat_id, name)
+        )
+        """
+    )
+
+
+def _create_measure(conn: sqlite3.Connection, table: str, cats_table: str) -> None:
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            amount REAL NOT NULL CHECK (amount >= 0),
+            tag TEXT NOT NULL,
+            FOREIGN KEY (chat_id, name)
+                REFERENCES {cats_table} (chat_id, name)
+                ON DELETE CASCADE
+        )
+        """
+    )
+
+
+def _m001_base_schema(conn: sqlite3.Connection) -> None:
+    # Новая база — создаём таблицы. Старая раскладка, где внешний ключ measure
+    # шёл по user_id, пересобирается с ключом (chat_id, name).
+    if not _table_exists(conn, "measure"):
+        _create_cats(conn, "cats")
+        _create_measure(conn, "measure", "cats")
+        return
+
+    fk_rows = conn.execute("PRAGMA foreign_key_list(measure)").fetchall()
+    if not any(row[3] == "user_id" for row in fk_rows):
+        return
+
+    _create_cats(conn, "cats_new")
+    conn.execute(
+        """
+        INSERT INTO cats_new (chat_id, user_id, name, is_active, am_time, peak, pm_time)
+        SELECT chat_id, user_id, name, is_active, am_time, peak, pm_time
+        FROM cats
+        GROUP BY chat_id, name
+        """
+    )
+    _create_measure(conn, "measure_new", "cats_new")
+    conn.execute(
+        """
+        INSERT INTO measure_new (id, chat_id, user_id, name, date, time, amount, tag)
+        SELECT id, chat_id, user_id, name, date, time, amount, tag
+        FROM measure
+        """
+    )
+    conn.execute("DROP TABLE measure")
+    conn.execute("DROP TABLE cats")
+    conn.execute("ALTER TABLE cats_new RENAME TO cats")
+    conn.execute("ALTER TABLE measure_new RENAME TO measure")
+
+
+def _m002_measure_index(conn: sqlite3.Connection) -> None:
+    # Все выборки замеров идут по коту и дате
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_measure_cat_date
+        ON measure (chat_id, name, date)
+        """
+    )
+
+
+def _m003_archive(conn: sqlite3.Connection) -> None:
+    # Архив старых замеров (см. db.archive_measures_batch) и представление на обе таблицы
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS measure_archive (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            amount REAL NOT NULL CHECK (amount >= 0),
+            tag TEXT NOT NULL,
+            FOREIGN KEY (chat_id, name)
+                REFERENCES cats (chat_id, name)
+                ON DELETE CASCADE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_measure_archive_cat_date
+        ON measure_archive (chat_id, name, date)
+        """
+    )
+    conn.execute(
+        """
+        CREATE VIEW IF NOT EXISTS measure_all AS
+        SELECT * FROM measure
+        UNION ALL
+        SELECT * FROM measure_archive
+        """
+    )
+
+
+def _m004_stats_digest(conn: sqlite3.Connection) -> None:
+    # Ночная сводка статистики (см. digest.py): итоги за прошлые дни и готовые страницы таблицы
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_digest (
+            chat_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            digest_date TEXT NOT NULL,
+            glucose_sum REAL NOT NULL,
+            glucose_count INTEGER NOT NULL,
+            nadir_sum REAL NOT NULL,
+            nadir_days INTEGER NOT NULL,
+            table_rows INTEGER NOT NULL,
+            other_columns INTEGER NOT NULL,
+            pdf BLOB NOT NULL,
+            PRIMARY KEY (chat_id, name)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stats_digest_page (
+            chat_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            png BLOB NOT NULL,
+            PRIMARY KEY (chat_id, name, page),
+            FOREIGN KEY (chat_id, name)
+                REFERENCES stats_digest (chat_id, name)
+                ON DELETE CASCADE
+        )
+        """
+    )
+
+
+# Только дописывать в конец; номера не меняются после выпуска
+MIGRATIONS = (
+    Migration(1, "cats and measure tables", _m001_base_schema),
+    Migration(2, "measure (chat_id, name, date) index", _m002_measure_index),
+    Migration(3, "measure_archive table and measure_all view", _m003_archive),
+    Migration(4, "stats_digest cache tables", _m004_stats_digest),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply(conn: sqlite3.Connection, migration: Migration, batch_rows: int) -> Optional[MigrationResult]:
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Версию перечитываем под блокировкой: миграцию мог применить другой процесс
+        if _user_version(conn) >= migration.version:
+            conn.execute("ROLLBACK")
+            return None
+        migration.schema(conn)
+        if migration.backfill is None:
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+    backfilled = 0
+    if migration.backfill is not None:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = migration.backfill(conn, batch_rows)
+                if not rows:
+                    conn.execute(f"PRAGMA user_version = {migration.version}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if not rows:
+                break
+            backfilled += rows
+    return MigrationResult(migration.version, migration.description, time.perf_counter() - started, backfilled)
+
+
+def migrate(
+    db_path: str,
+    migrations: tuple[Migration, ...] = MIGRATIONS,
+    batch_rows: int = BACKFILL_BATCH_ROWS,
+) -> list[MigrationResult]:
+    # Если схема актуальна, дело ограничивается чтением user_version
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        current = _user_version(conn)
+        pending = [m for m in migrations if m.version > current]
+        if not pending:
+            return []
+        # Пересборка таблиц невозможна с включёнными внешними ключами
+        conn.execute("PRAGMA foreign_keys = OFF")
+        results = []
+        for migration in pending:
+            result = _apply(conn, migration, batch_rows)
+            if result is None:
+                continue
+            logger.info(
+                "Applied migration %d (%s) in %.2f s", result.version, result.description, result.seconds
+            )
+            results.append(result)
+        return results
+    finally:
+        conn.close()
+
+
+def dry_run(db_path: str, batch_rows: int = BACKFILL_BATCH_ROWS) -> list[MigrationResult]:
+    # Миграции применяются к копии базы: видно, что и сколько времени займёт
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, "dry-run.db")
+        if os.path.exists(db_path):
+            source = sqlite3.connect(db_path)
+            target = sqlite3.connect(copy_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        return migrate(copy_path, batch_rows=batch_rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Миграции схемы базы бота")
+    parser.add_argument("--db", default="data.db")
+    parser.add_argument("--dry-run", action="store_true", help="применить к копии базы и показать время")
+    parser.add_argument("--batch-rows", type=int, default=BACKFILL_BATCH_ROWS)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        conn = sqlite3.connect(args.db)
+        current = _user_version(conn)
+        conn.close()
+    else:
+        current = 0
+    print(f"{args.db}: версия {current}, последняя {LATEST_VERSION}")
+
+    runner = dry_run if args.dry_run else migrate
+    results = runner(args.db, batch_rows=args.batch_rows)
+    for result in results:
+        extra = f", строк заполнено: {result.backfilled_rows}" if result.backfilled_rows else ""
+        print(f"  {result.version:3d} {result.description}: {result.seconds:.3f} с{extra}")
+    if not results:
+        print("  схема актуальна")
+    elif args.dry_run:
+        print("Пробный прогон: исходная база не изменена")
+
+
+if __name__ == "__main__":
+    main()
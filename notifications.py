@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import date, datetime, timedelta
 from typing import Iterable
 
-from db import get_daily_measures, get_measures_between
+from repository import Repository
 
 
 def average_glucose(rows) -> float | None:
@@ -19,16 +19,16 @@ def daily_nadir(rows_by_date: dict[str, list]) -> dict[str, float]:
     return result
 
 
-def average_nadir_last_days(chat_id: int, name: str, days: int) -> float | None:
-    rows_by_date = get_daily_measures(chat_id, name, days)
+def average_nadir_last_days(repo: Repository, chat_id: int, name: str, days: int) -> float | None:
+    rows_by_date = repo.get_daily_measures(chat_id, name, days)
     nadirs = daily_nadir(rows_by_date)
     if not nadirs:
         return None
     return sum(nadirs.values()) / len(nadirs)
 
 
-def consecutive_nadir(chat_id: int, name: str, days: int, compare) -> bool:
-    rows_by_date = get_daily_measures(chat_id, name, days)
+def consecutive_nadir(repo: Repository, chat_id: int, name: str, days: int, compare) -> bool:
+    rows_by_date = repo.get_daily_measures(chat_id, name, days)
     if len(rows_by_date) < days:
         return False
     ordered_days = sorted(rows_by_date.keys(), reverse=True)[:days]
@@ -43,8 +43,8 @@ def consecutive_nadir(chat_id: int, name: str, days: int, compare) -> bool:
     return True
 
 
-def amps_peak_difference_low(chat_id: int, name: str, days: int, threshold: float = 2) -> bool:
-    rows_by_date = get_daily_measures(chat_id, name, days)
+def amps_peak_difference_low(repo: Repository, chat_id: int, name: str, days: int, threshold: float = 2) -> bool:
+    rows_by_date = repo.get_daily_measures(chat_id, name, days)
     if len(rows_by_date) < days:
         return False
     ordered_days = sorted(rows_by_date.keys(), reverse=True)[:days]
@@ -70,8 +70,8 @@ def amps_peak_difference_low(chat_id: int, name: str, days: int, threshold: floa
     return True
 
 
-def average_glucose_last_days(chat_id: int, name: str, days: int) -> float | None:
-    rows = get_measures_between(
+def average_glucose_last_days(repo: Repository, chat_id: int, name: str, days: int) -> float | None:
+    rows = repo.get_measures_between(
         chat_id,
         name,
         date.today() - timedelta(days=days - 1),
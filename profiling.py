@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, TelegramObject
+
+import config
+import measure_flow
+import metrics
+from utils import rotate_files
+
+logger = logging.getLogger(__name__)
+
+admin_router = Router()
+
+# Доля апдейтов по умолчанию для «/profile on» без числа
+DEFAULT_SAMPLE_RATE = 0.1
+MEMORY_TOP = 10
+
+_last_snapshot: tracemalloc.Snapshot | None = None
+
+
+def _file_stem() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 1_000_000_000:09d}"
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    # Часть апдейтов выполняется под cProfile, профиль пишется по имени обработчика.
+    # cProfile видит весь поток: пока обработчик ждёт await, в профиль попадают и
+    # другие корутины, поэтому одновременно профилируется только один апдейт.
+    def __init__(self, directory: str, keep: int, sample_rate: float, rng: Callable[[], float] = random.random):
+        self.directory = directory
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self._rng = rng
+        self._active = False
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if self._active or not self.sample_rate or self._rng() >= self.sample_rate:
+            return await handler(event, data)
+
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        profile = cProfile.Profile()
+        self._active = True
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return await handler(event, data)
+        finally:
+            profile.disable()
+            self._active = False
+            elapsed = time.perf_counter() - started
+            try:
+                await asyncio.to_thread(self._dump, profile, name, elapsed)
+            except OSError:
+                logger.warning("Failed to write profile for %s", name, exc_info=True)
+
+    def _dump(self, profile: cProfile.Profile, name: str, elapsed: float) -> None:
+        # Открывать: python -m pstats profiles/<файл>.prof или snakeviz
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{_file_stem()}-{name}-{elapsed * 1000:.0f}ms.prof")
+        profile.dump_stats(path)
+        rotate_files(self.directory, ".prof", self.keep)
+        metrics.inc("profiles_written_total", handler=name)
+
+    def profile_count(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(name.endswith(".prof") for name in os.listdir(self.directory))
+
+
+def build_middleware() -> ProfilingMiddleware:
+    return ProfilingMiddleware(config.PROFILE_DIR, config.PROFILE_KEEP, config.PROFILE_SAMPLE_RATE)
+
+
+def start_tracemalloc(frames: int) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info("tracemalloc started with %d frames", frames)
+
+
+def memory_report(directory: str, keep: int, fsm_records: int) -> str:
+    # Снимок памяти: пишется в каталог профилей и сравнивается с предыдущим
+    global _last_snapshot
+    lines = [
+        f"Ожидающих замеров (_PENDING_MEASURES): {measure_flow.pending_count()}",
+        f"Записей в хранилище FSM: {fsm_records}",
+    ]
+    if not tracemalloc.is_tracing():
+        start_tracemalloc(max(config.TRACEMALLOC_FRAMES, 1))
+        lines.append("tracemalloc запущен, повторите команду позже, чтобы увидеть рост памяти.")
+        return "\n".join(lines)
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+    )
+    os.makedirs(directory, exist_ok=True)
+    snapshot.dump(os.path.join(directory, f"{_file_stem()}.snapshot"))
+    rotate_files(directory, ".snapshot", keep)
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"Память под tracemalloc: {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ")
+    if _last_snapshot is None:
+        lines.append("Крупнейшие места выделения:")
+        stats = snapshot.statistics("lineno")
+    else:
+        lines.append("Рост с прошлого снимка:")
+        stats = snapshot.compare_to(_last_snapshot, "lineno")
+    lines.extend(str(stat) for stat in stats[:MEMORY_TOP])
+    _last_snapshot = snapshot
+    return "\n".join(lines)
+
+
+def _parse_rate(text: str) -> float | None:
+    try:
+        rate = float(text.replace(",", "."))
+    except ValueError:
+        return None
+    return rate if 0 < rate <= 1 else None
+
+
+def _fsm_records(state: FSMContext) -> int:
+    # MemoryStorage держит всё в словаре; у внешних хранилищ размер неизвестен
+    return len(getattr(state.storage, "storage", ()))
+
+
+@admin_router.message(Command("profile"), F.from_user.id.in_(config.ADMIN_IDS))
+async def profile_command(message: Message, command: CommandObject, state: FSMContext, profiler: ProfilingMiddleware):
+    # /profile [on [доля] | off | mem]
+    args = (command.args or "").split()
+    action = args[0] if args else "status"
+    rate = _parse_rate(args[1]) if len(args) > 1 else DEFAULT_SAMPLE_RATE
+    if action == "on" and rate is not None:
+        profiler.sample_rate = rate
+        logger.info("Profiling enabled for %.0f%% of updates", profiler.sample_rate * 100)
+    elif action == "off":
+        profiler.sample_rate = 0
+        logger.info("Profiling disabled")
+    elif action == "mem":
+        report = await asyncio.to_thread(
+            memory_report, profiler.directory, profiler.keep, _fsm_records(state)
+        )
+        await message.answer(report)
+        return
+    elif action != "status":
+        await message.answer("Использование: /profile [on [доля от 0 до 1] | off | mem]")
+        return
+
+    await message.answer(
+        f"Профилирование: {profiler.sample_rate:.0%} апдейтов\n"
+        f"Каталог: {profiler.directory}, файлов: {profiler.profile_count()} (храним {profiler.keep})\n"
+        f"tracemalloc: {'включён' if tracemalloc.is_tracing() else 'выключен'}"
+    )
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import config
+import metrics
+
+# Функции из charts, которые можно вызывать через пул
+RENDERERS = frozenset(
+    {
+        "daily_curve",
+        "nadir_chart",
+        "amps_pmps_chart",
+        "range_percent_chart",
+        "stats_table",
+        "stats_table_pdf",
+        "stats_report",
+        "daily_trend_chart",
+        "nadir_trend_chart",
+        "amps_pmps_trend_chart",
+        "range_trend_chart",
+        "dashboard_chart",
+    }
+)
+
+_ROW_FIELDS = ("date", "time", "amount", "tag")
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: ProcessPoolExecutor | None = None
+_in_flight = 0
+_first_render_done = False
+
+
+def plain_rows(rows) -> list[dict]:
+    # sqlite3.Row не сериализуется, в процесс передаём обычные словари
+    return [{field: row[field] for field in _ROW_FIELDS} for row in rows]
+
+
+def plain_dicts(rows) -> list[dict]:
+    return [dict(row) for row in rows]
+
+
+def _init_worker() -> None:
+    # matplotlib импортируется только здесь, в процессах отрисовки,
+    # и сразу рисует пустую фигуру, чтобы прогреть шрифты
+    import charts
+
+    charts.warmup()
+
+
+def _to_bytes(result):
+    if isinstance(result, BytesIO):
+        return result.getvalue()
+    if isinstance(result, (list, tuple)):
+        return type(result)(_to_bytes(item) for item in result)
+    return result
+
+
+def _run(kind: str, args: tuple, kwargs: dict):
+    import charts
+
+    started = time.perf_counter()
+    result = getattr(charts, kind)(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    # Вместе с картинкой возвращаем метрики, которые накопил процесс
+    return _to_bytes(result), elapsed, metrics.collect()
+
+
+def _noop() -> None:
+    return None
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ProcessPoolExecutor(
+            max_workers=config.RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _EXECUTOR
+
+
+def _drop_executor(broken: ProcessPoolExecutor) -> None:
+    # Процесс отрисовки умер (OOM, падение Agg): пул больше не принимает задачи.
+    # Сбрасываем его один раз, даже если сломались сразу несколько отрисовок.
+    global _EXECUTOR
+    if _EXECUTOR is not broken:
+        return
+    _EXECUTOR = None
+    broken.shutdown(wait=False, cancel_futures=True)
+    metrics.inc("render_pool_restarts_total")
+    logger.warning("Render pool is broken, starting a new one")
+
+
+def queue_depth() -> int:
+    return _in_flight
+
+
+async def warmup() -> None:
+    # Запускаем все процессы заранее, чтобы первый график не ждал импорта и шрифтов
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    executor = _executor()
+    # Каждая задача запускает новый процесс, в нём отработает _init_worker
+    await asyncio.gather(
+        *(loop.run_in_executor(executor, _noop) for _ in range(config.RENDER_WORKERS))
+    )
+    elapsed = time.perf_counter() - started
+    metrics.set_gauge("render_warmup_seconds", elapsed)
+    logger.info("Render pool warmed up in %.2f s", elapsed)
+
+
+async def render(kind: str, *args, **kwargs):
+    # Рисуем график в отдельном процессе, PNG/PDF возвращаются как bytes
+    global _in_flight, _first_render_done
+    if kind not in RENDERERS:
+        raise ValueError(f"Unknown chart: {kind}")
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    _in_flight += 1
+    metrics.set_gauge("render_queue_depth", _in_flight)
+    try:
+        executor = _executor()
+        try:
+            result, render_seconds, worker_metrics = await loop.run_in_executor(
+                executor, _run, kind, args, kwargs
+            )
+        except BrokenProcessPool:
+            # Одна повторная попытка в новом пуле; если сломается и он — ошибка наверх
+            _drop_executor(executor)
+            result, render_seconds, worker_metrics = await loop.run_in_executor(
+                _executor(), _run, kind, args, kwargs
+            )
+    finally:
+        _in_flight -= 1
+        metrics.set_gauge("render_queue_depth", _in_flight)
+
+    latency = time.perf_counter() - started
+    metrics.merge(worker_metrics)
+    metrics.observe("render_seconds", render_seconds, chart=kind)
+    metrics.observe("render_latency_seconds", latency, chart=kind)
+    if not _first_render_done:
+        _first_render_done = True
+        metrics.set_gauge("render_first_latency_seconds", latency)
+        logger.info("First render (%s) took %.2f s", kind, latency)
+    return result
+
+
+def shutdown() -> None:
+    global _EXECUTOR
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=True, cancel_futures=True)
+        _EXECUTOR = None
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Any, Iterator, Mapping, Optional, Protocol
+
+# Строка результата: доступ к полям по имени столбца.
+# У SqliteRepository это sqlite3.Row, у MemoryRepository — dict.
+Row = Mapping[str, Any]
+
+
+def date_from(days: Optional[int]) -> str:
+    # Начало периода «последние days дней»; None — вся история:
+    # любая дата ISO больше пустой строки
+    if days is None:
+        return ""
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+class Repository(Protocol):
+    # Всё, что бот читает и пишет: коты, замеры, агрегаты по дням и ночные сводки.
+    # Обработчики получают реализацию из dispatcher["repo"], планировщик — аргументом.
+
+    # --- Коты ---
+    def get_cat_by_chat(self, chat_id: int) -> Optional[Row]: ...
+
+    def get_cat_by_chat_and_name(self, chat_id: int, name: str) -> Optional[Row]: ...
+
+    def create_cat(self, chat_id: int, user_id: int, name: str, am_time: str, peak: int, pm_time: str) -> None: ...
+
+    def update_cat_field(self, chat_id: int, name: str, field: str, value) -> None: ...
+
+    def rename_cat(self, chat_id: int, old_name: str, new_name: str) -> None: ...
+
+    def list_chats(self) -> list[Row]: ...
+
+    # --- Замеры ---
+    def add_measure(
+        self,
+        chat_id: int,
+        user_id: int,
+        name: str,
+        amount: float,
+        tag: str,
+        when: Optional[datetime] = None,
+    ) -> None: ...
+
+    def get_measures(self, chat_id: int, name: str, days: Optional[int]) -> list[Row]: ...
+
+    def get_measures_between(self, chat_id: int, name: str, start_date: date, end_date: date) -> list[Row]: ...
+
+    def get_daily_measures(self, chat_id: int, name: str, days: int) -> dict[str, list[Row]]: ...
+
+    def get_history_start(self, chat_id: int, name: str) -> Optional[str]: ...
+
+    def get_last_measures(self, chat_id: int, name: str, count: int = 1) -> list[Row]: ...
+
+    def get_last_days(self, chat_id: int, name: str, days: int) -> list[Row]: ...
+
+    def iter_measures(self, chat_id: int, name: str, chunk_size: int = 1000) -> Iterator[tuple]: ...
+
+    def archive_measures_batch(self, before: str, batch_size: int) -> int: ...
+
+    # --- Агрегаты по дням ---
+    def get_daily_buckets(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[Row]: ...
+
+    def get_weekly_buckets(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[Row]: ...
+
+    def get_daily_nadirs(self, chat_id: int, name: str, days: Optional[int]) -> list[Row]: ...
+
+    def get_daily_amps_pmps(self, chat_id: int, name: str, days: Optional[int]) -> list[Row]: ...
+
+    def get_daily_range_counts(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[Row]: ...
+
+    # --- Ночная сводка статистики ---
+    def save_stats_digest(self, chat_id: int, name: str, summary: dict, pages: list[bytes], pdf: bytes) -> None: ...
+
+    def get_stats_digest(self, chat_id: int, name: str) -> Optional[tuple[Row, list[bytes]]]: ...
+
+    def get_stats_digest_date(self, chat_id: int, name: str) -> Optional[str]: ...
+
+
+def _measure_key(row: dict) -> tuple:
+    # Порядок ORDER BY date, time; при равном времени — порядок записи
+    return row["date"], row["time"], row["id"]
+
+
+class MemoryRepository:
+    # Repository в словарях процесса: для бенчмарков и прогонов без файла базы.
+    # Строки — dict с теми же полями, что в таблицах SQLite; наружу отдаются копии.
+    # Архива нет, все замеры «горячие».
+    def __init__(self):
+        # Коты в порядке добавления, как строки таблицы cats
+        self._cats: list[dict] = []
+        self._measures: dict[tuple[int, str], list[dict]] = {}
+        self._digests: dict[tuple[int, str], tuple[dict, list[bytes]]] = {}
+        self._next_id = 1
+
+    # --- Коты ---
+
+    def _find_cat(self, chat_id: int, name: str) -> Optional[dict]:
+        for cat in self._cats:
+            if cat["chat_id"] == chat_id and cat["name"] == name:
+                return cat
+        return None
+
+    def get_cat_by_chat(self, chat_id: int) -> Optional[dict]:
+        # SQLite идёт по первичному ключу (chat_id, name): первый кот по имени
+        cats = [cat for cat in self._cats if cat["chat_id"] == chat_id]
+        return dict(min(cats, key=lambda cat: cat["name"])) if cats else None
+
+    def get_cat_by_chat_and_name(self, chat_id: int, name: str) -> Optional[dict]:
+        cat = self._find_cat(chat_id, name)
+        return dict(cat) if cat else None
+
+    def create_cat(self, chat_id: int, user_id: int, name: str, am_time: str, peak: int, pm_time: str) -> None:
+        if self._find_cat(chat_id, name):
+            raise ValueError(f"Cat {name!r} already exists in chat {chat_id}")
+        self._cats.append(
+            {
+                "chat_id": chat_id,
+                "user_id": user_id,
+                "name": name,
+                "is_active": 1,
+                "am_time": am_time,
+                "peak": peak,
+                "pm_time": pm_time,
+            }
+        )
+
+    def update_cat_field(self, chat_id: int, name: str, field: str, value) -> None:
+        cat = self._find_cat(chat_id, name)
+        if cat is None:
+            return
+        if field not in cat:
+            raise ValueError(f"Unknown cat field: {field}")
+        cat[field] = value
+        self._digests.pop((chat_id, name), None)
+
+    def rename_cat(self, chat_id: int, old_name: str, new_name: str) -> None:
+        cat = self._find_cat(chat_id, old_name)
+        if cat is None:
+            return
+        # Как первичный ключ (chat_id, name): второго кота с этим именем в чате быть не может
+        if new_name != old_name and self._find_cat(chat_id, new_name):
+            raise ValueError(f"Cat {new_name!r} already exists in chat {chat_id}")
+        cat["name"] = new_name
+        measures = self._measures.pop((chat_id, old_name), [])
+        for row in measures:
+            row["name"] = new_name
+        if measures:
+            self._measures[(chat_id, new_name)] = measures
+        self._digests.pop((chat_id, old_name), None)
+
+    def list_chats(self) -> list[dict]:
+        chats = []
+        for cat in self._cats:
+            pair = {"chat_id": cat["chat_id"], "name": cat["name"]}
+            if cat["is_active"] and pair not in chats:
+                chats.append(pair)
+        return chats
+
+    # --- Замеры ---
+
+    def add_measure(
+        self,
+        chat_id: int,
+        user_id: int,
+        name: str,
+        amount: float,
+        tag: str,
+        when: Optional[datetime] = None,
+    ) -> None:
+        # Те же проверки, что у внешнего ключа и CHECK в таблице measure
+        if self._find_cat(chat_id, name) is None:
+            raise ValueError(f"Unknown cat {name!r} in chat {chat_id}")
+        if amount < 0:
+            raise ValueError("Measure amount must be non-negative")
+        when = when or datetime.now()
+        row = {
+            "id": self._next_id,
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "name": name,
+            "date": when.date().isoformat(),
+            "time": when.time().strftime("%H:%M"),
+            "amount": amount,
+            "tag": tag,
+        }
+        self._next_id += 1
+        rows = self._measures.setdefault((chat_id, name), [])
+        rows.append(row)
+        if len(rows) > 1 and _measure_key(rows[-2]) > _measure_key(row):
+            rows.sort(key=_measure_key)
+
+    def _select(self, chat_id: int, name: str, start: str = "", end: Optional[str] = None) -> list[dict]:
+        return [
+            dict(row)
+            for row in self._measures.get((chat_id, name), ())
+            if row["date"] >= start and (end is None or row["date"] <= end)
+        ]
+
+    def get_measures(self, chat_id: int, name: str, days: Optional[int]) -> list[dict]:
+        return self._select(chat_id, name, date_from(days))
+
+    def get_measures_between(self, chat_id: int, name: str, start_date: date, end_date: date) -> list[dict]:
+        return self._select(chat_id, name, start_date.isoformat(), end_date.isoformat())
+
+    def get_daily_measures(self, chat_id: int, name: str, days: int) -> dict[str, list[dict]]:
+        by_date: dict[str, list[dict]] = {}
+        for row in self.get_measures(chat_id, name, days):
+            by_date.setdefault(row["date"], []).append(row)
+        return by_date
+
+    def get_history_start(self, chat_id: int, name: str) -> Optional[str]:
+        rows = self._measures.get((chat_id, name))
+        return rows[0]["date"] if rows else None
+
+    def get_last_measures(self, chat_id: int, name: str, count: int = 1) -> list[dict]:
+        return self._select(chat_id, name)[::-1][:count]
+
+    def get_last_days(self, chat_id: int, name: str, days: int) -> list[dict]:
+        return self._select(chat_id, name, (date.today() - timedelta(days=days - 1)).isoformat())
+
+    def iter_measures(self, chat_id: int, name: str, chunk_size: int = 1000) -> Iterator[tuple]:
+        # Снимок списка: генератор могут дочитывать в другом потоке
+        for row in list(self._measures.get((chat_id, name), ())):
+            yield row["date"], row["time"], row["amount"], row["tag"]
+
+    def archive_measures_batch(self, before: str, batch_size: int) -> int:
+        return 0
+
+    # --- Агрегаты по дням ---
+
+    def _days(self, chat_id: int, name: str, days: Optional[int]) -> dict[str, list[dict]]:
+        start = date_from(days)
+        by_date: dict[str, list[dict]] = {}
+        for row in self._measures.get((chat_id, name), ()):
+            if row["date"] >= start:
+                by_date.setdefault(row["date"], []).append(row)
+        return by_date
+
+    def get_daily_buckets(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[dict]:
+        buckets = []
+        for day, rows in self._days(chat_id, name, days).items():
+            amounts = [row["amount"] for row in rows]
+            buckets.append(
+                {
+                    "date": day,
+                    "count": len(amounts),
+                    "min": min(amounts),
+                    "avg": sum(amounts) / len(amounts),
+                    "max": max(amounts),
+                    "in_range": sum(low < amount < high for amount in amounts),
+                    "nadir": min(amounts),
+                }
+            )
+        return buckets
+
+    def get_weekly_buckets(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[dict]:
+        # Недели начинаются с понедельника; nadir — средний минимум дней недели
+        weeks: dict[str, list[list[dict]]] = {}
+        for day, rows in self._days(chat_id, name, days).items():
+            start = date.fromisoformat(day)
+            weeks.setdefault((start - timedelta(days=start.weekday())).isoformat(), []).append(rows)
+        result = []
+        for week, week_days in weeks.items():
+            amounts = [row["amount"] for rows in week_days for row in rows]
+            result.append(
+                {
+                    "date": week,
+                    "count": len(amounts),
+                    "min": min(amounts),
+                    "avg": sum(amounts) / len(amounts),
+                    "max": max(amounts),
+                    "in_range": sum(low < amount < high for amount in amounts),
+                    "nadir": sum(min(row["amount"] for row in rows) for rows in week_days) / len(week_days),
+                }
+            )
+        return result
+
+    def get_daily_nadirs(self, chat_id: int, name: str, days: Optional[int]) -> list[dict]:
+        return [
+            {"date": day, "nadir": min(row["amount"] for row in rows)}
+            for day, rows in self._days(chat_id, name, days).items()
+        ]
+
+    def get_daily_amps_pmps(self, chat_id: int, name: str, days: Optional[int]) -> list[dict]:
+        # AMPS — первый замер с тегом AMPS, иначе первый за день;
+        # PMPS — первый с тегом PMPS, иначе последний за день
+        result = []
+        for day, rows in self._days(chat_id, name, days).items():
+            amps = next((row for row in rows if row["tag"] == "AMPS"), rows[0])
+            pmps = next((row for row in rows if row["tag"] == "PMPS"), rows[-1])
+            result.append({"date": day, "amps": amps["amount"], "pmps": pmps["amount"]})
+        return result
+
+    def get_daily_range_counts(
+        self, chat_id: int, name: str, days: Optional[int], low: float = 4, high: float = 10
+    ) -> list[dict]:
+        return [
+            {
+                "date": day,
+                "count": len(rows),
+                "in_range": sum(low < row["amount"] < high for row in rows),
+            }
+            for day, rows in self._days(chat_id, name, days).items()
+        ]
+
+    # --- Ночная сводка статистики ---
+
+    def save_stats_digest(self, chat_id: int, name: str, summary: dict, pages: list[bytes], pdf: bytes) -> None:
+        row = {"chat_id": chat_id, "name": name, **summary, "pdf": pdf}
+        self._digests[(chat_id, name)] = (row, list(pages))
+
+    def get_stats_digest(self, chat_id: int, name: str) -> Optional[tuple[dict, list[bytes]]]:
+        found = self._digests.get((chat_id, name))
+        if found is None:
+            return None
+        row, pages = found
+        return dict(row), list(pages)
+
+    def get_stats_digest_date(self, chat_id: int, name: str) -> Optional[str]:
+        found = self._digests.get((chat_id, name))
+        return found[0]["digest_date"] if found else None
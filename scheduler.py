@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timedelta
+import logging
+from datetime import date, datetime, timedelta
 
 from aiogram import Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import StorageKey
 
-from db import get_cat_by_chat_and_name, list_chats
+import config
+import metrics
+from backup import run_backup
+from digest import build_digest, digest_is_fresh
 from keyboards import inline_cancel_keyboard
 from measure_flow import set_pending_measure
 from notifications import (
@@ -16,9 +20,12 @@ from notifications import (
     average_nadir_last_days,
     consecutive_nadir,
 )
+from repository import Repository
 
+logger = logging.getLogger(__name__)
 
-async def schedule_daily_checks(bot: Bot):
+
+async def schedule_daily_checks(bot: Bot, repo: Repository):
     # Ежедневные проверки в 23:59
     while True:
         now = datetime.now()
@@ -26,55 +33,93 @@ async def schedule_daily_checks(bot: Bot):
         if next_run <= now:
             next_run += timedelta(days=1)
         await asyncio.sleep((next_run - now).total_seconds())
-        await run_daily_checks(bot)
+        await run_daily_checks(bot, repo)
 
 
-async def run_daily_checks(bot: Bot):
-    chats = list_chats()
+@metrics.timed("scheduler_iteration_seconds")
+async def run_daily_checks(bot: Bot, repo: Repository):
+    chats = repo.list_chats()
     for row in chats:
         chat_id = row["chat_id"]
         name = row["name"]
 
-        avg_nadir = average_nadir_last_days(chat_id, name, 7)
+        avg_nadir = average_nadir_last_days(repo, chat_id, name, 7)
         if avg_nadir is not None and 5 < avg_nadir < 7:
             await bot.send_message(
                 chat_id,
                 "✅ Средний nadir за 7 дней в хорошем диапазоне — отличный прогресс к ремиссии!",
             )
 
-        if consecutive_nadir(chat_id, name, 3, lambda v: v > 9):
+        if consecutive_nadir(repo, chat_id, name, 3, lambda v: v > 9):
             await bot.send_message(
                 chat_id,
                 "⚠️ Уже 3 дня подряд nadir выше 9. Возможно, текущая доза мала.",
             )
 
-        if consecutive_nadir(chat_id, name, 5, lambda v: v < 5):
+        if consecutive_nadir(repo, chat_id, name, 5, lambda v: v < 5):
             await bot.send_message(
                 chat_id,
                 "⚠️ 5 дней подряд nadir ниже 5. Доза может быть слишком высокой — риск гипо.",
             )
 
-        if amps_peak_difference_low(chat_id, name, 3):
+        if amps_peak_difference_low(repo, chat_id, name, 3):
             await bot.send_message(
                 chat_id,
                 "⚠️ Три дня подряд разница AMPS и PEAK меньше 2. Инсулин работает слабо.",
             )
 
 
-async def schedule_procedure_reminders(bot: Bot, storage):
+async def schedule_stats_digests(repo: Repository):
+    # Сводки статистики строятся после полуночи, до утренних замеров.
+    # При запуске бота досчитываются сводки, которых на сегодня ещё нет.
+    while True:
+        await build_stats_digests(repo)
+        now = datetime.now()
+        next_run = now.replace(hour=0, minute=5, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+
+
+@metrics.timed("scheduler_iteration_seconds")
+async def build_stats_digests(repo: Repository) -> int:
+    built = 0
+    for row in repo.list_chats():
+        chat_id = row["chat_id"]
+        name = row["name"]
+        if digest_is_fresh(repo, chat_id, name):
+            continue
+        cat = repo.get_cat_by_chat_and_name(chat_id, name)
+        if not cat:
+            continue
+        # Ошибка одной сводки не должна оставить без сводок остальных
+        try:
+            if await build_digest(repo, cat):
+                built += 1
+        except Exception:
+            logger.exception("Failed to build stats digest for chat %s", chat_id)
+            metrics.inc("stats_digest_failures_total")
+    metrics.inc("stats_digests_built_total", built)
+    if built:
+        logger.info("Built %d stats digests", built)
+    return built
+
+
+async def schedule_procedure_reminders(bot: Bot, repo: Repository, storage):
     # Напоминания каждые 60 секунд
     while True:
         now = datetime.now()
-        await send_procedure_reminders(bot, storage, now)
+        await send_procedure_reminders(bot, repo, storage, now)
         await asyncio.sleep(60)
 
 
-async def send_procedure_reminders(bot: Bot, storage, now: datetime):
-    chats = list_chats()
+@metrics.timed("scheduler_iteration_seconds")
+async def send_procedure_reminders(bot: Bot, repo: Repository, storage, now: datetime):
+    chats = repo.list_chats()
     for row in chats:
         chat_id = row["chat_id"]
         name = row["name"]
-        cat = get_cat_by_chat_and_name(chat_id, name)
+        cat = repo.get_cat_by_chat_and_name(chat_id, name)
         if not cat:
             continue
 
@@ -136,3 +181,42 @@ async def send_procedure_reminders(bot: Bot, storage, now: datetime):
                 "Введите значение сахара (например 5.6):",
                 reply_markup=inline_cancel_keyboard(),
             )
+
+
+async def schedule_archival(repo: Repository):
+    # Перенос старых замеров в архив каждую ночь в 03:30
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=3, minute=30, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        await archive_old_measures(repo)
+
+
+@metrics.timed("scheduler_iteration_seconds")
+async def archive_old_measures(repo: Repository) -> int:
+    # Пачками в отдельном потоке: цикл событий не ждёт SQLite
+    before = (date.today() - timedelta(days=config.ARCHIVE_AFTER_DAYS)).isoformat()
+    total = 0
+    while True:
+        moved = await asyncio.to_thread(repo.archive_measures_batch, before, config.ARCHIVE_BATCH_ROWS)
+        total += moved
+        metrics.inc("archived_measures_total", moved)
+        if moved < config.ARCHIVE_BATCH_ROWS:
+            break
+        await asyncio.sleep(config.ARCHIVE_BATCH_PAUSE)
+    if total:
+        logger.info("Archived %d measures older than %s", total, before)
+    return total
+
+
+async def schedule_backups(db_path: str):
+    # Резервная копия каждую ночь в 04:00, после переноса в архив
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=4, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        await run_backup(db_path)
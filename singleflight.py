@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+import metrics
+
+
+class SingleFlight:
+    # Одновременные одинаковые вызовы ждут один и тот же результат,
+    # а не запускают работу повторно
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]], action: str = "") -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            metrics.inc("singleflight_coalesced_total", flight=self.name, action=action)
+            # shield: отмена ожидающего не должна отменять общую работу
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        metrics.inc("singleflight_leaders_total", flight=self.name, action=action)
+        try:
+            result = await func()
+        except BaseException as error:
+            future.set_exception(error)
+            # Исключение получат ожидающие, у ведущего оно поднимется ниже
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor:
+    # Держит ссылки на фоновые задачи и перезапускает упавшие с растущей паузой.
+    # Состояние видно в метриках: background_task_up и background_task_restarts_total.
+    def __init__(self, backoff_initial: float, backoff_max: float, stable_after: float = 60):
+        self._backoff_initial = backoff_initial
+        self._backoff_max = backoff_max
+        # Если задача проработала дольше, счётчик неудач сбрасывается
+        self._stable_after = stable_after
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, name: str, factory: Callable[[], Awaitable[None]], restart: bool = True) -> None:
+        # factory создаёт новую корутину на каждый запуск
+        if name in self._tasks and not self._tasks[name].done():
+            raise RuntimeError(f"Task {name} is already running")
+        self._tasks[name] = asyncio.create_task(self._supervise(name, factory, restart), name=name)
+
+    async def _supervise(self, name: str, factory: Callable[[], Awaitable[None]], restart: bool) -> None:
+        failures = 0
+        while True:
+            started = time.monotonic()
+            metrics.set_gauge("background_task_up", 1, task=name)
+            try:
+                await factory()
+            except asyncio.CancelledError:
+                metrics.set_gauge("background_task_up", 0, task=name)
+                raise
+            except Exception:
+                logger.exception("Background task %s failed", name)
+                metrics.inc("background_task_failures_total", task=name)
+                metrics.set_gauge("background_task_last_failure_timestamp", time.time(), task=name)
+            else:
+                if restart:
+                    logger.warning("Background task %s exited unexpectedly", name)
+
+            metrics.set_gauge("background_task_up", 0, task=name)
+            if not restart:
+                return
+            if time.monotonic() - started >= self._stable_after:
+                failures = 0
+            delay = min(self._backoff_initial * 2**failures, self._backoff_max)
+            failures += 1
+            logger.info("Restarting %s in %.1f s", name, delay)
+            await asyncio.sleep(delay)
+            metrics.inc("background_task_restarts_total", task=name)
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
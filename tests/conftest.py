@@ -0,0 +1,24 @@
+import pytest
+
+import charts
+import db
+import migrations
+import render
+
+
+@pytest.fixture
+def sqlite_repo(tmp_path):
+    path = str(tmp_path / "data.db")
+    migrations.migrate(path)
+    return db.SqliteRepository(path)
+
+
+@pytest.fixture
+def inline_render(monkeypatch):
+    # Графики рисуются в этом же процессе, без пула
+    async def run(kind, *args, **kwargs):
+        if kind not in render.RENDERERS:
+            raise ValueError(f"Unknown chart: {kind}")
+        return render._to_bytes(getattr(charts, kind)(*args, **kwargs))
+
+    monkeypatch.setattr(render, "render", run)
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+
+import pytest
+
+import backup
+import migrations
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "data.db"
+    migrations.migrate(str(path))
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "INSERT INTO cats (chat_id, user_id, name, am_time, peak, pm_time) VALUES (1, 1, 'Барс', '08:00', 3, '20:00')"
+        )
+    return path
+
+
+def _backup(database, directory, keep=3):
+    return backup.backup_database(str(database), str(directory), pages=16, pause=0, keep=keep)
+
+
+def test_backup_is_a_readable_copy(database, tmp_path):
+    result = _backup(database, tmp_path / "backups")
+    assert os.path.basename(result.path).startswith("data-")
+    assert result.path.endswith(backup.BACKUP_SUFFIX)
+    with sqlite3.connect(result.path) as conn:
+        assert conn.execute("SELECT name FROM cats").fetchall() == [("Барс",)]
+    assert not os.path.exists(result.path + ".partial")
+
+
+def test_backups_in_the_same_second_do_not_collide(database, tmp_path):
+    paths = {_backup(database, tmp_path / "backups", keep=10).path for _ in range(5)}
+    assert len(paths) == 5
+    assert all(os.path.exists(path) for path in paths)
+
+
+def test_rotation_only_touches_own_backups(database, tmp_path):
+    directory = tmp_path / "backups"
+    directory.mkdir()
+    # Чужие файлы в каталоге копий: другая база, копия другой базы, заметки
+    strangers = ["other.db", "other-20260101-000000-000000.bak.db", "data.db", "notes.txt"]
+    for name in strangers:
+        (directory / name).write_bytes(b"keep me")
+
+    kept = [_backup(database, directory, keep=2).path for _ in range(4)][-2:]
+
+    own = sorted(name for name in os.listdir(directory) if name not in strangers)
+    assert own == sorted(os.path.basename(path) for path in kept)
+    for name in strangers:
+        assert (directory / name).read_bytes() == b"keep me"
+    assert database.exists()
+
+
+def test_refuses_database_directory(database):
+    for directory in (database.parent, str(database.parent) + os.sep + "."):
+        with pytest.raises(ValueError):
+            _backup(database, directory)
+    assert sorted(os.listdir(database.parent)) == ["data.db"]
@@ -0,0 +1,76 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from io import BytesIO
+
+import charts
+
+
+def _rows(amounts_by_day: list[list[float]]) -> list[dict]:
+    start = date.today() - timedelta(days=len(amounts_by_day) - 1)
+    rows = []
+    for offset, amounts in enumerate(amounts_by_day):
+        day = (start + timedelta(days=offset)).isoformat()
+        for idx, amount in enumerate(amounts):
+            rows.append({"date": day, "time": f"{8 + idx:02d}:00", "amount": amount, "tag": "OTHER"})
+    return rows
+
+
+def test_daily_aggregates_use_bounds():
+    rows = _rows([[3, 4.5, 11], [6, 12, 13]])
+    default = charts.daily_aggregates(rows)["counts"]
+    wide = charts.daily_aggregates(rows, low=2, high=12.5)["counts"]
+    assert [day["in_range"] for day in default] == [1, 1]
+    assert [day["in_range"] for day in wide] == [3, 2]
+
+
+def test_dashboard_passes_bounds_to_range_panel(monkeypatch):
+    calls = []
+    original = charts._draw_range_bars
+
+    def capture(ax, counts, window_days, low, high):
+        calls.append((counts, window_days, low, high))
+        original(ax, counts, window_days, low, high)
+
+    monkeypatch.setattr(charts, "_draw_range_bars", capture)
+    rows = _rows([[3, 4.5, 11], [6, 12, 13]])
+    charts.dashboard_chart(rows, window_days=3, low=5, high=12)
+
+    counts, window_days, low, high = calls[0]
+    assert (window_days, low, high) == (3, 5, 12)
+    # Подпись и подсчёт в одних границах: 4.5 и 12 вне (5, 12), 11 и 6 внутри
+    assert [day["in_range"] for day in counts] == [1, 1]
+
+
+def test_range_title_shows_bounds():
+    assert "5–12" in charts._range_title(7, 5, 12)
+
+
+def _as_bytes(result) -> tuple[bytes, ...]:
+    if isinstance(result, BytesIO):
+        return (result.getvalue(),)
+    return tuple(item.getvalue() for item in result)
+
+
+def test_threaded_render_matches_serial():
+    # Figure + Agg без pyplot: графики из разных потоков не смешиваются
+    rng = random.Random(5)
+    rows = _rows([[round(rng.uniform(2, 18), 1) for _ in range(4)] for _ in range(30)])
+    for idx, row in enumerate(rows):
+        row["tag"] = ("AMPS", "PEAK", "PMPS", "OTHER")[idx % 4]
+    inputs = {"rows": rows, **charts.daily_aggregates(rows)}
+    builders = {
+        "daily_curve": "rows",
+        "nadir_chart": "nadirs",
+        "amps_pmps_chart": "amps_pmps",
+        "range_percent_chart": "counts",
+    }
+
+    def render(name: str) -> tuple[bytes, ...]:
+        return _as_bytes(getattr(charts, name)(inputs[builders[name]]))
+
+    expected = {name: render(name) for name in builders}
+    names = list(builders) * 3
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(render, names))
+    assert [expected[name] for name in names] == results
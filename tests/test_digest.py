@@ -0,0 +1,135 @@
+import asyncio
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import digest
+import notifications
+import render
+
+CHAT_ID = 1
+NAME = "Барс"
+
+
+@pytest.fixture
+def repo(sqlite_repo, inline_render):
+    sqlite_repo.create_cat(CHAT_ID, 10, NAME, "08:00", 3, "20:00")
+    return sqlite_repo
+
+
+def _fill(repo, days: int, per_day: int = 3, seed: int = 1, today: bool = False) -> None:
+    rng = random.Random(seed)
+    tags = ["AMPS", "PEAK", "PMPS"]
+    for offset in range(days, 0 if today else 1, -1):
+        day = date.today() - timedelta(days=offset - 1)
+        for idx in range(per_day):
+            when = datetime.combine(day, time(8 + idx * 4, rng.randint(0, 59)))
+            repo.add_measure(CHAT_ID, 10, NAME, round(rng.uniform(2, 20), 1), tags[idx % 3], when=when)
+
+
+def _add_today(repo, *tagged: tuple[str, float]) -> None:
+    for idx, (tag, amount) in enumerate(tagged):
+        when = datetime.combine(date.today(), time(9, idx))
+        repo.add_measure(CHAT_ID, 10, NAME, amount, tag, when=when)
+
+
+def _live(repo):
+    rows = repo.get_measures(CHAT_ID, NAME, digest.STATS_DAYS)
+    pages, _ = asyncio.run(
+        render.render(
+            "stats_report",
+            render.plain_rows(rows),
+            max_rows=digest.STATS_PAGE_ROWS,
+            labels=digest.stats_labels(repo.get_cat_by_chat(CHAT_ID)),
+        )
+    )
+    averages = (
+        notifications.average_glucose_last_days(repo, CHAT_ID, NAME, digest.GLUCOSE_DAYS),
+        notifications.average_nadir_last_days(repo, CHAT_ID, NAME, digest.NADIR_DAYS),
+    )
+    return pages, averages
+
+
+def _cached(repo):
+    cached = digest.load_digest(repo, CHAT_ID, NAME)
+    assert cached is not None
+    today = date.today()
+    today_rows = repo.get_measures_between(CHAT_ID, NAME, today, today)
+    labels = digest.stats_labels(repo.get_cat_by_chat(CHAT_ID))
+    pages, pdf = asyncio.run(digest.top_up_report(repo, cached, CHAT_ID, NAME, today_rows, labels))
+    assert pdf.startswith(b"%PDF")
+    return pages, digest.top_up_averages(cached, today_rows)
+
+
+def _assert_same(live, cached):
+    live_pages, (live_glucose, live_nadir) = live
+    cached_pages, (cached_glucose, cached_nadir) = cached
+    assert cached_pages == live_pages
+    assert cached_glucose == pytest.approx(live_glucose)
+    assert cached_nadir == pytest.approx(live_nadir)
+
+
+def test_no_digest_without_past_measures(repo):
+    _add_today(repo, ("AMPS", 7.0))
+    assert not asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    assert digest.load_digest(repo, CHAT_ID, NAME) is None
+
+
+@pytest.mark.parametrize(
+    "days, today_rows",
+    [
+        (10, []),
+        (10, [("AMPS", 6.5), ("PEAK", 3.1)]),
+        # Больше страницы: перерисовывается только последняя
+        (45, [("PMPS", 12.0)]),
+        # Сегодня столбцов OTHER больше, чем в сводке: меняется шапка всех страниц
+        (45, [("OTHER", 5.0), ("OTHER", 6.0), ("AMPS", 9.0)]),
+    ],
+)
+def test_top_up_matches_live_report(repo, days, today_rows):
+    _fill(repo, days)
+    assert asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    assert digest.digest_is_fresh(repo, CHAT_ID, NAME)
+    _add_today(repo, *today_rows)
+    _assert_same(_live(repo), _cached(repo))
+
+
+def test_top_up_reuses_full_pages(repo, monkeypatch):
+    _fill(repo, 45)
+    asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    _add_today(repo, ("AMPS", 6.0))
+    calls = []
+    original = render.render
+
+    async def spy(kind, *args, **kwargs):
+        calls.append(kwargs.get("png_from"))
+        return await original(kind, *args, **kwargs)
+
+    monkeypatch.setattr(render, "render", spy)
+    _cached(repo)
+    # 44 прошлых дня: первая страница (28 строк) берётся из сводки
+    assert calls == [1]
+
+
+def test_digest_dropped_on_cat_change(repo):
+    _fill(repo, 5)
+    asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    repo.update_cat_field(CHAT_ID, NAME, "am_time", "07:00")
+    assert digest.load_digest(repo, CHAT_ID, NAME) is None
+
+    asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    repo.rename_cat(CHAT_ID, NAME, "Барсик")
+    assert digest.load_digest(repo, CHAT_ID, "Барсик") is None
+    assert digest.load_digest(repo, CHAT_ID, NAME) is None
+
+
+def test_stale_digest_is_ignored(repo):
+    _fill(repo, 5)
+    asyncio.run(digest.build_digest(repo, repo.get_cat_by_chat(CHAT_ID)))
+    row, pages = repo.get_stats_digest(CHAT_ID, NAME)
+    summary = {key: row[key] for key in ("glucose_sum", "glucose_count", "nadir_sum", "nadir_days", "table_rows", "other_columns")}
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    repo.save_stats_digest(CHAT_ID, NAME, {**summary, "digest_date": yesterday}, pages, row["pdf"])
+    assert not digest.digest_is_fresh(repo, CHAT_ID, NAME)
+    assert digest.load_digest(repo, CHAT_ID, NAME) is None
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, TelegramMethod
+from aiogram.types import Update
+
+import main as bot_main
+from repository import MemoryRepository
+
+
+class Session(BaseSession):
+    # Вызовы API записываются; правка разметки может отвечать ошибкой Telegram
+    def __init__(self, edit_error: str | None = None):
+        super().__init__()
+        self.edit_error = edit_error
+        self.calls: list[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        self.calls.append(method)
+        if isinstance(method, EditMessageReplyMarkup) and self.edit_error:
+            raise TelegramBadRequest(method=method, message=self.edit_error)
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self) -> None:
+        return None
+
+
+def _callback(data: str) -> Update:
+    user = {"id": 42, "is_bot": False, "first_name": "Test"}
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "callback_query": {
+                "id": "1",
+                "from": user,
+                "chat_instance": "1",
+                "data": data,
+                "message": {"message_id": 7, "date": 0, "chat": {"id": 42, "type": "private"}, "from": user, "text": "menu"},
+            },
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def dispatcher():
+    # Роутеры main подключаются к диспетчеру один раз на процесс
+    return bot_main.build_dispatcher(0.0, MemoryRepository())
+
+
+def _tap(dispatcher, session: Session, data: str) -> None:
+    bot = Bot("123456:main-test", session=session)
+    asyncio.run(dispatcher.feed_update(bot, _callback(data)))
+
+
+def _answered(session: Session) -> bool:
+    return any(isinstance(call, AnswerCallbackQuery) for call in session.calls)
+
+
+def test_period_switch_edits_keyboard(dispatcher):
+    session = Session()
+    _tap(dispatcher, session, "charts:period:90")
+    assert any(isinstance(call, EditMessageReplyMarkup) for call in session.calls)
+    assert _answered(session)
+
+
+def test_same_period_tap_is_answered(dispatcher):
+    session = Session(edit_error="Bad Request: message is not modified")
+    _tap(dispatcher, session, "charts:period:90")
+    assert _answered(session)
+
+
+def test_other_edit_errors_are_raised(dispatcher):
+    session = Session(edit_error="Bad Request: message to edit not found")
+    with pytest.raises(TelegramBadRequest):
+        _tap(dispatcher, session, "charts:period:90")
+    assert _answered(session)
@@ -0,0 +1,143 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import metrics
+from measure_cache import MeasureCache
+
+WINDOW = 10
+
+
+class CountingRepo:
+    # Пропускает вызовы в repo и считает их по имени метода
+    def __init__(self, repo):
+        self.repo = repo
+        self.calls: dict[str, int] = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.repo, name)
+
+        def call(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*args, **kwargs)
+
+        return call
+
+
+@pytest.fixture
+def backend(sqlite_repo):
+    rng = random.Random(7)
+    for chat_id, name in ((1, "Барс"), (2, "Мурка")):
+        sqlite_repo.create_cat(chat_id, 10, name, "08:00", 3, "20:00")
+        for offset in range(WINDOW + 5, -1, -1):
+            day = date.today() - timedelta(days=offset)
+            for _ in range(rng.randint(0, 4)):
+                when = datetime.combine(day, time(rng.randint(0, 23), rng.randint(0, 59)))
+                tag = rng.choice(["AMPS", "PEAK", "PMPS", "OTHER"])
+                sqlite_repo.add_measure(chat_id, 10, name, round(rng.uniform(2, 15), 1), tag, when=when)
+    return CountingRepo(sqlite_repo)
+
+
+def _plain(rows):
+    return [dict(row) for row in rows]
+
+
+def _measures(rows):
+    return [{field: row[field] for field in ("date", "time", "amount", "tag")} for row in rows]
+
+
+@pytest.mark.parametrize("method", ["get_daily_nadirs", "get_daily_amps_pmps", "get_daily_range_counts"])
+def test_aggregates_served_from_series(backend, method):
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    cache.get_measures(1, "Барс", WINDOW)
+    for days in (1, 3, WINDOW):
+        assert _plain(getattr(cache, method)(1, "Барс", days)) == pytest.approx(
+            _plain(getattr(backend.repo, method)(1, "Барс", days))
+        )
+    assert method not in backend.calls
+
+
+def test_range_counts_use_bounds(backend):
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    expected = _plain(backend.repo.get_daily_range_counts(1, "Барс", WINDOW, low=5, high=12))
+    assert _plain(cache.get_daily_range_counts(1, "Барс", WINDOW, low=5, high=12)) == expected
+
+
+def test_longer_periods_go_to_repo(backend):
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    for method in ("get_measures", "get_daily_nadirs", "get_daily_amps_pmps", "get_daily_range_counts"):
+        for days in (WINDOW + 1, None):
+            assert _plain(getattr(cache, method)(1, "Барс", days)) == _plain(
+                getattr(backend.repo, method)(1, "Барс", days)
+            )
+        assert backend.calls[method] == 2
+
+
+def test_disabled_cache_reads_repo(backend):
+    cache = MeasureCache(backend, WINDOW, 0)
+    assert _measures(cache.get_measures(1, "Барс", 3)) == _measures(backend.repo.get_measures(1, "Барс", 3))
+    assert backend.calls["get_measures"] == 1
+    assert cache._series == {}
+
+
+def test_add_measure_writes_through(backend):
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    cache.get_measures(1, "Барс", WINDOW)
+    now = datetime.now().replace(second=0, microsecond=0)
+    cache.add_measure(1, 10, "Барс", 7.5, "PEAK", when=now)
+    # Часы ушли назад: замер встаёт в середину серии
+    cache.add_measure(1, 10, "Барс", 3.2, "AMPS", when=now - timedelta(days=2))
+    assert backend.calls["get_measures"] == 1
+    for days in (1, 3, WINDOW):
+        assert _measures(cache.get_measures(1, "Барс", days)) == _measures(backend.repo.get_measures(1, "Барс", days))
+    assert backend.calls["get_measures"] == 1
+
+
+def test_eviction_keeps_recently_used(backend, monkeypatch):
+    monkeypatch.setattr(metrics, "_COUNTERS", {})
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    cache.get_measures(1, "Барс", WINDOW)
+    one_series = cache._bytes
+    cache.budget_bytes = one_series
+    cache.get_measures(2, "Мурка", WINDOW)
+    # Вытеснена давно не использованная серия
+    assert list(cache._series) == [(2, "Мурка")]
+    assert cache._bytes == cache._series[(2, "Мурка")].nbytes()
+    assert metrics.snapshot()["counters"]["measure_cache_evictions_total"] == {(): 1}
+
+    # Даже если одна серия больше бюджета, последняя использованная остаётся
+    cache.budget_bytes = 1
+    cache.get_measures(1, "Барс", WINDOW)
+    assert list(cache._series) == [(1, "Барс")]
+    assert backend.calls["get_measures"] == 3
+
+
+def test_day_rollover_trims_window(backend):
+    today = [date.today()]
+    cache = MeasureCache(backend, WINDOW, 1 << 20, today=lambda: today[0])
+    before = _measures(cache.get_measures(1, "Барс", WINDOW))
+
+    today[0] += timedelta(days=1)
+    after = _measures(cache.get_measures(1, "Барс", WINDOW))
+    first_kept = (today[0] - timedelta(days=WINDOW)).isoformat()
+    assert after == [row for row in before if row["date"] >= first_kept]
+    assert cache._series[(1, "Барс")].first_day == today[0].toordinal() - WINDOW
+    assert cache._bytes == cache._series[(1, "Барс")].nbytes()
+    # Серия не перечитывалась из базы
+    assert backend.calls["get_measures"] == 1
+
+    # Новые замеры нового дня дописываются в ту же серию
+    when = datetime.combine(today[0], time(9, 0))
+    cache.add_measure(1, 10, "Барс", 6.0, "AMPS", when=when)
+    assert cache.get_measures(1, "Барс", 0) == [{"date": today[0].isoformat(), "time": "09:00", "amount": 6.0, "tag": "AMPS"}]
+
+
+def test_rename_forgets_both_names(backend):
+    cache = MeasureCache(backend, WINDOW, 1 << 20)
+    cache.get_measures(1, "Барс", WINDOW)
+    cache.rename_cat(1, "Барс", "Барсик")
+    assert cache._series == {}
+    assert cache._bytes == 0
+    assert _measures(cache.get_measures(1, "Барсик", WINDOW)) == _measures(backend.repo.get_measures(1, "Барсик", WINDOW))
+    assert cache.get_measures(1, "Барс", WINDOW) == []
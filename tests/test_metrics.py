@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # Каждый тест со своим пустым реестром
+    monkeypatch.setattr(metrics, "_COUNTERS", {})
+    monkeypatch.setattr(metrics, "_GAUGES", {})
+    monkeypatch.setattr(metrics, "_HISTOGRAMS", {})
+
+
+def test_counters_and_gauges_by_labels():
+    metrics.inc("requests_total", handler="a")
+    metrics.inc("requests_total", 2, handler="a")
+    metrics.inc("requests_total", handler="b")
+    metrics.set_gauge("queue", 5)
+    metrics.add_gauge("queue", -2)
+
+    data = metrics.snapshot()
+    assert data["counters"]["requests_total"] == {(("handler", "a"),): 3, (("handler", "b"),): 1}
+    assert data["gauges"]["queue"] == {(): 3}
+
+
+def test_histogram_buckets():
+    for value in (0.001, 0.02, 0.02, 100):
+        metrics.observe("latency", value)
+    histogram = metrics.snapshot()["histograms"]["latency"][()]
+    assert histogram.count == 4
+    assert histogram.total == pytest.approx(100.041)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[metrics.DEFAULT_BUCKETS.index(0.025)] == 2
+    assert histogram.counts[-1] == 1
+
+
+def test_timed_sync_and_async():
+    @metrics.timed("call_seconds", kind="test")
+    def sync_call():
+        return 1
+
+    @metrics.timed("call_seconds", kind="test")
+    async def async_call():
+        await asyncio.sleep(0)
+        return 2
+
+    assert sync_call() == 1
+    assert asyncio.run(async_call()) == 2
+    series = metrics.snapshot()["histograms"]["call_seconds"]
+    assert series[(("func", "sync_call"), ("kind", "test"))].count == 1
+    assert series[(("func", "async_call"), ("kind", "test"))].count == 1
+
+
+def test_collect_and_merge_move_worker_metrics():
+    metrics.inc("charts_total", chart="nadir")
+    metrics.observe("render_seconds", 0.3)
+    data = metrics.collect()
+    assert metrics.snapshot()["counters"] == {}
+
+    metrics.inc("charts_total", chart="nadir")
+    metrics.merge(data)
+    metrics.merge(data)
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["charts_total"] == {(("chart", "nadir"),): 3}
+    assert snapshot["histograms"]["render_seconds"][()].count == 2
+
+
+def test_prometheus_text_format():
+    metrics.inc("updates_total", handler='say "hi"')
+    metrics.set_gauge("in_flight", 1.5)
+    metrics.observe("latency", 0.02)
+    text = metrics.render_prometheus()
+    assert '# TYPE updates_total counter\nupdates_total{handler="say \\"hi\\""} 1\n' in text
+    assert "in_flight 1.5\n" in text
+    assert 'latency_bucket{le="0.01"} 0\n' in text
+    assert 'latency_bucket{le="0.025"} 1\n' in text
+    assert 'latency_bucket{le="+Inf"} 1\n' in text
+    assert "latency_count 1\n" in text
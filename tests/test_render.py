@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import config
+import metrics
+import render
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(config, "RENDER_WORKERS", 1)
+    yield
+    render.shutdown()
+
+
+def _kill_workers() -> None:
+    for process in list(render._executor()._processes.values()):
+        process.kill()
+        process.join()
+
+
+def _restarts() -> float:
+    return metrics.snapshot()["counters"].get("render_pool_restarts_total", {}).get((), 0)
+
+
+def test_render_recovers_from_dead_worker(pool):
+    rows = [{"date": "2026-01-01", "nadir": 5.0}, {"date": "2026-01-02", "nadir": 6.5}]
+
+    async def scenario():
+        await render.warmup()
+        broken = render._EXECUTOR
+        _kill_workers()
+        restarts = _restarts()
+        png = await render.render("nadir_chart", rows)
+        assert png.startswith(b"\x89PNG")
+        assert render._EXECUTOR is not broken
+        assert _restarts() == restarts + 1
+        # Новый пул продолжает работать без перезапусков
+        assert (await render.render("nadir_chart", rows)).startswith(b"\x89PNG")
+        assert _restarts() == restarts + 1
+
+    asyncio.run(scenario())
+
+
+def test_unknown_chart_is_rejected():
+    with pytest.raises(ValueError):
+        asyncio.run(render.render("no_such_chart"))
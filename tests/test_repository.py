@@ -0,0 +1,361 @@
+# Общие тесты хранилищ: каждый тест проходит для SQLite, памяти и кэша поверх SQLite
+import random
+import sqlite3
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import config
+import db
+import migrations
+from measure_cache import MeasureCache
+from repository import MemoryRepository
+
+# Нарушение ограничений: SQLite бросает свои ошибки, MemoryRepository — ValueError
+CONSTRAINT_ERRORS = (sqlite3.Error, ValueError)
+MEASURE_FIELDS = ("date", "time", "amount", "tag")
+TODAY = date.today()
+
+
+def day(offset: int) -> str:
+    return (TODAY - timedelta(days=offset)).isoformat()
+
+
+def at(offset: int, clock: str) -> datetime:
+    return datetime.combine(TODAY - timedelta(days=offset), time.fromisoformat(clock))
+
+
+@pytest.fixture(params=["sqlite", "memory", "cache"])
+def repo(request):
+    if request.param == "memory":
+        return MemoryRepository()
+    sqlite_repo = request.getfixturevalue("sqlite_repo")
+    if request.param == "cache":
+        return MeasureCache(sqlite_repo, 60, 1 << 20)
+    return sqlite_repo
+
+
+def measures(rows) -> list[tuple]:
+    # У кэша строки замеров только с этими полями, их и сравниваем
+    return [tuple(row[field] for field in MEASURE_FIELDS) for row in rows]
+
+
+def plain(rows) -> list[dict]:
+    return [{key: row[key] for key in row.keys()} for row in rows]
+
+
+def cat_fields(row) -> dict:
+    return {key: row[key] for key in ("chat_id", "user_id", "name", "is_active", "am_time", "peak", "pm_time")}
+
+
+@pytest.fixture
+def filled(repo):
+    repo.create_cat(1, 10, "Барс", "08:00", 3, "20:00")
+    repo.create_cat(1, 10, "Алиса", "07:30", 4, "19:30")
+    repo.create_cat(2, 11, "Мурка", "09:00", 2, "21:00")
+    add = lambda offset, clock, amount, tag: repo.add_measure(1, 10, "Барс", amount, tag, when=at(offset, clock))
+    add(500, "08:00", 15.0, "AMPS")
+    add(2, "08:00", 4.0, "AMPS")
+    add(2, "11:00", 10.0, "PEAK")
+    add(2, "20:00", 7.0, "PMPS")
+    # Одинаковое время: порядок записи; нет AMPS/PMPS — первый и последний за день
+    add(1, "09:00", 12.0, "OTHER")
+    add(1, "09:00", 3.0, "PEAK")
+    add(1, "21:00", 6.0, "OTHER")
+    # Замер задним числом встаёт перед уже записанными
+    add(0, "07:30", 8.0, "PMPS")
+    add(0, "08:00", 9.0, "AMPS")
+    add(0, "06:00", 5.0, "OTHER")
+    repo.add_measure(2, 11, "Мурка", 6.5, "AMPS", when=at(1, "09:00"))
+    return repo
+
+
+RECENT = [
+    (day(2), "08:00", 4.0, "AMPS"),
+    (day(2), "11:00", 10.0, "PEAK"),
+    (day(2), "20:00", 7.0, "PMPS"),
+    (day(1), "09:00", 12.0, "OTHER"),
+    (day(1), "09:00", 3.0, "PEAK"),
+    (day(1), "21:00", 6.0, "OTHER"),
+    (day(0), "06:00", 5.0, "OTHER"),
+    (day(0), "07:30", 8.0, "PMPS"),
+    (day(0), "08:00", 9.0, "AMPS"),
+]
+ALL = [(day(500), "08:00", 15.0, "AMPS")] + RECENT
+
+
+# --- Коты ---
+
+
+def test_cats(filled):
+    assert cat_fields(filled.get_cat_by_chat_and_name(1, "Барс")) == {
+        "chat_id": 1,
+        "user_id": 10,
+        "name": "Барс",
+        "is_active": 1,
+        "am_time": "08:00",
+        "peak": 3,
+        "pm_time": "20:00",
+    }
+    assert filled.get_cat_by_chat_and_name(1, "Мурка") is None
+    assert filled.get_cat_by_chat(2)["name"] == "Мурка"
+    assert filled.get_cat_by_chat(1)["name"] in ("Алиса", "Барс")
+    assert filled.get_cat_by_chat(3) is None
+    assert sorted((row["chat_id"], row["name"]) for row in filled.list_chats()) == [
+        (1, "Алиса"),
+        (1, "Барс"),
+        (2, "Мурка"),
+    ]
+
+
+def test_update_cat_field(filled):
+    filled.update_cat_field(1, "Барс", "am_time", "06:45")
+    filled.update_cat_field(2, "Мурка", "is_active", 0)
+    assert filled.get_cat_by_chat_and_name(1, "Барс")["am_time"] == "06:45"
+    assert sorted(row["name"] for row in filled.list_chats()) == ["Алиса", "Барс"]
+    with pytest.raises(CONSTRAINT_ERRORS):
+        filled.update_cat_field(1, "Барс", "no_such_field", 1)
+
+
+def test_constraints(filled):
+    with pytest.raises(CONSTRAINT_ERRORS):
+        filled.create_cat(1, 10, "Барс", "08:00", 3, "20:00")
+    with pytest.raises(CONSTRAINT_ERRORS):
+        filled.add_measure(3, 10, "Нет", 5.0, "AMPS")
+    with pytest.raises(CONSTRAINT_ERRORS):
+        filled.add_measure(1, 10, "Барс", -1.0, "AMPS")
+    assert measures(filled.get_measures(1, "Барс", None)) == ALL
+
+
+# --- Замеры ---
+
+
+@pytest.mark.parametrize(
+    "days, expected",
+    [(0, RECENT[6:]), (1, RECENT[3:]), (2, RECENT), (60, RECENT), (None, ALL)],
+)
+def test_get_measures(filled, days, expected):
+    assert measures(filled.get_measures(1, "Барс", days)) == expected
+
+
+def test_measure_reads(filled):
+    start, end = TODAY - timedelta(days=2), TODAY - timedelta(days=1)
+    assert measures(filled.get_measures_between(1, "Барс", start, end)) == RECENT[:6]
+    assert measures(filled.get_measures_between(1, "Барс", start, start)) == RECENT[:3]
+    daily = filled.get_daily_measures(1, "Барс", 1)
+    assert {key: measures(rows) for key, rows in daily.items()} == {day(1): RECENT[3:6], day(0): RECENT[6:]}
+    assert filled.get_history_start(1, "Барс") == day(500)
+    assert filled.get_history_start(1, "Алиса") is None
+    assert measures(filled.get_last_measures(1, "Барс", 2)) == [RECENT[8], RECENT[7]]
+    assert measures(filled.get_last_measures(1, "Барс")) == [RECENT[8]]
+    assert measures(filled.get_last_days(1, "Барс", 2)) == RECENT[3:]
+    assert list(filled.iter_measures(1, "Барс", chunk_size=2)) == ALL
+    assert filled.get_measures(1, "Алиса", None) == []
+    assert measures(filled.get_measures(2, "Мурка", 7)) == [(day(1), "09:00", 6.5, "AMPS")]
+
+
+# --- Агрегаты по дням ---
+
+
+def test_daily_aggregates(filled):
+    assert plain(filled.get_daily_nadirs(1, "Барс", 2)) == [
+        {"date": day(2), "nadir": 4.0},
+        {"date": day(1), "nadir": 3.0},
+        {"date": day(0), "nadir": 5.0},
+    ]
+    assert plain(filled.get_daily_amps_pmps(1, "Барс", 2)) == [
+        {"date": day(2), "amps": 4.0, "pmps": 7.0},
+        {"date": day(1), "amps": 12.0, "pmps": 6.0},
+        {"date": day(0), "amps": 9.0, "pmps": 8.0},
+    ]
+    # Границы диапазона не включаются
+    assert plain(filled.get_daily_range_counts(1, "Барс", 2)) == [
+        {"date": day(2), "count": 3, "in_range": 1},
+        {"date": day(1), "count": 3, "in_range": 1},
+        {"date": day(0), "count": 3, "in_range": 3},
+    ]
+    assert [row["in_range"] for row in filled.get_daily_range_counts(1, "Барс", 2, low=3, high=12)] == [3, 1, 3]
+    assert [row["date"] for row in filled.get_daily_nadirs(1, "Барс", None)] == [day(500), day(2), day(1), day(0)]
+
+
+def test_daily_buckets(filled):
+    buckets = plain(filled.get_daily_buckets(1, "Барс", 2))
+    assert [row["date"] for row in buckets] == [day(2), day(1), day(0)]
+    assert buckets[0] == pytest.approx({"date": day(2), "count": 3, "min": 4.0, "avg": 7.0, "max": 10.0, "in_range": 1, "nadir": 4.0})
+    assert buckets[1]["avg"] == pytest.approx(7.0)
+    assert [row["in_range"] for row in filled.get_daily_buckets(1, "Барс", 2, low=3, high=12)] == [3, 1, 3]
+
+
+def test_weekly_buckets(filled):
+    daily = plain(filled.get_daily_buckets(1, "Барс", None))
+    weekly = plain(filled.get_weekly_buckets(1, "Барс", None))
+    weeks: dict[str, list[dict]] = {}
+    for row in daily:
+        start = date.fromisoformat(row["date"])
+        weeks.setdefault((start - timedelta(days=start.weekday())).isoformat(), []).append(row)
+    assert [row["date"] for row in weekly] == sorted(weeks)
+    for row in weekly:
+        days = weeks[row["date"]]
+        count = sum(item["count"] for item in days)
+        assert row == pytest.approx(
+            {
+                "date": row["date"],
+                "count": count,
+                "min": min(item["min"] for item in days),
+                "avg": sum(item["avg"] * item["count"] for item in days) / count,
+                "max": max(item["max"] for item in days),
+                "in_range": sum(item["in_range"] for item in days),
+                "nadir": sum(item["nadir"] for item in days) / len(days),
+            }
+        )
+
+
+# --- Переименование и архив ---
+
+
+def test_rename_moves_measures(filled):
+    filled.rename_cat(1, "Барс", "Барсик")
+    assert filled.get_cat_by_chat_and_name(1, "Барс") is None
+    assert filled.get_cat_by_chat_and_name(1, "Барсик")["am_time"] == "08:00"
+    assert measures(filled.get_measures(1, "Барсик", None)) == ALL
+    assert measures(filled.get_measures(1, "Барсик", 2)) == RECENT
+    assert filled.get_measures(1, "Барс", None) == []
+    filled.add_measure(1, 10, "Барсик", 7.7, "PEAK", when=at(0, "12:00"))
+    assert measures(filled.get_last_measures(1, "Барсик")) == [(day(0), "12:00", 7.7, "PEAK")]
+
+
+def test_rename_to_existing_name_fails(filled):
+    filled.get_measures(1, "Барс", 2)
+    filled.add_measure(1, 10, "Алиса", 5.5, "AMPS", when=at(0, "10:00"))
+    with pytest.raises(CONSTRAINT_ERRORS):
+        filled.rename_cat(1, "Барс", "Алиса")
+    # Ничего не потеряно и не перемешано
+    assert measures(filled.get_measures(1, "Барс", None)) == ALL
+    assert measures(filled.get_measures(1, "Алиса", None)) == [(day(0), "10:00", 5.5, "AMPS")]
+    assert sorted(row["name"] for row in filled.list_chats() if row["chat_id"] == 1) == ["Алиса", "Барс"]
+    # Имя самого кота — не конфликт
+    filled.rename_cat(1, "Барс", "Барс")
+    assert measures(filled.get_measures(1, "Барс", None)) == ALL
+
+
+def test_archive_keeps_reads(filled):
+    before = (TODAY - timedelta(days=config.ARCHIVE_AFTER_DAYS)).isoformat()
+    # У Алисы только старые замеры: после архивации последний лежит в архиве
+    filled.add_measure(1, 10, "Алиса", 5.5, "AMPS", when=at(500, "10:00"))
+    reads = lambda: (
+        measures(filled.get_last_measures(1, "Алиса")),
+        measures(filled.get_last_measures(1, "Барс", len(ALL))),
+        measures(filled.get_measures(1, "Барс", None)),
+        measures(filled.get_measures(1, "Барс", 60)),
+        filled.get_history_start(1, "Барс"),
+        list(filled.iter_measures(1, "Барс")),
+        plain(filled.get_daily_nadirs(1, "Барс", None)),
+        plain(filled.get_weekly_buckets(1, "Барс", None)),
+    )
+    expected = reads()
+    assert expected[0] == [(day(500), "10:00", 5.5, "AMPS")]
+    while filled.archive_measures_batch(before, 1) == 1:
+        pass
+    assert filled.archive_measures_batch(before, 1) == 0
+    assert reads() == expected
+    # Переименование затрагивает и архивные замеры
+    filled.rename_cat(1, "Барс", "Барсик")
+    assert measures(filled.get_measures(1, "Барсик", None)) == ALL
+
+
+# --- Ночная сводка ---
+
+SUMMARY = {
+    "digest_date": TODAY.isoformat(),
+    "glucose_sum": 42.5,
+    "glucose_count": 5,
+    "nadir_sum": 12.0,
+    "nadir_days": 3,
+    "table_rows": 30,
+    "other_columns": 2,
+}
+
+
+def test_stats_digest(filled):
+    assert filled.get_stats_digest(1, "Барс") is None
+    assert filled.get_stats_digest_date(1, "Барс") is None
+    filled.save_stats_digest(1, "Барс", SUMMARY, [b"page1", b"page2"], b"%PDF")
+    row, pages = filled.get_stats_digest(1, "Барс")
+    assert {key: row[key] for key in SUMMARY} == SUMMARY
+    assert row["pdf"] == b"%PDF"
+    assert pages == [b"page1", b"page2"]
+    assert filled.get_stats_digest_date(1, "Барс") == TODAY.isoformat()
+    # Новая сводка целиком заменяет старую, лишних страниц не остаётся
+    filled.save_stats_digest(1, "Барс", {**SUMMARY, "table_rows": 3}, [b"only"], b"%PDF2")
+    row, pages = filled.get_stats_digest(1, "Барс")
+    assert (row["table_rows"], row["pdf"], pages) == (3, b"%PDF2", [b"only"])
+    assert filled.get_stats_digest(1, "Алиса") is None
+
+
+def test_stats_digest_invalidation(filled):
+    for name in ("Барс", "Алиса"):
+        filled.save_stats_digest(1, name, SUMMARY, [b"page"], b"%PDF")
+    filled.update_cat_field(1, "Алиса", "pm_time", "18:00")
+    assert filled.get_stats_digest(1, "Алиса") is None
+    assert filled.get_stats_digest(1, "Барс") is not None
+    filled.rename_cat(1, "Барс", "Барсик")
+    assert filled.get_stats_digest(1, "Барс") is None
+    assert filled.get_stats_digest(1, "Барсик") is None
+    assert filled.get_stats_digest_date(1, "Барсик") is None
+
+
+# --- Случайная история: каждый метод чтения совпадает с SQLite ---
+
+
+def _random_history(repo, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    for chat_id, name in ((1, "Барс"), (1, "Алиса"), (2, "Мурка")):
+        repo.create_cat(chat_id, 10, name, "08:00", 3, "20:00")
+    entries = []
+    for chat_id, name in ((1, "Барс"), (1, "Алиса"), (2, "Мурка")):
+        for offset in range(450, -1, -1):
+            for _ in range(rng.randint(0, 4)):
+                entries.append((chat_id, name, offset, f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"))
+    rng.shuffle(entries)
+    for chat_id, name, offset, clock in entries:
+        tag = rng.choice(["AMPS", "PEAK", "PMPS", "OTHER"])
+        repo.add_measure(chat_id, 10, name, round(rng.uniform(1, 20), 1), tag, when=at(offset, clock))
+
+
+def _rounded(value):
+    # Средние SQLite и Python могут разойтись в последнем знаке
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_rounded(item) for item in value)
+    return value
+
+
+def _all_reads(repo, chat_id: int, name: str) -> list:
+    result = []
+    for days in (0, 1, 7, 30, 60, 365, None):
+        result.append(measures(repo.get_measures(chat_id, name, days)))
+        for method in ("get_daily_buckets", "get_weekly_buckets", "get_daily_nadirs", "get_daily_amps_pmps", "get_daily_range_counts"):
+            result.append(plain(getattr(repo, method)(chat_id, name, days)))
+    for days in (1, 7, 30):
+        result.append({key: measures(rows) for key, rows in repo.get_daily_measures(chat_id, name, days).items()})
+        result.append(measures(repo.get_last_days(chat_id, name, days)))
+    result.append(measures(repo.get_measures_between(chat_id, name, TODAY - timedelta(days=40), TODAY - timedelta(days=3))))
+    result.append(repo.get_history_start(chat_id, name))
+    result.append(measures(repo.get_last_measures(chat_id, name, 5)))
+    result.append(list(repo.iter_measures(chat_id, name, chunk_size=50)))
+    return _rounded(result)
+
+
+def test_random_history_matches_sqlite(repo, tmp_path):
+    path = str(tmp_path / "reference.db")
+    migrations.migrate(path)
+    reference = db.SqliteRepository(path)
+    for backend in (repo, reference):
+        _random_history(backend)
+    for chat_id, name in ((1, "Барс"), (1, "Алиса"), (2, "Мурка")):
+        assert _all_reads(repo, chat_id, name) == _all_reads(reference, chat_id, name)
+    assert cat_fields(repo.get_cat_by_chat(1)) == cat_fields(reference.get_cat_by_chat(1))
+    assert plain(repo.list_chats()) == plain(reference.list_chats())
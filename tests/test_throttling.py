@@ -0,0 +1,135 @@
+import asyncio
+from typing import Any
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import AnswerCallbackQuery, SendMessage, TelegramMethod
+from aiogram.types import CallbackQuery, Message, Update
+
+from throttling import BucketRule, ThrottlingMiddleware
+
+
+class Session(BaseSession):
+    # Запросы к API только записываются
+    def __init__(self):
+        super().__init__()
+        self.calls: list[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        self.calls.append(method)
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self) -> None:
+        return None
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Harness:
+    # Диспетчер с одним дешёвым и одним тяжёлым обработчиком за middleware
+    def __init__(self, middleware: ThrottlingMiddleware):
+        self.handled: list[tuple[int, str]] = []
+        self.session = Session()
+        self.bot = Bot("123456:throttle-test", session=self.session)
+        router = Router()
+
+        @router.message()
+        async def text(message: Message):
+            self.handled.append((message.chat.id, "text"))
+
+        @router.callback_query(F.data == "chart", flags={"throttle": "render"})
+        async def chart(callback: CallbackQuery):
+            self.handled.append((callback.message.chat.id, "render"))
+
+        router.message.middleware(middleware)
+        router.callback_query.middleware(middleware)
+        self.dispatcher = Dispatcher()
+        self.dispatcher.include_router(router)
+
+    def feed(self, chat_id: int, kind: str) -> bool:
+        before = len(self.handled)
+        asyncio.run(self.dispatcher.feed_update(self.bot, _update(chat_id, kind)))
+        return len(self.handled) > before
+
+    def notices(self, method: type) -> list[str]:
+        return [call.text for call in self.session.calls if isinstance(call, method) and call.text]
+
+
+def _update(chat_id: int, kind: str) -> Update:
+    user = {"id": chat_id, "is_bot": False, "first_name": "Test"}
+    message = {"message_id": 7, "date": 0, "chat": {"id": chat_id, "type": "private"}, "from": user, "text": "8.5"}
+    if kind == "text":
+        return Update.model_validate({"update_id": 1, "message": message})
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "callback_query": {"id": "1", "from": user, "chat_instance": "1", "data": "chart", "message": message},
+        }
+    )
+
+
+def _harness(max_chats: int = 100, text=(3, 1), render=(2, 0.5)) -> tuple[Harness, Clock]:
+    clock = Clock()
+    middleware = ThrottlingMiddleware(
+        rules={"text": BucketRule(*text), "render": BucketRule(*render)},
+        max_chats=max_chats,
+        clock=clock,
+    )
+    return Harness(middleware), clock
+
+
+def test_render_burst_then_refill():
+    harness, clock = _harness()
+    assert [harness.feed(1, "render") for _ in range(3)] == [True, True, False]
+    # На нажатие кнопки отвечают всегда, с временем ожидания
+    assert harness.notices(AnswerCallbackQuery) == ["Слишком часто. Попробуйте через 2 с."]
+    clock.now += 1
+    assert not harness.feed(1, "render")
+    clock.now += 1
+    assert harness.feed(1, "render")
+
+
+def test_kinds_and_chats_are_separate():
+    harness, _ = _harness()
+    harness.feed(1, "render")
+    harness.feed(1, "render")
+    assert not harness.feed(1, "render")
+    assert harness.feed(1, "text")
+    assert harness.feed(2, "render")
+
+
+def test_message_notice_once_per_limit():
+    harness, clock = _harness()
+    assert [harness.feed(1, "text") for _ in range(5)] == [True, True, True, False, False]
+    assert harness.notices(SendMessage) == ["Слишком часто. Попробуйте через 1 с."]
+    # После разрешённого действия предупреждение снова показывается
+    clock.now += 1
+    assert harness.feed(1, "text")
+    assert not harness.feed(1, "text")
+    assert len(harness.notices(SendMessage)) == 2
+
+
+def test_max_chats_counts_chats_not_buckets():
+    harness, _ = _harness(max_chats=2)
+    harness.feed(1, "render")
+    harness.feed(1, "render")
+    harness.feed(1, "text")
+    # Второе ведро чата 1 и чат 2 умещаются в лимит из двух чатов
+    harness.feed(2, "text")
+    assert not harness.feed(1, "render")
+    # Третий чат вытесняет самый давний — чат 2, а не ведро чата 1
+    harness.feed(3, "text")
+    assert not harness.feed(1, "render")
+    # Чат 2 вытесняет чат 3, самым давним остаётся чат 1 — он уходит вместе со всеми ведрами
+    harness.feed(2, "text")
+    harness.feed(4, "text")
+    assert harness.feed(1, "render")
@@ -0,0 +1,153 @@
+import asyncio
+from typing import Any
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.base import BaseSession
+from aiogram.filters import Command
+from aiogram.methods import TelegramMethod
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+import config
+import webhook
+
+SECRET = "test-secret"
+
+
+class CapturingSession(BaseSession):
+    # Вместо Telegram: вызовы API складываются в список
+    def __init__(self):
+        super().__init__()
+        self.calls: list[TelegramMethod] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: int | None = None) -> Any:
+        self.calls.append(method)
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self) -> None:
+        return None
+
+
+def _update(update_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+@pytest.fixture
+def webhook_config(monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(config, "WEBHOOK_PATH", "/webhook")
+    monkeypatch.setattr(config, "WEBHOOK_CONCURRENCY", 4)
+    monkeypatch.setattr(config, "WEBHOOK_SHUTDOWN_TIMEOUT", 5)
+
+
+def _build(release: asyncio.Event, finished: list[int]):
+    router = Router()
+
+    @router.message(Command("ping"))
+    async def ping(message: Message):
+        await message.answer("pong")
+        finished.append(message.message_id)
+
+    @router.message(Command("slow"))
+    async def slow(message: Message):
+        await release.wait()
+        await message.answer("done")
+        finished.append(message.message_id)
+
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+    session = CapturingSession()
+    bot = Bot("123456:webhook-test", session=session)
+    return webhook.build_app(dispatcher, bot), session
+
+
+async def _post(client: TestClient, update: dict, secret: str | None = SECRET):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    return await client.post("/webhook", json=update, headers=headers)
+
+
+def test_updates_are_handled(webhook_config):
+    async def scenario():
+        finished: list[int] = []
+        app, session = _build(asyncio.Event(), finished)
+        async with TestClient(TestServer(app)) as client:
+            for update_id in range(1, 6):
+                response = await _post(client, _update(update_id, "/ping"))
+                assert response.status == 200
+            for _ in range(100):
+                if len(finished) == 5:
+                    break
+                await asyncio.sleep(0.01)
+        assert sorted(finished) == [1, 2, 3, 4, 5]
+        assert [call.text for call in session.calls] == ["pong"] * 5
+
+    asyncio.run(scenario())
+
+
+def test_wrong_secret_is_rejected(webhook_config):
+    async def scenario():
+        finished: list[int] = []
+        app, session = _build(asyncio.Event(), finished)
+        async with TestClient(TestServer(app)) as client:
+            assert (await _post(client, _update(1, "/ping"), secret="wrong")).status == 401
+            assert (await _post(client, _update(2, "/ping"), secret=None)).status == 401
+            await asyncio.sleep(0.05)
+        assert finished == []
+        assert session.calls == []
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_drains_in_flight_updates(webhook_config):
+    async def scenario():
+        release = asyncio.Event()
+        finished: list[int] = []
+        app, session = _build(release, finished)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        # Ответ приходит сразу, обработчик продолжает работать в фоне
+        assert (await _post(client, _update(1, "/slow"))).status == 200
+        await asyncio.sleep(0.05)
+
+        closing = asyncio.create_task(client.close())
+        await asyncio.sleep(0.1)
+        assert not closing.done()
+        assert finished == []
+
+        release.set()
+        await asyncio.wait_for(closing, 5)
+        assert finished == [1]
+        assert [call.text for call in session.calls] == ["done"]
+
+    asyncio.run(scenario())
+
+
+def test_drain_gives_up_after_timeout(webhook_config, monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_SHUTDOWN_TIMEOUT", 0.2)
+
+    async def scenario():
+        release = asyncio.Event()
+        finished: list[int] = []
+        app, _ = _build(release, finished)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        assert (await _post(client, _update(1, "/slow"))).status == 200
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(client.close(), 5)
+        assert finished == []
+        release.set()
+
+    asyncio.run(scenario())
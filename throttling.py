@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+import config
+import metrics
+
+
+@dataclass(frozen=True)
+class BucketRule:
+    # burst — сколько действий можно сделать подряд, rate — пополнение в секунду
+    burst: float
+    rate: float
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at", "notified")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+        self.notified = False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    # Класс обработчика задаётся флагом: @router.callback_query(..., flags={"throttle": "render"}).
+    # Без флага обработчик считается дешёвым ("text").
+    def __init__(self, rules: dict[str, BucketRule], max_chats: int, clock: Callable[[], float] = time.monotonic):
+        self._rules = rules
+        self._max_chats = max_chats
+        self._clock = clock
+        # Вытеснение по чатам: у каждого чата свои ведра по классам обработчиков
+        self._chats: OrderedDict[int, dict[str, _Bucket]] = OrderedDict()
+
+    def _take(self, chat_id: int, kind: str) -> float:
+        # Возвращает 0, если действие разрешено, иначе сколько секунд ждать
+        rule = self._rules[kind]
+        now = self._clock()
+        buckets = self._chats.get(chat_id)
+        if buckets is None:
+            buckets = self._chats[chat_id] = {}
+            # Таблица ограничена: вытесняем чаты, которые давно ничего не делали
+            while len(self._chats) > self._max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        bucket = buckets.get(kind)
+        if bucket is None:
+            bucket = buckets[kind] = _Bucket(rule.burst, now)
+        else:
+            bucket.tokens = min(rule.burst, bucket.tokens + (now - bucket.updated_at) * rule.rate)
+            bucket.updated_at = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            bucket.notified = False
+            return 0
+        return (1 - bucket.tokens) / rule.rate
+
+    def _should_notify(self, chat_id: int, kind: str) -> bool:
+        # Предупреждаем один раз, пока чат не выйдет из-под ограничения
+        bucket = self._chats[chat_id][kind]
+        if bucket.notified:
+            return False
+        bucket.notified = True
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        if chat is None:
+            return await handler(event, data)
+
+        kind = get_flag(data, "throttle", default="text")
+        wait = self._take(chat.id, kind)
+        if not wait:
+            return await handler(event, data)
+
+        metrics.inc("throttled_updates_total", kind=kind)
+        text = f"Слишком часто. Попробуйте через {max(1, round(wait))} с."
+        if isinstance(event, CallbackQuery):
+            # На нажатие кнопки нужно ответить всегда, иначе крутится индикатор
+            await event.answer(text)
+        elif isinstance(event, Message) and self._should_notify(chat.id, kind):
+            await event.answer(text)
+        return None
+
+
+def build_middleware() -> ThrottlingMiddleware:
+    return ThrottlingMiddleware(
+        rules={
+            "text": BucketRule(burst=config.THROTTLE_TEXT_BURST, rate=config.THROTTLE_TEXT_RATE),
+            "render": BucketRule(burst=config.THROTTLE_RENDER_BURST, rate=config.THROTTLE_RENDER_RATE),
+        },
+        max_chats=config.THROTTLE_MAX_CHATS,
+    )
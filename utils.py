@@ -1,3 +1,4 @@
+import os
 import re
 from datetime import datetime
 from typing import Optional
@@ -37,3 +38,15 @@ def parse_measure(value: str) -> Optional[float]:
 def now_date_time_strings():
     now = datetime.now()
     return now.date().isoformat(), now.time().strftime("%H:%M")
+
+
+def rotate_files(directory: str, suffix: str, keep: int, prefix: str = "") -> None:
+    # Оставляем только последние keep файлов с этим началом и окончанием
+    paths = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.startswith(prefix) and name.endswith(suffix)
+    ]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:-keep] if keep > 0 else paths:
+        os.remove(path)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import signal
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    # Ограничивает число апдейтов, которые обрабатываются одновременно.
+    # Остальные ждут своей очереди, а не создают нагрузку на БД и пул отрисовки.
+    def __init__(self, limit: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        self._in_flight += 1
+        self._idle.clear()
+        metrics.set_gauge("updates_in_flight", self._in_flight)
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self._in_flight -= 1
+            metrics.set_gauge("updates_in_flight", self._in_flight)
+            if self._in_flight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> None:
+        # Ждём, пока доработают уже принятые апдейты
+        if self._in_flight:
+            logger.info("Waiting for %d updates to finish", self._in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutdown with %d updates still running", self._in_flight)
+
+
+def build_app(dispatcher: Dispatcher, bot: Bot, **workflow_data) -> web.Application:
+    limiter = ConcurrencyLimitMiddleware(config.WEBHOOK_CONCURRENCY)
+    dispatcher.update.outer_middleware(limiter)
+
+    app = web.Application()
+
+    async def drain_updates(_: web.Application) -> None:
+        await limiter.drain(config.WEBHOOK_SHUTDOWN_TIMEOUT)
+
+    # Обработчики остановки выполняются по порядку: сначала дожидаемся апдейтов,
+    # потом закрываем сессию бота и останавливаем диспетчер
+    app.on_shutdown.append(drain_updates)
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET or None,
+        handle_in_background=True,
+    ).register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot, **workflow_data)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, **workflow_data) -> None:
+    app = build_app(dispatcher, bot, **workflow_data)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT)
+    await site.start()
+    logger.info("Webhook server listening on %s:%s%s", config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_PATH)
+
+    if config.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+            secret_token=config.WEBHOOK_SECRET or None,
+        )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # На Windows сигналы в цикле событий не поддерживаются
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать запросы, затем дожидаемся апдейтов и закрываемся
+        await runner.cleanup()